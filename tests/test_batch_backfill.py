@@ -0,0 +1,145 @@
+"""
+batch_backfill 离线回归：LocalBatchBackend 生成结果，检查回填的 csv 和工作队列状态
+"""
+
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+WEBSITES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "websites")
+if WEBSITES_DIR not in sys.path:
+    sys.path.insert(0, WEBSITES_DIR)
+
+from enrich_all import load_site_module
+from util.batch_prediction import LocalBatchBackend, STATE_FILE
+from util.handle_csv import fieldnames
+from util.work_queue import DONE, PENDING, WorkQueue
+
+DESCRIPTION = "负责远程团队的后端服务开发与维护，参与系统架构设计，编写高质量代码并进行代码评审，支持异步协作。"
+TITLES = ["星河后端工程师", "星河前端工程师", "星河数据工程师"]
+# responder 对这个标题抛异常，对应的请求在结果文件里是 error
+FAILING_TITLE = "星河数据工程师"
+
+
+def _result(title: str) -> str:
+    return json.dumps({
+        "is_remote": True,
+        "title_chinese": title,
+        "title_english": "Engineer",
+        "tags_chinese": ["远程", "后端", "Python", "异步", "弹性工作"],
+        "tags_english": ["Remote", "Backend", "Python", "Async", "Flexible"],
+        "description_chinese": "职位描述",
+        "description_english": "Job description",
+    }, ensure_ascii=False)
+
+
+def _responder(prompt: str, generation_config) -> str:
+    if FAILING_TITLE in prompt:
+        raise RuntimeError("simulated batch failure")
+    title = next(t for t in TITLES if t in prompt)
+    return _result(title)
+
+
+@pytest.fixture(params=["boss", "zhilian", "wellfound"])
+def processor(request, tmp_path, monkeypatch):
+    module = load_site_module(request.param)
+    csv_dir = tmp_path / "csv_file"
+    csv_dir.mkdir()
+    for attr, name in [("INPUT_FILE", "jobs_meta_updated.csv"), ("OUTPUT_FILE", "jobs_gemini_edited.csv"),
+                       ("QUEUE_FILE", "work_queue.db"), ("BATCH_DIR", "batch"),
+                       ("VERSIONS_FILE", "prompt_versions.db"), ("TOMBSTONE_FILE", "near_duplicates.db")]:
+        monkeypatch.setattr(module, attr, str(csv_dir / name))
+    monkeypatch.setattr(module, "_versions", None)
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    with open(module.INPUT_FILE, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for i, title in enumerate(TITLES):
+            writer.writerow({"_id": f"job-{i}", "title": title, "description": DESCRIPTION,
+                             "createdAt": today, "source_url": f"https://example.com/{i}"})
+    yield module
+    if module._versions is not None:
+        module._versions.close()
+
+
+def _read_output(path: str):
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return {row["_id"]: row for row in csv.DictReader(f)}
+
+
+def _queue_states(path: str):
+    queue = WorkQueue(path)
+    try:
+        return dict(queue._conn.execute("SELECT job_id, state FROM jobs").fetchall())
+    finally:
+        queue.close()
+
+
+def test_batch_backfill_writes_rows_and_settles_queue(processor):
+    # 先按 process_csv 的 Phase 1 把待处理行放进队列
+    _, all_jobs_list, _ = processor._merge_jobs()
+    processor._open_queue(all_jobs_list).close()
+    assert set(_queue_states(processor.QUEUE_FILE).values()) == {PENDING}
+
+    processor.batch_backfill(LocalBatchBackend(_responder), poll_interval=0)
+
+    rows = _read_output(processor.OUTPUT_FILE)
+    assert rows["job-0"]["title_chinese"] == "星河后端工程师"
+    assert rows["job-1"]["title_chinese"] == "星河前端工程师"
+    assert rows["job-0"]["summary_english"] == "Remote,Backend,Python,Async,Flexible"
+    assert rows["job-2"]["title_chinese"] == ""
+
+    # 成功回填的行已结清；失败的留给 process_csv
+    assert _queue_states(processor.QUEUE_FILE) == {"job-0": DONE, "job-1": DONE, "job-2": PENDING}
+    # 任务完成后不留下续跑状态
+    assert not os.path.exists(os.path.join(processor.BATCH_DIR, STATE_FILE))
+
+
+class RecordingBackend(LocalBatchBackend):
+    """记录每次提交的 key，不依赖输入文件名。"""
+
+    def __init__(self, responder):
+        super().__init__(responder)
+        self.submitted = []
+
+    def submit(self, path: str, model: str) -> str:
+        with open(path, "r", encoding="utf-8") as f:
+            self.submitted.append([json.loads(line)["key"] for line in f])
+        return super().submit(path, model)
+
+
+def test_batch_backfill_resubmits_only_failed_rows(processor):
+    backend = RecordingBackend(_responder)
+    processor.batch_backfill(backend, poll_interval=0)
+    processor.batch_backfill(backend, poll_interval=0)
+
+    rows = _read_output(processor.OUTPUT_FILE)
+    assert [rows[f"job-{i}"]["title_chinese"] for i in range(3)] == ["星河后端工程师", "星河前端工程师", ""]
+    # 第二次只重新提交失败的那一行，两次的输入文件互不覆盖
+    assert [sorted(keys) for keys in backend.submitted] == [["job-0", "job-1", "job-2"], ["job-2"]]
+    assert len([f for f in os.listdir(processor.BATCH_DIR) if f.endswith(".jsonl")]) == 2
+
+
+def test_batch_backfill_crash_during_ingest_resumes_finished_job(processor, monkeypatch):
+    backend = RecordingBackend(_responder)
+
+    def crash():
+        raise KeyboardInterrupt
+
+    # 任务已完成并下载，写回前进程中断
+    with monkeypatch.context() as m:
+        m.setattr(processor, "_load_output_file", crash)
+        with pytest.raises(KeyboardInterrupt):
+            processor.batch_backfill(backend, poll_interval=0)
+    assert os.path.exists(os.path.join(processor.BATCH_DIR, STATE_FILE))
+
+    # 再次运行继续使用已完成的任务，不重新提交
+    processor.batch_backfill(backend, poll_interval=0)
+    assert len(backend.submitted) == 1
+    assert _read_output(processor.OUTPUT_FILE)["job-0"]["title_chinese"] == "星河后端工程师"
+    assert not os.path.exists(os.path.join(processor.BATCH_DIR, STATE_FILE))
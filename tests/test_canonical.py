@@ -0,0 +1,75 @@
+"""
+各站点的 URL 规范化规则，以及 AliasIndex 把 URL 变体和 _id 解析到同一个 canonical _id
+"""
+
+import pytest
+
+from util.canonical import AliasIndex, canonical_url
+from util.handle_csv import generate_job_id
+
+CASES = [
+    # boss：只去掉查询参数、锚点、末尾斜杠和空白；协议和大小写保持原样（与原 clean_url 一致）
+    ("boss", "https://www.zhipin.com/job_detail/a1B2c3.html?lid=8Xk&securityId=Qz&sessionId=",
+     "https://www.zhipin.com/job_detail/a1B2c3.html"),
+    ("boss", "https://www.zhipin.com/job_detail/a1B2c3.html#job-sec", "https://www.zhipin.com/job_detail/a1B2c3.html"),
+    ("boss", "  https://www.zhipin.com/job_detail/a1B2c3.html/  ", "https://www.zhipin.com/job_detail/a1B2c3.html"),
+    ("boss", "http://WWW.ZHIPIN.COM/job_detail/a1B2c3.html", "http://WWW.ZHIPIN.COM/job_detail/a1B2c3.html"),
+    # zhilian：另外去掉协议头并整体转小写，http / https 和大小写变体是同一个键
+    ("zhilian", "https://www.zhaopin.com/jobdetail/CC123J0001.htm?refcode=4019&srccode=401901#apply",
+     "www.zhaopin.com/jobdetail/cc123j0001.htm"),
+    ("zhilian", "http://WWW.Zhaopin.com/jobdetail/CC123J0001.htm/", "www.zhaopin.com/jobdetail/cc123j0001.htm"),
+    ("zhilian", "www.zhaopin.com/jobdetail/CC123J0001.htm", "www.zhaopin.com/jobdetail/cc123j0001.htm"),
+    # wellfound：与 boss 相同
+    ("wellfound", "https://wellfound.com/jobs/3012345-senior-backend-engineer?utm_source=newsletter&utm_medium=email",
+     "https://wellfound.com/jobs/3012345-senior-backend-engineer"),
+    ("wellfound", "https://wellfound.com/jobs/3012345-senior-backend-engineer/",
+     "https://wellfound.com/jobs/3012345-senior-backend-engineer"),
+    ("wellfound", "https://wellfound.com/company/acme/jobs/3012345-Senior-Backend-Engineer?ref=search#top",
+     "https://wellfound.com/company/acme/jobs/3012345-Senior-Backend-Engineer"),
+    # 没有站点规则时按默认规则
+    (None, "https://example.com/job/1/?a=1", "https://example.com/job/1"),
+    ("boss", "", ""),
+    ("zhilian", None, ""),
+]
+
+
+@pytest.mark.parametrize("site, url, expected", CASES)
+def test_canonical_url(site, url, expected):
+    assert canonical_url(url, site) == expected
+
+
+def _index(path=None, site="zhilian"):
+    return AliasIndex(path, lambda u: canonical_url(u, site))
+
+
+def test_url_variants_share_the_first_seen_id():
+    index = _index()
+    first = index.assign("https://www.zhaopin.com/jobdetail/CC1.htm?refcode=1", default="canonical")
+    assert first == "canonical"
+    assert index.assign("http://WWW.zhaopin.com/jobdetail/cc1.htm/") == "canonical"
+    # 后来出现的 _id 也记为别名，不会替换 canonical
+    assert index.assign("www.zhaopin.com/jobdetail/CC1.htm", job_id="other-id") == "canonical"
+    assert index.resolve(job_id="other-id") == "canonical"
+    assert index.resolve("https://www.zhaopin.com/jobdetail/CC2.htm") is None
+
+
+def test_unknown_job_falls_back_to_id_then_url_hash():
+    index = _index(site="boss")
+    assert index.assign("https://www.zhipin.com/job_detail/x.html", job_id="row-id") == "row-id"
+    url = "https://www.zhipin.com/job_detail/y.html?lid=1"
+    assert index.assign(url) == generate_job_id(url)
+
+
+def test_aliases_persist_after_flush(tmp_path):
+    path = str(tmp_path / "aliases.db")
+    index = _index(path)
+    index.assign_rows([{"_id": "a", "source_url": "https://www.zhaopin.com/jobdetail/A.htm"},
+                       {"_id": "b", "source_url": "https://www.zhaopin.com/jobdetail/a.htm?x=1"}])
+    index.close()
+
+    reopened = _index(path)
+    try:
+        assert reopened.resolve("http://www.zhaopin.com/jobdetail/A.htm") == "a"
+        assert reopened.resolve(job_id="b") == "a"
+    finally:
+        reopened.close()
@@ -0,0 +1,105 @@
+"""
+get_optimized_job_info 不把未通过校验的结果当作成功返回（boss / zhilian）
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+WEBSITES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "websites")
+if WEBSITES_DIR not in sys.path:
+    sys.path.insert(0, WEBSITES_DIR)
+
+from enrich_all import load_site_module
+
+DESCRIPTION = "负责后端服务开发与维护，参与系统架构设计，编写高质量代码并进行代码评审。" * 3
+
+COMPLETE = {
+    "is_remote": True,
+    "title_chinese": "后端工程师",
+    "title_english": "Backend Engineer",
+    "tags_chinese": ["后端", "Python", "异步", "弹性工作", "年终奖"],
+    "tags_english": ["Backend", "Python", "Async", "Flexible", "Bonus"],
+    "description_chinese": "职位描述",
+    "description_english": "Job description",
+}
+
+
+class _Pool:
+    keys = ["test-key"]
+
+    def acquire(self, model):
+        return "test-key"
+
+    def report_rate_limited(self, *args):
+        pass
+
+    def available(self, model):
+        return True
+
+
+def _truncated(data) -> str:
+    """截在最后一个字段中间的 JSON 输出。"""
+    text = json.dumps(data, ensure_ascii=False)
+    return text[:text.rindex('"') - 3]
+
+
+def _load(site: str, monkeypatch):
+    module = load_site_module(site, "gemini_processor")
+    monkeypatch.setattr(module, "get_credential_pool", lambda: _Pool())
+    monkeypatch.setattr(module, "_json_generation_config", lambda schema: schema)
+    monkeypatch.setattr(module.time, "sleep", lambda s: None)
+    return module
+
+
+@pytest.fixture(params=["boss", "zhilian"])
+def gemini(request, monkeypatch):
+    return _load(request.param, monkeypatch)
+
+
+def _script(gemini, monkeypatch, responses):
+    calls = []
+
+    def fake_generate(p, model_name, api_key, generation_config, timeout=None):
+        calls.append(p)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    monkeypatch.setattr(gemini, "_generate_text", fake_generate)
+    return calls
+
+
+def test_incomplete_result_after_failed_completion_is_none(gemini, monkeypatch):
+    # 第一次被截断只剩标题，补全请求仍然缺字段
+    partial = {k: COMPLETE[k] for k in ("title_chinese", "title_english", "description_chinese")}
+    calls = _script(gemini, monkeypatch, [_truncated({**partial, "description_english": "x" * 40}),
+                                          json.dumps({"tags_chinese": "不是列表"}, ensure_ascii=False)])
+
+    assert gemini.get_optimized_job_info("后端工程师", DESCRIPTION) is None
+    assert len(calls) == 2
+
+
+def test_truncated_result_is_completed_and_validated(gemini, monkeypatch):
+    partial = {k: COMPLETE[k] for k in ("title_chinese", "title_english", "description_chinese")}
+    rest = {k: COMPLETE[k] for k in ("description_english", "tags_chinese", "tags_english")}
+    _script(gemini, monkeypatch, [_truncated({**partial, "description_english": "x" * 40}),
+                                  json.dumps(rest, ensure_ascii=False)])
+
+    result = gemini.get_optimized_job_info("后端工程师", DESCRIPTION)
+    assert result == {k: v for k, v in COMPLETE.items() if k != "is_remote"}
+
+
+def test_truncated_correction_falls_back_to_validated_result(monkeypatch):
+    gemini = _load("boss", monkeypatch)
+    # 标签违反约束（含“远程”）触发纠正请求，纠正请求的输出被截断
+    violating = dict(COMPLETE, tags_chinese=["远程", "后端", "Python", "异步", "弹性工作"])
+    corrected = {k: COMPLETE[k] for k in ("title_chinese", "title_english", "description_chinese")}
+    calls = _script(gemini, monkeypatch, [json.dumps(violating, ensure_ascii=False),
+                                          _truncated({**corrected, "description_english": "x" * 40})])
+
+    result = gemini.get_optimized_job_info("后端工程师", DESCRIPTION)
+    assert len(calls) == 2
+    assert result is not None
+    assert not gemini.missing_job_fields(result)
+    assert result["tags_chinese"] == violating["tags_chinese"]
@@ -0,0 +1,43 @@
+"""
+每个 key 一个 genai.Client：请求发到对应 key 的 client，超时按毫秒传给 SDK
+"""
+
+import pytest
+
+pytest.importorskip("google.genai")
+pytest.importorskip("dotenv")
+
+import util.genai_client as genai_client
+from util.gemini_schema import job_info_schema
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients(monkeypatch):
+    monkeypatch.setattr(genai_client, "_clients", {})
+
+
+def test_client_per_key_is_cached():
+    a = genai_client.get_client("key-a")
+    assert genai_client.get_client("key-a") is a
+    assert genai_client.get_client("key-b") is not a
+
+
+def test_generate_content_uses_the_keys_client(monkeypatch):
+    types = genai_client.get_genai().types
+    sent = []
+    for key in ("key-a", "key-b"):
+        models = genai_client.get_client(key).models
+        monkeypatch.setattr(models, "generate_content",
+                            lambda key=key, **kwargs: sent.append((key, kwargs)) or "response")
+
+    config = types.GenerateContentConfig(response_mime_type="application/json", response_schema=job_info_schema())
+    assert genai_client.generate_content("gemini-test", "key-b", "prompt", config, timeout=30) == "response"
+    genai_client.generate_content("gemini-test", "key-a", "prompt", config)
+
+    (key_b, call_b), (key_a, call_a) = sent
+    assert (key_b, key_a) == ("key-b", "key-a")
+    assert call_b["model"] == "gemini-test" and call_b["contents"] == "prompt"
+    assert call_b["config"].http_options.timeout == 30000
+    assert call_b["config"].response_schema == job_info_schema()
+    # 没有 timeout 时原样传入，不改调用方的 config
+    assert call_a["config"] is config and config.http_options is None
@@ -0,0 +1,65 @@
+"""
+Idempotency-Key 回放：写入失败的批量上传不能被缓存，重试必须真正写入
+"""
+
+import csv
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("flask")
+pytest.importorskip("flask_cors")
+
+WEBSITES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "websites")
+if WEBSITES_DIR not in sys.path:
+    sys.path.insert(0, WEBSITES_DIR)
+
+from enrich_all import load_site_module
+from util.bridge_store import SiteStore
+from util.idempotency import KEY_HEADER, REPLAY_HEADER
+
+
+def _detail(i: int):
+    return {"source_url": f"https://example.com/job/{i}", "title": f"title {i}",
+            "description": "远程岗位描述" * 10, "createdAt": "2026-01-01"}
+
+
+@pytest.mark.parametrize("site", ["boss", "zhilian", "wellfound"])
+def test_upload_details_retry_after_write_failure(site, tmp_path):
+    server = load_site_module(site, "server")
+    updated = tmp_path / "jobs_meta_updated.csv"
+    store = SiteStore(str(tmp_path / "jobs_meta.csv"), str(updated), server.clean_url, name=site)
+    app = server.create_app(store)
+
+    real_save = store.save_details
+    calls = []
+
+    def flaky_save(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        return real_save(*args, **kwargs)
+
+    store.save_details = flaky_save
+    client = app.test_client()
+    body = {"details": [_detail(1), _detail(2)]}
+    headers = {KEY_HEADER: f"retry-{site}"}
+
+    first = client.post("/upload_details", json=body, headers=headers)
+    assert first.status_code == 500
+    assert first.get_json()["success"] is False
+    assert not updated.exists()
+
+    # 同一个 key 重试：不回放失败的响应，真正写入
+    second = client.post("/upload_details", json=body, headers=headers)
+    assert second.status_code == 200
+    assert REPLAY_HEADER not in second.headers
+    assert second.get_json()["saved"] == 2
+    with open(updated, "r", encoding="utf-8-sig") as f:
+        assert len(list(csv.DictReader(f))) == 2
+
+    # 成功的结果才会被回放
+    third = client.post("/upload_details", json=body, headers=headers)
+    assert third.headers.get(REPLAY_HEADER) == "true"
+    assert len(calls) == 2
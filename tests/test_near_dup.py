@@ -0,0 +1,112 @@
+"""
+MinHash-LSH 近似去重，以及删除记录（tombstone）让 _merge_jobs 不再把删掉的岗位加回来
+"""
+
+import csv
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+WEBSITES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "websites")
+if WEBSITES_DIR not in sys.path:
+    sys.path.insert(0, WEBSITES_DIR)
+
+from enrich_all import load_site_module
+from util.handle_csv import fieldnames
+from util.near_dup import (DEFAULT_NUM_PERM, NearDupIndex, Tombstones, choose_bands, minhash, removed_ids,
+                           shingles, similarity)
+
+BASE = ("We are hiring a senior backend engineer to design, build and operate distributed services in Python and Go. "
+        "You will own the data pipeline, review code, mentor teammates and collaborate asynchronously across time zones. "
+        "Requirements: five years of backend experience, strong SQL, Kubernetes, observability and a pragmatic mindset.")
+# 只改了一个词的重发
+REPOST = BASE.replace("mentor teammates", "mentor colleagues")
+DISTINCT = ("Marketing coordinator for a consumer brand: plan campaigns, manage social channels, write newsletters, "
+            "coordinate events with agencies and report weekly on engagement metrics to the growth lead.")
+
+
+def test_minhash_signature_tracks_jaccard():
+    a, b, c = (minhash(shingles(t)) for t in (BASE, REPOST, DISTINCT))
+    assert len(a) == DEFAULT_NUM_PERM
+    assert minhash(shingles(BASE)) == a
+    assert similarity(a, b) >= 0.8
+    assert similarity(a, c) < 0.2
+    assert shingles("   ") == set()
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.8, 0.9])
+def test_choose_bands_covers_signature_below_threshold(threshold):
+    bands, rows = choose_bands(threshold)
+    assert bands * rows == DEFAULT_NUM_PERM
+    # S 曲线拐点不高于阈值：宁可多出候选也少漏判
+    assert (1 / bands) ** (1 / rows) <= threshold
+
+
+def test_index_clusters_near_duplicates_only():
+    index = NearDupIndex(0.8)
+    assert index.add("base", BASE) is None
+    kept, score = index.add("repost", REPOST)
+    assert kept == "base" and score >= 0.8
+    assert index.add("distinct", DISTINCT) is None
+    # 空文本不参与比较，也不成为保留项
+    assert index.add("empty", "") is None
+    assert index.merged_clusters() == {"base": [("repost", score)]}
+    assert "empty" not in index.clusters
+
+
+def test_index_rejects_invalid_threshold():
+    with pytest.raises(ValueError):
+        NearDupIndex(0)
+
+
+def test_tombstones_roundtrip(tmp_path):
+    path = str(tmp_path / "near_duplicates.db")
+    assert removed_ids(path) == set()
+    # 只读查询不创建文件
+    assert not os.path.exists(path)
+    store = Tombstones(path)
+    try:
+        store.add_many([("repost", "base", 0.9), ("", "base", 0.9)])
+        store.add_many([("repost", "base", 0.95)])
+    finally:
+        store.close()
+    assert removed_ids(path) == {"repost"}
+
+
+EXPERIENCE = {"boss": "1-3年", "zhilian": "1-3年", "wellfound": "1-3 years"}
+
+
+@pytest.mark.parametrize("site", ["boss", "zhilian", "wellfound"])
+def test_near_duplicate_removal_survives_merge(site, tmp_path, monkeypatch):
+    processor = load_site_module(site)
+    for attr, name in [("INPUT_FILE", "jobs_meta_updated.csv"), ("OUTPUT_FILE", "jobs_gemini_edited.csv"),
+                       ("TOMBSTONE_FILE", "near_duplicates.db"), ("NEAR_DUP_REPORT_FILE", "near_duplicates.csv")]:
+        monkeypatch.setattr(processor, attr, str(tmp_path / name))
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    with open(processor.INPUT_FILE, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for job_id, title, team, description in [("base", "Backend Engineer", "Acme", BASE),
+                                                 ("repost", "Backend Engineer (Remote)", "Acme Inc", REPOST),
+                                                 ("distinct", "Marketing Coordinator", "Brand", DISTINCT)]:
+            writer.writerow({"_id": job_id, "title": title, "team": team, "description": description,
+                             "experience": EXPERIENCE[site], "createdAt": today,
+                             "source_url": f"https://example.com/{job_id}"})
+
+    processor._merge_jobs()
+    processor.remove_duplicate_jobs(option=2, near_threshold=0.8)
+
+    def output_ids():
+        with open(processor.OUTPUT_FILE, "r", encoding="utf-8-sig") as f:
+            return {row["_id"] for row in csv.DictReader(f)}
+
+    assert output_ids() == {"base", "distinct"}
+    assert removed_ids(processor.TOMBSTONE_FILE) == {"repost"}
+
+    # jobs_meta_updated 里仍有这行，下一次合并不能把它当作新行加回来
+    _, _, new_ids = processor._merge_jobs()
+    assert new_ids == []
+    assert output_ids() == {"base", "distinct"}
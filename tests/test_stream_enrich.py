@@ -0,0 +1,137 @@
+"""
+stream_enrich 中途退出：还没处理的行留在 enrich_stream.db，下次启动重新读到并真正处理
+"""
+
+import csv
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+WEBSITES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "websites")
+if WEBSITES_DIR not in sys.path:
+    sys.path.insert(0, WEBSITES_DIR)
+
+from enrich_all import load_site_module
+from util.enrich_stream import EnrichStream
+from util.handle_csv import fieldnames
+from util.work_queue import DONE, WorkQueue
+
+DESCRIPTION = "负责远程团队的后端服务开发与维护，参与系统架构设计，编写高质量代码并进行代码评审，支持异步协作。"
+# 队列空闲时的轮询间隔；测试里的 sleep 遇到它就模拟 Ctrl+C
+IDLE = 0.125
+
+RESULT = {
+    "title_chinese": "后端工程师",
+    "title_english": "Backend Engineer",
+    "tags_chinese": ["远程", "后端", "Python", "异步", "弹性工作"],
+    "tags_english": ["Remote", "Backend", "Python", "Async", "Flexible"],
+    "description_chinese": "职位描述",
+    "description_english": "Job description",
+}
+
+
+class _Clock:
+    """替换 csv_processor 里的 time 模块：空闲轮询时中断，其余 sleep 立即返回。"""
+
+    def __init__(self, real):
+        self._real = real
+
+    def sleep(self, seconds):
+        if seconds == IDLE:
+            raise KeyboardInterrupt
+
+    def __getattr__(self, name):
+        return getattr(self._real, name)
+
+
+@pytest.fixture(params=["boss", "zhilian", "wellfound"])
+def processor(request, tmp_path, monkeypatch):
+    module = load_site_module(request.param)
+    csv_dir = tmp_path / "csv_file"
+    csv_dir.mkdir()
+    for attr, name in [("INPUT_FILE", "jobs_meta_updated.csv"), ("OUTPUT_FILE", "jobs_gemini_edited.csv"),
+                       ("QUEUE_FILE", "work_queue.db"), ("STREAM_FILE", "enrich_stream.db"),
+                       ("VERSIONS_FILE", "prompt_versions.db"), ("TOMBSTONE_FILE", "near_duplicates.db")]:
+        monkeypatch.setattr(module, attr, str(csv_dir / name))
+    monkeypatch.setattr(module, "_versions", None)
+    monkeypatch.setattr(module, "_has_keys", lambda: True)
+    monkeypatch.setattr(module, "_remaining_capacity", lambda: 100)
+    monkeypatch.setattr(module, "time", _Clock(module.time))
+    monkeypatch.setattr(module, "get_optimized_job_info", lambda title, description: dict(RESULT))
+    yield module
+    if module._versions is not None:
+        module._versions.close()
+
+
+def _publish(path: str, count: int):
+    today = datetime.now().strftime("%Y-%m-%d")
+    stream = EnrichStream(path)
+    try:
+        stream.publish({"_id": f"job-{i}", "title": f"title {i}", "description": DESCRIPTION, "createdAt": today,
+                        "source_url": f"https://example.com/{i}"} for i in range(count))
+    finally:
+        stream.close()
+
+
+def _depth(path: str) -> int:
+    stream = EnrichStream(path)
+    try:
+        return stream.depth()
+    finally:
+        stream.close()
+
+
+def _output(path: str):
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return {row["_id"]: row for row in csv.DictReader(f)}
+
+
+def test_interrupted_stream_keeps_unprocessed_rows(processor, monkeypatch):
+    _publish(processor.STREAM_FILE, 2)
+    real_process_job = processor.process_job
+    calls = []
+
+    def interrupt_second(queue, job_id, attempt, row):
+        calls.append(job_id)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return real_process_job(queue, job_id, attempt, row)
+
+    with monkeypatch.context() as m:
+        m.setattr(processor, "process_job", interrupt_second)
+        processor.stream_enrich(poll_interval=IDLE)
+
+    first, second = calls
+    assert set(_output(processor.OUTPUT_FILE)) == {first}
+    # 处理完的事件已 ack，被打断的那条还在
+    assert _depth(processor.STREAM_FILE) == 1
+
+    processor.stream_enrich(poll_interval=IDLE)
+
+    rows = _output(processor.OUTPUT_FILE)
+    assert set(rows) == {"job-0", "job-1"}
+    assert rows[second]["title_chinese"] == "后端工程师"
+    assert _depth(processor.STREAM_FILE) == 0
+    queue = WorkQueue(processor.QUEUE_FILE)
+    try:
+        assert queue.state(first) == queue.state(second) == DONE
+    finally:
+        queue.close()
+
+
+def test_rows_skipped_without_payload_are_requeued(processor):
+    """旧版本在行丢失后把任务当作空行结束（done）；事件还在时重新放回 pending 处理。"""
+    _publish(processor.STREAM_FILE, 1)
+    queue = WorkQueue(processor.QUEUE_FILE)
+    try:
+        queue.enqueue("job-0")
+        queue.ack("job-0")
+    finally:
+        queue.close()
+
+    processor.stream_enrich(poll_interval=IDLE)
+
+    assert _output(processor.OUTPUT_FILE)["job-0"]["title_chinese"] == "后端工程师"
+    assert _depth(processor.STREAM_FILE) == 0
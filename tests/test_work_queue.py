@@ -0,0 +1,213 @@
+"""
+WorkQueue 状态机（pending / leased / done / dead）和 GlobalScheduler 的共享预算
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import util.work_queue as work_queue
+from util.scheduler import GlobalScheduler
+from util.work_queue import (ABORTED, DEAD, DONE, EXPIRED, FAILED, LEASED, PENDING, PROCESSED, SKIPPED,
+                             WorkQueue)
+
+
+class _Clock:
+    """替换 work_queue 里的 time 模块，让租约到期和重试延迟可控。"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(work_queue, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = WorkQueue(str(tmp_path / "work_queue.db"), lease_seconds=60, max_attempts=3, retry_delay=10)
+    yield queue
+    queue.close()
+
+
+def test_lease_by_priority_and_ack(queue):
+    queue.enqueue_many([("old", "2026-01-01"), ("new", "2026-03-01"), ("mid", "2026-02-01")])
+    assert queue.lease("w") == ("new", 1)
+    assert queue.lease("w", job_id="old") == ("old", 1)
+    assert queue.state("new") == LEASED
+    queue.ack("new")
+    assert queue.state("new") == DONE
+    assert [jid for jid, _ in queue.available()] == ["mid"]
+    assert queue.state("missing") is None
+
+
+def test_expired_lease_is_leased_again(queue, clock):
+    queue.enqueue("a")
+    assert queue.lease("w1") == ("a", 1)
+    assert queue.lease("w2") is None
+    clock.now += 61
+    # 租约过期：其他 worker 可以接手，尝试次数累加
+    assert queue.lease("w2") == ("a", 2)
+
+
+def test_reclaim_only_releases_that_workers_leases(queue):
+    queue.enqueue_many([("a", "2"), ("b", "1")])
+    queue.lease("crashed")
+    queue.lease("other")
+    assert queue.reclaim("crashed") == 1
+    assert queue.state("a") == PENDING
+    assert queue.state("b") == LEASED
+    assert queue.lease("new") == ("a", 2)
+
+
+def test_release_does_not_count_an_attempt(queue):
+    queue.enqueue("a")
+    queue.lease("w")
+    queue.release("a")
+    assert queue.state("a") == PENDING
+    assert queue.lease("w") == ("a", 1)
+
+
+def test_fail_retries_after_delay_then_dead_letters(queue, clock):
+    queue.enqueue("a")
+    for attempt in (1, 2):
+        assert queue.lease("w") == ("a", attempt)
+        assert queue.fail("a", "boom") is False
+        # retry_delay * attempts 秒内不可用
+        assert queue.lease("w") is None
+        clock.now += 10 * attempt
+    assert queue.lease("w") == ("a", 3)
+    assert queue.fail("a", "boom") is True
+    assert queue.state("a") == DEAD
+    clock.now += 3600
+    assert queue.lease("w") is None
+    assert queue.dead_letters() == [{"_id": "a", "attempts": 3, "last_error": "boom"}]
+    assert queue.counts() == {PENDING: 0, LEASED: 0, DONE: 0, DEAD: 1}
+
+
+def _dead(queue, job_id, clock):
+    queue.enqueue(job_id)
+    for _ in range(queue.max_attempts):
+        queue.lease("w", job_id=job_id)
+        queue.fail(job_id)
+        clock.now += 3600
+
+
+def test_reconcile_without_retry_dead(queue, clock):
+    queue.enqueue_many([("done", ""), ("pending", ""), ("leased", "")])
+    queue.lease("w", job_id="done")
+    queue.ack("done")
+    queue.lease("w", job_id="leased")
+    _dead(queue, "dead", clock)
+
+    result = queue.reconcile([("new", "p"), ("done", "p"), ("pending", "p"), ("leased", "p"), ("dead", "p")])
+    assert result == {"enqueued": 1, "reset": 1, "dead": 1}
+    assert queue.state("new") == PENDING
+    # csv 中又需要处理的 done 行回到 pending，尝试次数清零
+    assert queue.state("done") == PENDING
+    assert queue.state("leased") == LEASED
+    assert queue.state("dead") == DEAD
+
+
+def test_reconcile_with_retry_dead(queue, clock):
+    _dead(queue, "dead", clock)
+    result = queue.reconcile([("dead", "")], retry_dead=True)
+    assert result == {"enqueued": 0, "reset": 1, "dead": 0}
+    assert queue.lease("w") == ("dead", 1)
+
+
+def test_reconcile_ignores_rows_no_longer_listed(queue):
+    queue.enqueue("done")
+    queue.lease("w")
+    queue.ack("done")
+    assert queue.reconcile([]) == {"enqueued": 0, "reset": 0, "dead": 0}
+    assert queue.state("done") == DONE
+
+
+def test_ack_many(queue):
+    queue.enqueue_many([("a", ""), ("b", ""), ("c", "")])
+    queue.lease("w", job_id="b")
+    assert queue.ack_many(["a", "b", "unknown"]) == 2
+    assert (queue.state("a"), queue.state("b"), queue.state("c")) == (DONE, DONE, PENDING)
+
+
+def _rows(site: str, ages):
+    today = datetime.now()
+    return {f"{site}-{i}": {"_id": f"{site}-{i}", "title": "t", "description": "d",
+                            "createdAt": (today - timedelta(days=age)).strftime("%Y-%m-%d")}
+            for i, age in enumerate(ages)}
+
+
+def _queue_for(tmp_path, name, rows):
+    queue = WorkQueue(str(tmp_path / f"{name}.db"))
+    queue.enqueue_many((jid, row["createdAt"]) for jid, row in rows.items())
+    return queue
+
+
+def test_scheduler_shares_budget_across_sites_by_priority(tmp_path):
+    boss_rows, zhilian_rows = _rows("boss", [5, 0]), _rows("zhilian", [1, 3])
+    boss_queue, zhilian_queue = _queue_for(tmp_path, "boss", boss_rows), _queue_for(tmp_path, "zhilian", zhilian_rows)
+    order = []
+
+    def process_job(queue, job_id, attempt, row):
+        order.append(job_id)
+        queue.ack(job_id)
+        return PROCESSED
+
+    scheduler = GlobalScheduler(budget=3)
+    scheduler.add_site("boss", boss_queue, boss_rows, process_job)
+    scheduler.add_site("zhilian", zhilian_queue, zhilian_rows, process_job)
+    try:
+        stats = scheduler.run()
+        # 最新的三条，跨站点交错；预算用完后最旧的留在队列里
+        assert order == ["boss-1", "zhilian-0", "zhilian-1"]
+        assert stats["boss"][PROCESSED] + stats["zhilian"][PROCESSED] == 3
+        assert boss_queue.state("boss-0") == PENDING
+    finally:
+        boss_queue.close()
+        zhilian_queue.close()
+
+
+def test_scheduler_skips_do_not_consume_budget(tmp_path):
+    rows = _rows("boss", [0, 1, 2, 30])
+    queue = _queue_for(tmp_path, "boss", rows)
+    queue.enqueue("boss-missing")
+    outcomes = {"boss-0": EXPIRED, "boss-1": SKIPPED, "boss-2": PROCESSED}
+
+    def process_job(queue, job_id, attempt, row):
+        queue.ack(job_id)
+        return SKIPPED if row is None else outcomes[job_id]
+
+    scheduler = GlobalScheduler(budget=1)
+    scheduler.add_site("boss", queue, rows, process_job, max_age_days=10)
+    try:
+        stats = scheduler.run()
+        # 没有行的任务、过期和跳过的都不占预算；超过 max_age_days 的不进入计划
+        assert stats["boss"] == {PROCESSED: 1, SKIPPED: 3, FAILED: 0}
+        assert queue.state("boss-3") == PENDING
+    finally:
+        queue.close()
+
+
+def test_scheduler_stops_on_abort(tmp_path):
+    rows = _rows("boss", [0, 1])
+    queue = _queue_for(tmp_path, "boss", rows)
+
+    def process_job(queue, job_id, attempt, row):
+        queue.release(job_id)
+        return ABORTED
+
+    scheduler = GlobalScheduler(budget=5)
+    scheduler.add_site("boss", queue, rows, process_job)
+    try:
+        stats = scheduler.run()
+        assert stats["boss"] == {PROCESSED: 0, SKIPPED: 0, FAILED: 0}
+        assert queue.counts()[PENDING] == 2
+    finally:
+        queue.close()
@@ -0,0 +1,48 @@
+"""
+WriteBehindWriter：写到一半失败后的重试不能重复追加已写入的行
+"""
+
+import csv
+
+import pytest
+
+import util.write_behind as write_behind
+from util.handle_csv import save_to_csv
+from util.write_behind import WriteBehindWriter
+
+
+def _rows(n: int):
+    return [{"_id": f"job-{i}", "title": f"title {i}", "source_url": f"https://example.com/{i}"} for i in range(n)]
+
+
+def _ids(path):
+    with open(path, "r", encoding="utf-8-sig") as f:
+        return [row["_id"] for row in csv.DictReader(f)]
+
+
+@pytest.mark.parametrize("check_existing", [False, True])
+def test_retry_after_partial_write_does_not_duplicate(tmp_path, monkeypatch, check_existing):
+    path = str(tmp_path / "jobs_meta.csv")
+    calls = []
+
+    def flaky_save(p, rows, check=True):
+        calls.append(check)
+        if len(calls) == 1:
+            # 第一次只写进一半就失败
+            save_to_csv(p, rows[:len(rows) // 2], check_existing=check)
+            raise OSError("disk hiccup")
+        save_to_csv(p, rows, check_existing=check)
+
+    monkeypatch.setattr(write_behind, "timed_save", flaky_save)
+    writer = WriteBehindWriter(flush_interval=0.01)
+    try:
+        assert writer.submit(path, _rows(4), check_existing=check_existing)
+        assert writer.flush(timeout=5)
+    finally:
+        writer.close(timeout=5)
+
+    assert _ids(path) == ["job-0", "job-1", "job-2", "job-3"]
+    # 第一次按调用方的设置，重试总是按文件里已有的 _id 去重
+    assert calls == [check_existing, True]
+    assert writer.stats()["written"] == 4
+    assert writer.stats()["dropped"] == 0
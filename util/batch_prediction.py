@@ -0,0 +1,206 @@
+"""
+Offline batch prediction for bulk backfills: JSONL job file -> async batch job -> results by key
+"""
+
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from .tolerant_json import loads_tolerant
+
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+RUNNING = "running"
+
+DEFAULT_POLL_INTERVAL = 60
+STATE_FILE = "batch_state.json"
+
+# Gemini Batch API 的终止状态
+_GEMINI_TERMINAL = {
+    "JOB_STATE_SUCCEEDED": SUCCEEDED,
+    "JOB_STATE_FAILED": FAILED,
+    "JOB_STATE_CANCELLED": FAILED,
+    "JOB_STATE_EXPIRED": FAILED,
+}
+
+
+def batch_request(key: str, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """一行 JSONL：key 用 _id，结果按 key 回填。"""
+    request = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+    if generation_config:
+        request["generation_config"] = generation_config
+    return {"key": key, "request": request}
+
+
+def write_batch_file(path: str, requests: Iterable[Dict[str, Any]]) -> int:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for req in requests:
+            f.write(json.dumps(req, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _response_text(response: Dict[str, Any]) -> str:
+    for candidate in response.get("candidates") or []:
+        parts = (candidate.get("content") or {}).get("parts") or []
+        text = "".join(p.get("text", "") for p in parts)
+        if text:
+            return text
+    return ""
+
+
+def parse_batch_results(content: str) -> Dict[str, Optional[str]]:
+    """结果 JSONL -> {key: 模型输出文本}，失败的请求为 None。"""
+    results = {}
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        item = loads_tolerant(line)
+        if not isinstance(item, dict) or not item.get("key"):
+            continue
+        if item.get("error") or not isinstance(item.get("response"), dict):
+            results[item["key"]] = None
+        else:
+            results[item["key"]] = _response_text(item["response"]) or None
+    return results
+
+
+class LocalBatchBackend:
+    """
+    本地替身：submit 时用 responder(prompt, generation_config) 逐行生成结果，写到输入文件旁边。
+    接口与 GeminiBatchBackend 相同，用于测试和离线演练。
+    """
+
+    def __init__(self, responder: Callable[[str, Dict[str, Any]], str]):
+        self.responder = responder
+
+    def submit(self, path: str, model: str) -> str:
+        output = path + ".results"
+        with open(path, "r", encoding="utf-8") as src, open(output, "w", encoding="utf-8") as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                req = json.loads(line)
+                request = req["request"]
+                prompt = "".join(p.get("text", "") for c in request["contents"] for p in c["parts"])
+                try:
+                    text = self.responder(prompt, request.get("generation_config") or {})
+                    item = {"key": req["key"], "response": {"candidates": [{"content": {"parts": [{"text": text}]}}]}}
+                except Exception as e:
+                    item = {"key": req["key"], "error": {"message": str(e)}}
+                dst.write(json.dumps(item, ensure_ascii=False) + "\n")
+        return output
+
+    def poll(self, job: str) -> str:
+        return SUCCEEDED if os.path.exists(job) else FAILED
+
+    def download(self, job: str) -> str:
+        with open(job, "r", encoding="utf-8") as f:
+            return f.read()
+
+
+class GeminiBatchBackend:
+    """
+    Gemini Batch API（google-genai SDK）。批量任务按异步价格计费，通常 24 小时内完成。
+    google-genai 只在真正提交时才导入。
+    """
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from .genai_client import get_client
+            self._client = get_client(self.api_key)
+        return self._client
+
+    def submit(self, path: str, model: str) -> str:
+        uploaded = self.client.files.upload(
+            file=path, config={"display_name": os.path.basename(path), "mime_type": "jsonl"}
+        )
+        job = self.client.batches.create(
+            model=model if model.startswith("models/") else f"models/{model}",
+            src=uploaded.name,
+            config={"display_name": os.path.basename(path)},
+        )
+        return job.name
+
+    def poll(self, job: str) -> str:
+        state = self.client.batches.get(name=job).state
+        return _GEMINI_TERMINAL.get(getattr(state, "name", str(state)), RUNNING)
+
+    def download(self, job: str) -> str:
+        batch = self.client.batches.get(name=job)
+        content = self.client.files.download(file=batch.dest.file_name)
+        return content.decode("utf-8") if isinstance(content, bytes) else content
+
+
+def _load_state(batch_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(batch_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(batch_dir: str, state: Optional[Dict[str, Any]]):
+    path = os.path.join(batch_dir, STATE_FILE)
+    if state is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+
+
+def run_batch(backend, batch_dir: str, model: str, build_requests: Callable[[], Iterable[Dict[str, Any]]],
+              poll_interval: float = DEFAULT_POLL_INTERVAL) -> Tuple[str, Dict[str, Optional[str]]]:
+    """
+    写 JSONL、提交、轮询、下载结果。已提交的任务记录在 batch_dir/batch_state.json，
+    中断后再次运行会继续轮询同一个任务，而不是重新提交。
+    返回 (最终状态, {key: 输出文本})。成功时 state 保留到调用方写回结果后调用 finish_batch，
+    写回前崩溃的话下次运行会重新下载这个已完成（已付费）的任务。
+    """
+    os.makedirs(batch_dir, exist_ok=True)
+    state = _load_state(batch_dir)
+    if state:
+        print(f"📦 Resuming batch job {state['job']} submitted at {state['submitted_at']}")
+    else:
+        # 同一秒内提交两次也不会覆盖彼此的输入文件
+        path = os.path.join(batch_dir, f"jobs_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.jsonl")
+        count = write_batch_file(path, build_requests())
+        if count == 0:
+            print(f"📦 Nothing to submit")
+            return SUCCEEDED, {}
+        job = backend.submit(path, model)
+        state = {"job": job, "input": path, "model": model, "count": count,
+                 "submitted_at": datetime.now().isoformat(timespec="seconds")}
+        _save_state(batch_dir, state)
+        print(f"📦 Submitted {count} requests as batch job {job} (model: {model})")
+
+    while True:
+        status = backend.poll(state["job"])
+        if status != RUNNING:
+            break
+        print(f"   ⏳ Batch job still running, checking again in {poll_interval}s...")
+        time.sleep(poll_interval)
+
+    if status != SUCCEEDED:
+        _save_state(batch_dir, None)
+        print(f"❌ Batch job {state['job']} ended with status: {status}")
+        return status, {}
+    results = parse_batch_results(backend.download(state["job"]))
+    print(f"📦 Batch job finished: {len(results)} results")
+    return status, results
+
+
+def finish_batch(batch_dir: str):
+    """结果已经写回后清除 batch_state.json，下次运行重新提交。"""
+    _save_state(batch_dir, None)
@@ -0,0 +1,127 @@
+"""
+Request-body decoding for bulk upload_list: gzip/zstd bodies and NDJSON parsed in batches
+"""
+
+import gzip
+import io
+import json
+import zlib
+from typing import Dict, Iterator, List, Optional, Tuple, Type
+
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
+DEFAULT_BATCH_SIZE = 500
+# 解压后的请求体上限，防止压缩炸弹
+MAX_DECODED_BYTES = 64 * 1024 * 1024
+
+
+class IngestError(ValueError):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class _LimitedReader(io.RawIOBase):
+    def __init__(self, source, limit: int):
+        self._source = source
+        self._limit = limit
+        self._read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        data = self._source.read(len(b))
+        self._read += len(data)
+        if self._read > self._limit:
+            raise IngestError(f"Decoded body larger than {self._limit} bytes", 413)
+        b[:len(data)] = data
+        return len(data)
+
+
+def _decoded(stream, content_encoding: Optional[str]) -> Tuple[object, Tuple[Type[BaseException], ...]]:
+    """返回 (解压后的流, 数据损坏时解压器抛出的异常类型)。"""
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        return stream, ()
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.GzipFile(fileobj=stream, mode="rb"), (OSError, EOFError, zlib.error)
+    if encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise IngestError("zstd bodies need the zstandard package (pip install zstandard)", 415)
+        return zstandard.ZstdDecompressor().stream_reader(stream), (zstandard.ZstdError,)
+    raise IngestError(f"Unsupported Content-Encoding: {encoding}", 415)
+
+
+def _iter_batches(reader, ndjson: bool, batch_size: int) -> Iterator[List[Dict]]:
+    if ndjson:
+        # 一行一条职位，边读边解析，不把整个请求体放进内存
+        batch = []
+        for lineno, line in enumerate(reader, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                raise IngestError(f"Invalid NDJSON on line {lineno}: {e}")
+            if isinstance(job, dict):
+                batch.append(job)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+
+    body = reader.read()
+    try:
+        data = json.loads(body)
+    except ValueError as e:
+        raise IngestError(f"Invalid JSON body: {e}")
+    jobs = data.get("jobs", []) if isinstance(data, dict) else data
+    if not isinstance(jobs, list):
+        raise IngestError("'jobs' must be a list")
+    for i in range(0, len(jobs), batch_size):
+        yield [job for job in jobs[i:i + batch_size] if isinstance(job, dict)]
+
+
+def iter_job_batches(stream, content_type: Optional[str], content_encoding: Optional[str],
+                     batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """
+    把 upload_list 的请求体解析成若干批职位。
+    Content-Encoding 支持 gzip / zstd（zstd 需要安装 zstandard）；
+    Content-Type 为 application/x-ndjson 等时按行解析，否则按 JSON {"jobs": [...]} 或数组解析。
+    """
+    source, decode_errors = _decoded(stream, content_encoding)
+    reader = io.BufferedReader(_LimitedReader(source, MAX_DECODED_BYTES))
+    ndjson = (content_type or "").split(";")[0].strip().lower() in NDJSON_TYPES
+    try:
+        yield from _iter_batches(reader, ndjson, batch_size)
+    except decode_errors as e:
+        # gzip / zstd 数据损坏或被截断
+        raise IngestError(f"Could not decode {content_encoding} body: {e}")
+
+
+def ingest_list(request, store):
+    """upload_list 的通用实现：按批写入 store，返回 Flask 响应。写入队列满时返回 503，插件重发时已写入的会被去重。"""
+    from flask import jsonify
+
+    from .bridge_serving import busy_response
+
+    received = added = 0
+    try:
+        for jobs in iter_job_batches(request.stream, request.mimetype, request.headers.get("Content-Encoding")):
+            count = store.add_jobs(jobs)
+            if count is None:
+                return busy_response(store.retry_after())
+            received += len(jobs)
+            added += count
+    except IngestError as e:
+        response = jsonify({"success": False, "message": str(e), "count": received, "new": added})
+        response.status_code = e.status
+        return response
+    if not received:
+        return jsonify({"success": False, "message": "No jobs provided"})
+    return jsonify({"success": True, "count": received, "new": added})
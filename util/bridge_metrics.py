@@ -0,0 +1,209 @@
+"""
+Prometheus text-format metrics and health state for the bridge servers
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .handle_csv import save_to_csv
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 写入队列超过容量的这个比例时 /health 报 degraded
+QUEUE_DEGRADED_RATIO = 0.8
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"] + \
+               [f"{self.name}{_fmt(k)} {v:g}" for k, v in items]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelKey, List[float]] = {}  # 各 bucket 计数 + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _key(labels)
+        with self._lock:
+            v = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, v in items:
+            for bound, count in zip(self.buckets, v):
+                lines.append(f"{self.name}_bucket{_fmt(key, ('le', f'{bound:g}'))} {count:g}")
+            lines.append(f"{self.name}_bucket{_fmt(key, ('le', '+Inf'))} {v[-1]:g}")
+            lines.append(f"{self.name}_sum{_fmt(key)} {v[-2]:g}")
+            lines.append(f"{self.name}_count{_fmt(key)} {v[-1]:g}")
+        return lines
+
+
+class Registry:
+    """进程内的指标集合；统一 bridge 中各站点共用，用 site 标签区分。"""
+
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Tuple[str, str, str, Callable[[], Dict[LabelKey, float]]]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        metric = Counter(name, help)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collect(self, name: str, help: str, kind: str, fn: Callable[[], Dict[LabelKey, float]]):
+        """抓取时才计算的 gauge / counter，例如队列长度。"""
+        with self._lock:
+            self._collectors.append((name, help, kind, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        with self._lock:
+            collectors = list(self._collectors)
+        by_name: Dict[str, Tuple[str, str, Dict[LabelKey, float]]] = {}
+        for name, help, kind, fn in collectors:
+            by_name.setdefault(name, (help, kind, {}))[2].update(fn())
+        for name, (help, kind, values) in by_name.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_fmt(k)} {v:g}" for k, v in sorted(values.items()))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+REQUEST_SECONDS = REGISTRY.histogram("bridge_request_duration_seconds", "Bridge request latency by site and route")
+CSV_WRITE_SECONDS = REGISTRY.histogram("bridge_csv_write_duration_seconds",
+                                       "save_to_csv duration, including the existing-id scan of the target file")
+CSV_SCAN_SECONDS = REGISTRY.histogram("bridge_csv_scan_duration_seconds", "Full CSV reads (startup seeding)")
+BYTES_WRITTEN = REGISTRY.counter("bridge_csv_bytes_written_total", "Bytes appended to CSV files")
+META_LOOKUPS = REGISTRY.counter("bridge_meta_lookups_total", "jobs_meta index lookups by result (hit/miss)")
+IDEMPOTENT_REPLAYS = REGISTRY.counter("bridge_idempotent_replays_total",
+                                      "Retried uploads answered from the replay cache without touching disk")
+
+
+def timed_save(path: str, rows: List[Dict], check_existing: bool = True):
+    """save_to_csv，同时记录耗时和追加的字节数。"""
+    before = os.path.getsize(path) if os.path.exists(path) else 0
+    start = time.perf_counter()
+    save_to_csv(path, rows, check_existing=check_existing)
+    name = os.path.basename(path)
+    CSV_WRITE_SECONDS.observe(time.perf_counter() - start, file=name)
+    after = os.path.getsize(path) if os.path.exists(path) else 0
+    # save_to_csv 表头不一致时会重建文件，此时按新文件大小计
+    BYTES_WRITTEN.inc(after - before if after >= before else after, file=name)
+
+
+def register_store(site: str, store):
+    """把站点的待抓取队列和写入队列暴露为 gauge。"""
+    def dispatch_values():
+        stats = store.dispatch.stats()
+        return {_key({"site": site, "state": "pending"}): stats["pending"],
+                _key({"site": site, "state": "leased"}): stats["leased"]}
+
+    REGISTRY.collect("bridge_dispatch_urls", "Detail URLs waiting to be crawled (pending) or leased to a worker",
+                     "gauge", dispatch_values)
+    if getattr(store, "stream", None) is not None:
+        stream = store.stream
+        REGISTRY.collect("bridge_enrich_stream_events", "Accepted details not yet consumed by the streaming enrichment worker",
+                         "gauge", lambda: {_key({"site": site}): stream.depth()})
+    if store.writer is not None:
+        writer = store.writer
+        REGISTRY.collect("bridge_write_queue_rows", "Rows waiting in the write-behind queue", "gauge",
+                         lambda: {(): writer.depth()})
+        REGISTRY.collect("bridge_write_behind_rows_total", "Write-behind rows by outcome", "counter",
+                         lambda: {_key({"outcome": k}): v for k, v in writer.stats().items() if k != "depth"})
+
+
+def health(stores: Dict[str, object]) -> Tuple[Dict, bool]:
+    """返回 (状态, 是否健康)：写入队列接近上限或有丢弃的行时为 degraded。"""
+    sites = {}
+    writers = {}
+    for site, store in stores.items():
+        stats = store.dispatch.stats()
+        sites[site] = {"pending": stats["pending"], "leased": stats["leased"], "workers": len(stats["workers"])}
+        if store.writer is not None:
+            writers[id(store.writer)] = store.writer
+    healthy = True
+    write_queue = None
+    for writer in writers.values():
+        stats = writer.stats()
+        write_queue = dict(stats, capacity=writer.max_rows)
+        if stats["depth"] >= writer.max_rows * QUEUE_DEGRADED_RATIO or stats["dropped"]:
+            healthy = False
+    return {"status": "ok" if healthy else "degraded", "sites": sites, "write_queue": write_queue}, healthy
+
+
+def instrument(bp, site: str, get_store: Callable[[], object]):
+    """
+    给站点 Blueprint 加请求耗时统计和 /metrics、/health 路由。
+    store 在创建 app 时才载入，路由按 get_store() 取当前的 store；它的 gauge 由 register_store 注册。
+    """
+    from flask import Response, g, jsonify, request
+
+    @bp.before_request
+    def _start_timer():
+        g._bridge_start = time.perf_counter()
+
+    @bp.after_request
+    def _record_latency(response):
+        start = getattr(g, "_bridge_start", None)
+        if start is not None and request.url_rule is not None:
+            REQUEST_SECONDS.observe(time.perf_counter() - start, site=site,
+                                    route=request.url_rule.rule, status=response.status_code)
+        return response
+
+    @bp.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+    @bp.route('/health', methods=['GET'])
+    def health_check():
+        body, healthy = health({site: get_store()})
+        response = jsonify(body)
+        response.status_code = 200 if healthy else 503
+        return response
@@ -0,0 +1,74 @@
+"""
+Production serving for the Flask bridge servers
+"""
+
+import math
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Sequence, Union
+
+DEFAULT_THREADS = 8
+# /next_task 长轮询默认和最长挂起秒数
+DEFAULT_LONG_POLL_S = 25
+MAX_LONG_POLL_S = 60
+
+# 同时挂起的长轮询最多占一半线程，剩下的留给上传请求；serve() 时按实际线程数重设
+_long_poll_slots = threading.BoundedSemaphore(max(1, DEFAULT_THREADS // 2))
+
+
+def serve(app, port: Union[int, Sequence[int]], host: str = "0.0.0.0", threads: int = None):
+    """
+    用 waitress（纯 Python 的多线程 WSGI server，Windows/macOS 都可用）服务 bridge app；
+    没有安装 waitress 时退回 Flask 自带 server 的 threaded 模式。
+    port 可以是多个端口，同一个进程同时监听（统一 bridge 用它兼容各站点插件的旧端口）。
+    只用一个进程：待抓取队列和租约在进程内存里，多进程会各自派发同一批 URL。
+    csv 写入由 util.file_lock 串行化。线程数可用 BRIDGE_THREADS 配置。
+    """
+    ports = [port] if isinstance(port, int) else list(port)
+    global _long_poll_slots
+    threads = threads or int(os.getenv("BRIDGE_THREADS") or DEFAULT_THREADS)
+    _long_poll_slots = threading.BoundedSemaphore(max(1, threads // 2))
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        print("⚠️ waitress 未安装（pip install waitress），使用 Flask 开发服务器的多线程模式")
+        from werkzeug.serving import make_server
+        servers = [make_server(host, p, app, threaded=True) for p in ports]
+        for extra in servers[1:]:
+            threading.Thread(target=extra.serve_forever, daemon=True).start()
+        servers[0].serve_forever()
+        return
+    print(f"🚀 waitress: {', '.join(f'http://{host}:{p}' for p in ports)} ({threads} threads)")
+    waitress_serve(app, listen=" ".join(f"{host}:{p}" for p in ports), threads=threads)
+
+
+def busy_response(retry_after: float):
+    """写入队列已满：503 + Retry-After，插件按 retry_after 等待后重发。"""
+    from flask import jsonify
+    response = jsonify({"success": False, "busy": True, "retry_after": round(retry_after, 1),
+                        "message": "Write queue full, retry later"})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+@contextmanager
+def long_poll(requested: object = None) -> Iterator[float]:
+    """
+    给长轮询分配一个挂起名额，返回本次可以等待的秒数（不超过 MAX_LONG_POLL_S）。
+    名额用完时返回 0，请求立即应答，插件稍后再来。
+    """
+    try:
+        wait = float(requested) if requested is not None else DEFAULT_LONG_POLL_S
+    except (TypeError, ValueError):
+        wait = DEFAULT_LONG_POLL_S
+    wait = min(max(wait, 0), MAX_LONG_POLL_S)
+    slots = _long_poll_slots
+    if wait <= 0 or not slots.acquire(blocking=False):
+        yield 0
+        return
+    try:
+        yield wait
+    finally:
+        slots.release()
@@ -0,0 +1,117 @@
+"""
+Per-site bridge state: in-memory index of jobs_meta.csv, job identity aliases and the detail-page dispatch queue
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .bridge_metrics import CSV_SCAN_SECONDS, META_LOOKUPS, timed_save
+from .canonical import AliasIndex
+from .enrich_stream import EnrichStream
+from .dispatch_queue import DEFAULT_LEASE_S, DispatchQueue, read_csv_rows
+from .handle_csv import generate_job_id
+from .write_behind import WriteBehindWriter, project_row
+
+
+class SiteStore:
+    """
+    启动时读一次 jobs_meta.csv / jobs_meta_updated.csv，之后 meta 按 canonical _id 建内存索引，
+    upload_detail 查 meta 不再扫描文件。csv 仍是持久化格式（csv_processor 从这里读）。
+    岗位身份由 AliasIndex 决定：URL 的各种变体和出现过的 _id 都映射到第一次见到的 _id，
+    aliases_file 为 None 时别名只保存在内存里。
+    传入 writer 时 csv 追加交给后台线程（write-behind），否则同步写入。
+    传入 stream 时，每条接收的详情都会发布给流式 enrichment worker。
+    """
+
+    def __init__(self, meta_file: str, updated_file: str, normalize_url: Callable[[str], str],
+                 lease_s: float = DEFAULT_LEASE_S, writer: Optional[WriteBehindWriter] = None,
+                 name: str = "", stream: Optional[EnrichStream] = None, aliases_file: Optional[str] = None):
+        self.name = name  # 站点名，用作指标的 site 标签
+        self.meta_file = meta_file
+        self.updated_file = updated_file
+        self.normalize_url = normalize_url
+        self.writer = writer
+        self.stream = stream
+        self.dispatch = DispatchQueue(normalize_url, lease_s)
+        self.aliases = AliasIndex(aliases_file, normalize_url)
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, Dict] = {}  # canonical _id -> jobs_meta 行
+
+    def load(self) -> "SiteStore":
+        start = time.perf_counter()
+        meta_rows = read_csv_rows(self.meta_file)
+        updated_rows = read_csv_rows(self.updated_file)
+        CSV_SCAN_SECONDS.observe(time.perf_counter() - start, site=self.name)
+        # 先登记详情行：它们的 _id 已经写进了 jobs_gemini_edited 等下游文件，作为 canonical 保持不变
+        self.aliases.assign_rows(updated_rows)
+        with self._lock:
+            for row, job_id in zip(meta_rows, self.aliases.assign_rows(meta_rows)):
+                self._by_id.setdefault(job_id, row)
+        self.aliases.flush()
+        self.dispatch.seed_rows(meta_rows, updated_rows)
+        print(f"🔗 Aliases: {len(self.aliases)} URL/_id variants")
+        return self
+
+    def identify(self, url: str, default: Optional[str] = None) -> str:
+        """上传的 URL 对应的 canonical _id（一次哈希查找）；没见过的岗位以 default 登记。"""
+        return self.aliases.assign(url, default=default)
+
+    def _append(self, path: str, rows: List[Dict], check_existing: bool = True) -> bool:
+        if self.writer is None:
+            timed_save(path, [project_row(row) for row in rows], check_existing)
+            return True
+        return self.writer.submit(path, rows, check_existing)
+
+    def add_jobs(self, jobs: List[Dict]) -> Optional[int]:
+        """
+        upload_list：按内存索引（_id 或规范化 URL）去重，只把新职位追加到 jobs_meta.csv，
+        写入时不再读整个文件查重。返回新增数量，写入队列已满时返回 None（已预占的索引回滚）。
+        """
+        new = []
+        with self._lock:
+            for job in jobs:
+                url = job.get("source_url")
+                if not url:
+                    continue
+                job_id = self.aliases.assign(url, default=generate_job_id(url))
+                if job_id in self._by_id:
+                    continue
+                # 先占住索引，并发的重复请求不会再写一遍
+                row = self._by_id[job_id] = dict(project_row(job), _id=job_id)
+                new.append(row)
+        self.aliases.flush()
+        if new and not self._append(self.meta_file, new, check_existing=False):
+            with self._lock:
+                for row in new:
+                    if self._by_id.get(row["_id"]) is row:
+                        del self._by_id[row["_id"]]
+            return None
+        self.dispatch.add(new)
+        return len(new)
+
+    def meta_for(self, job_id: Optional[str] = None, url: Optional[str] = None) -> Dict:
+        """按 URL 的任一变体或任一别名 _id 找列表页信息，找不到返回空 dict。"""
+        canonical = self.aliases.resolve(url, job_id) or job_id
+        with self._lock:
+            meta = self._by_id.get(canonical, {}) if canonical else {}
+        META_LOOKUPS.inc(site=self.name, result="hit" if meta else "miss")
+        return meta
+
+    def save_details(self, rows: List[Dict], source_urls: Iterable[str], worker_ids: Iterable[Optional[str]]) -> bool:
+        """upload_detail(s)：一次写入 jobs_meta_updated.csv，再从待抓取队列中移除。写入队列已满时返回 False。"""
+        self.aliases.flush()
+        if not self._append(self.updated_file, rows):
+            return False
+        for row, url, worker_id in zip(rows, source_urls, worker_ids):
+            self.dispatch.done(row["_id"], url, worker_id)
+        if self.stream is not None:
+            try:
+                self.stream.publish(rows)
+            except Exception as e:
+                # 详情已经写入，漏掉的行会在下次 process_csv 的合并中处理
+                print(f"⚠️ enrich stream 发布失败: {e}")
+        return True
+
+    def retry_after(self) -> float:
+        return self.writer.retry_after() if self.writer is not None else 0
@@ -0,0 +1,126 @@
+"""
+Canonical job URLs per site and a persistent alias index resolving URL variants and _ids to one job id
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .handle_csv import generate_job_id
+
+
+class UrlRule(NamedTuple):
+    strip_scheme: bool = False
+    lowercase: bool = False
+
+
+# 各站点原先 server.py 里 clean_url 的规则；改规则会改变派发队列的键，旧 URL 仍可经 alias 表找回
+SITE_RULES: Dict[str, UrlRule] = {
+    "boss": UrlRule(),
+    "zhilian": UrlRule(strip_scheme=True, lowercase=True),
+    "wellfound": UrlRule(),
+}
+
+
+def canonical_url(url: Optional[str], site: Optional[str] = None) -> str:
+    """去掉查询参数、锚点和末尾斜杠；按站点规则再去掉协议头、转小写。"""
+    if not url:
+        return ""
+    rule = SITE_RULES.get(site, UrlRule())
+    if rule.strip_scheme:
+        url = url.replace("https://", "").replace("http://", "")
+    url = url.split("?")[0].split("#")[0].strip().rstrip("/")
+    return url.lower() if rule.lowercase else url
+
+
+class AliasIndex:
+    """
+    把同一个岗位的所有 URL 变体（规范化后的和原始的）以及出现过的所有 _id 映射到同一个 canonical _id，
+    第一次见到的 _id 即为 canonical，之后不再改变。查找只是一次 dict 查询；
+    新别名先记在内存，flush() 时批量写入 sqlite（path 为 None 时只在内存中）。
+    """
+
+    def __init__(self, path: Optional[str], normalize_url: Callable[[str], str]):
+        self.path = path
+        self.normalize_url = normalize_url
+        self._lock = threading.RLock()
+        self._aliases: Dict[str, str] = {}
+        self._unsaved: List[Tuple[str, str]] = []
+        self._conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS aliases (alias TEXT PRIMARY KEY, canonical_id TEXT NOT NULL)"
+            )
+            self._aliases.update(self._conn.execute("SELECT alias, canonical_id FROM aliases").fetchall())
+
+    def close(self):
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _keys(self, url: Optional[str], job_id: Optional[str]) -> List[str]:
+        keys = []
+        key = self.normalize_url(url or "")
+        if key:
+            keys.append("url:" + key)
+            raw = url.strip()
+            if raw != key:
+                keys.append("raw:" + raw)
+        if job_id:
+            keys.append("id:" + job_id)
+        return keys
+
+    def resolve(self, url: Optional[str] = None, job_id: Optional[str] = None) -> Optional[str]:
+        """URL 优先，其次 _id；都没见过返回 None。"""
+        with self._lock:
+            for key in self._keys(url, job_id):
+                if key in self._aliases:
+                    return self._aliases[key]
+        return None
+
+    def assign(self, url: Optional[str] = None, job_id: Optional[str] = None, default: Optional[str] = None) -> str:
+        """
+        返回 canonical _id，并把这次出现的 URL 和 _id 记为它的别名。
+        没见过的岗位使用 default，其次 job_id，最后按原始 URL 计算（与 save_to_csv 原来的算法一致）。
+        """
+        with self._lock:
+            keys = self._keys(url, job_id)
+            canonical = next((self._aliases[k] for k in keys if k in self._aliases), None)
+            canonical = canonical or default or job_id or generate_job_id(url)
+            for key in keys:
+                if key not in self._aliases:
+                    self._aliases[key] = canonical
+                    self._unsaved.append((key, canonical))
+            return canonical
+
+    def assign_rows(self, rows: Iterable[Dict]) -> List[str]:
+        return [self.assign(row.get("source_url"), row.get("_id")) for row in rows]
+
+    def flush(self):
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, []
+            if not unsaved or self._conn is None:
+                return
+            with self._tx():
+                self._conn.executemany("INSERT OR IGNORE INTO aliases (alias, canonical_id) VALUES (?, ?)", unsaved)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._aliases)
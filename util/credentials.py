@@ -0,0 +1,108 @@
+"""
+Gemini API key pool with per-key, per-model usage counters and 429 cooldowns
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .genai_client import load_env
+
+DEFAULT_COOLDOWN_S = 60
+
+
+def mask_key(api_key: Optional[str]) -> str:
+    if not api_key:
+        return "<none>"
+    return f"...{api_key[-4:]}"
+
+
+def key_id(api_key: str) -> str:
+    """持久化记录用的 key 标识，不落盘明文 key。"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def load_api_keys() -> List[str]:
+    """
+    从环境变量（.env 已由调用方加载）读取所有 key：
+    GEMINI_API_KEYS=key1,key2,...，以及 GEMINI_API_KEY、GEMINI_API_KEY_1、GEMINI_API_KEY_2 ...
+    """
+    keys = []
+    for k in (os.getenv("GEMINI_API_KEYS") or "").split(","):
+        keys.append(k.strip())
+    keys.append((os.getenv("GEMINI_API_KEY") or "").strip())
+    i = 1
+    while os.getenv(f"GEMINI_API_KEY_{i}"):
+        keys.append(os.getenv(f"GEMINI_API_KEY_{i}").strip())
+        i += 1
+    seen = set()
+    return [k for k in keys if k and not (k in seen or seen.add(k))]
+
+
+class CredentialPool:
+    """按最久未使用分配 key；某个 key 在某个模型上被 429 后进入冷却，期间不再分配。"""
+
+    def __init__(self, keys: List[str], cooldown_s: float = DEFAULT_COOLDOWN_S):
+        self.keys = list(keys)
+        self.cooldown_s = cooldown_s
+        self._lock = threading.Lock()
+        self._last_used: Dict[Tuple[str, str], float] = {}
+        self._cooldown_until: Dict[Tuple[str, str], float] = {}
+        self._usage: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    def _stats(self, key: str, model: str) -> Dict[str, int]:
+        return self._usage.setdefault((key, model), {"requests": 0, "rate_limited": 0})
+
+    def available(self, model: str) -> bool:
+        now = time.time()
+        with self._lock:
+            return any(self._cooldown_until.get((k, model), 0) <= now for k in self.keys)
+
+    def acquire(self, model: str) -> str:
+        """
+        返回不在冷却中、最久未使用的 key。
+        全部冷却时返回最早结束冷却的 key，由调用方决定等待还是切换模型。
+        """
+        if not self.keys:
+            raise ValueError("No Gemini API key configured (set GEMINI_API_KEYS or GEMINI_API_KEY in .env)")
+        now = time.time()
+        with self._lock:
+            ready = [k for k in self.keys if self._cooldown_until.get((k, model), 0) <= now]
+            if ready:
+                key = min(ready, key=lambda k: self._last_used.get((k, model), 0))
+            else:
+                key = min(self.keys, key=lambda k: self._cooldown_until.get((k, model), 0))
+            self._last_used[(key, model)] = now
+            self._stats(key, model)["requests"] += 1
+        return key
+
+    def report_rate_limited(self, key: Optional[str], model: str, retry_after: Optional[float] = None):
+        if not key:
+            return
+        with self._lock:
+            self._cooldown_until[(key, model)] = time.time() + (retry_after or self.cooldown_s)
+            self._stats(key, model)["rate_limited"] += 1
+
+    def usage(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """{masked_key: {model: {"requests": n, "rate_limited": n}}}"""
+        with self._lock:
+            result = {}
+            for (key, model), stats in self._usage.items():
+                result.setdefault(mask_key(key), {})[model] = dict(stats)
+            return result
+
+
+_pool: Optional[CredentialPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_credential_pool() -> CredentialPool:
+    """进程内共享的 key 池，多个站点的 gemini_processor 共用同一份冷却状态。第一次调用时加载 .env。"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            load_env()
+            _pool = CredentialPool(load_api_keys())
+        return _pool
@@ -0,0 +1,193 @@
+"""
+In-memory pending queue of detail-page URLs for the bridge servers' /get_next_url,
+leased to browser workers so several extension instances can crawl in parallel
+"""
+
+import csv
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from .handle_csv import generate_job_id
+
+# 一个详情页从派发到上传通常不到一分钟，超过租期没有上传就重新排队
+DEFAULT_LEASE_S = 300
+DEFAULT_WORKER = "default"
+
+
+class Lease(NamedTuple):
+    url: str
+    worker: str
+    deadline: float
+
+
+class DispatchQueue:
+    """
+    启动时读一次 jobs_meta.csv 和 jobs_meta_updated.csv，之后只在内存里维护：
+    upload_list 追加、upload_detail 出队，get_next_url 不再读磁盘。
+    以 normalize_url 之后的 URL 为键，_id 或规范化 URL 任一已处理即视为完成（各站点的 _id 算法不完全一致）。
+
+    多个浏览器实例按 worker_id 租用 URL：同一个 URL 同一时间只租给一个 worker，
+    lease_s 秒内没有上传详情就放回队首，交给下一个来要任务的 worker。
+    lease(timeout=...) 在没有任务时挂起等待（长轮询），upload_list 加入新 URL 或租约到期时立即唤醒。
+    """
+
+    def __init__(self, normalize_url: Callable[[str], str], lease_s: float = DEFAULT_LEASE_S):
+        self.normalize_url = normalize_url
+        self.lease_s = lease_s
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._pending: "OrderedDict[str, str]" = OrderedDict()  # 规范化 URL -> 原始 URL
+        # 租期相同，按租出顺序排列即按到期时间排列
+        self._leased: "OrderedDict[str, Lease]" = OrderedDict()
+        self._lease_by_worker: Dict[str, str] = {}
+        self._key_by_id: Dict[str, str] = {}
+        self._done: Set[str] = set()
+        self._workers: Dict[str, Dict[str, Any]] = {}
+
+    def _is_done(self, job_id: str, key: str) -> bool:
+        return (job_id and job_id in self._done) or key in self._done
+
+    def _add(self, job_id: str, url: str) -> bool:
+        key = self.normalize_url(url)
+        if not key or key in self._pending or key in self._leased or self._is_done(job_id, key):
+            return False
+        self._pending[key] = url
+        if job_id:
+            self._key_by_id[job_id] = key
+        self._cond.notify_all()
+        return True
+
+    def seed(self, meta_file: str, updated_file: str):
+        self.seed_rows(read_csv_rows(meta_file), read_csv_rows(updated_file))
+
+    def seed_rows(self, meta_rows: Iterable[Dict], updated_rows: Iterable[Dict]):
+        with self._lock:
+            for row in updated_rows:
+                if row.get("_id"):
+                    self._done.add(row["_id"])
+                key = self.normalize_url(row.get("source_url") or "")
+                if key:
+                    self._done.add(key)
+            for row in meta_rows:
+                self._add(row.get("_id") or "", row.get("source_url") or "")
+        print(f"📋 Dispatch queue: {len(self._pending)} pending, {len(self._done)} done keys")
+
+    def add(self, jobs: Iterable[Dict]) -> int:
+        """upload_list 收到的列表页职位；没有 _id 时与 save_to_csv 一致按原始 source_url 计算。"""
+        with self._lock:
+            return sum(self._add(job.get("_id") or generate_job_id(job.get("source_url")), job.get("source_url") or "")
+                       for job in jobs if job.get("source_url"))
+
+    def _worker(self, worker_id: str) -> Dict[str, Any]:
+        stats = self._workers.get(worker_id)
+        if stats is None:
+            stats = {"leased": 0, "completed": 0, "expired": 0, "first_seen": time.time(), "last_seen": 0.0}
+            self._workers[worker_id] = stats
+        stats["last_seen"] = time.time()
+        return stats
+
+    def _expire(self, now: float):
+        expired = []
+        while self._leased:
+            key, lease = next(iter(self._leased.items()))
+            if lease.deadline > now:
+                break
+            del self._leased[key]
+            if self._lease_by_worker.get(lease.worker) == key:
+                del self._lease_by_worker[lease.worker]
+            self._workers[lease.worker]["expired"] += 1
+            expired.append((key, lease.url))
+        # 过期的按原顺序放回队首
+        for key, url in reversed(expired):
+            self._pending[key] = url
+            self._pending.move_to_end(key, last=False)
+
+    def lease(self, worker_id: Optional[str] = None, timeout: float = 0) -> Optional[str]:
+        """
+        给 worker 租一个 URL。worker 手上已有未到期的租约时返回同一个 URL
+        （详情上传失败后插件会重新要任务），否则从队首取一个。
+        队列为空时最多等待 timeout 秒，仍没有任务返回 None。
+        """
+        worker_id = worker_id or DEFAULT_WORKER
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                self._expire(now)
+                stats = self._worker(worker_id)
+                key = self._lease_by_worker.get(worker_id)
+                if key is not None:
+                    return self._leased[key].url
+                if self._pending:
+                    key, url = self._pending.popitem(last=False)
+                    self._leased[key] = Lease(url, worker_id, now + self.lease_s)
+                    self._lease_by_worker[worker_id] = key
+                    stats["leased"] += 1
+                    return url
+                remaining = deadline - now
+                if remaining <= 0:
+                    return None
+                # 其他 worker 的租约可能在等待期间到期，到期时醒来接手
+                if self._leased:
+                    remaining = min(remaining, next(iter(self._leased.values())).deadline - now)
+                self._cond.wait(max(remaining, 0.01))
+
+    def drained(self) -> bool:
+        """没有待抓取也没有租出未完成的 URL：除非 upload_list 再发现新职位，否则没有任务了。"""
+        with self._lock:
+            return not self._pending and not self._leased
+
+    def done(self, job_id: str, url: str, worker_id: Optional[str] = None):
+        with self._lock:
+            key = self.normalize_url(url or "")
+            completed_by = worker_id
+            for k in (key, self._key_by_id.pop(job_id, None)):
+                if not k:
+                    continue
+                self._pending.pop(k, None)
+                lease = self._leased.pop(k, None)
+                if lease is not None:
+                    completed_by = completed_by or lease.worker
+                    if self._lease_by_worker.get(lease.worker) == k:
+                        del self._lease_by_worker[lease.worker]
+                self._done.add(k)
+            if job_id:
+                self._done.add(job_id)
+            if completed_by:
+                self._worker(completed_by)["completed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """队列长度和每个 worker 的吞吐（completed_per_min 按首次出现至今计算）。"""
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            workers = {}
+            for worker_id, s in self._workers.items():
+                minutes = max((now - s["first_seen"]) / 60, 1 / 60)
+                workers[worker_id] = {
+                    "leased": s["leased"],
+                    "completed": s["completed"],
+                    "expired": s["expired"],
+                    "holding": self._lease_by_worker.get(worker_id) is not None,
+                    "completed_per_min": round(s["completed"] / minutes, 2),
+                    "idle_s": round(now - s["last_seen"], 1),
+                }
+            return {"pending": len(self._pending), "leased": len(self._leased), "workers": workers}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._leased)
+
+
+def read_csv_rows(path: str) -> List[Dict]:
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            return list(csv.DictReader(f))
+    except Exception as e:
+        print(f"读取 {os.path.basename(path)} 出错: {e}")
+        return []
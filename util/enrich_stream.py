@@ -0,0 +1,91 @@
+"""
+Local event stream from the bridge server to the streaming enrichment worker
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# bridge server 设置 BRIDGE_STREAM_ENRICH=1 时才发布事件
+STREAM_ENV = "BRIDGE_STREAM_ENRICH"
+DEFAULT_READ_LIMIT = 100
+
+
+def stream_enabled() -> bool:
+    return os.getenv(STREAM_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+class EnrichStream:
+    """
+    每个站点一个 sqlite 文件（与 work_queue.db 同目录），server 进程写、enrichment 进程读。
+    事件带上完整的详情行，worker 不用再去读 jobs_meta_updated.csv（write-behind 下可能还没落盘）。
+    read() 之后调用 ack() 才删除，worker 崩溃时事件会在下次启动时重新读到（至少一次）。
+    worker 在对应任务结束后才 ack，还没处理完的事件就是该行唯一的持久副本；用 read(after=...) 越过它们读新事件。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def publish(self, rows: Iterable[Dict]) -> int:
+        now = time.time()
+        events = [(row["_id"], json.dumps(row, ensure_ascii=False), now) for row in rows if row.get("_id")]
+        if events:
+            with self._tx():
+                self._conn.executemany("INSERT INTO events (job_id, payload, created_at) VALUES (?, ?, ?)", events)
+        return len(events)
+
+    def read(self, limit: int = DEFAULT_READ_LIMIT, after: int = 0) -> List[Tuple[int, Dict]]:
+        """按发布顺序取出 seq > after 的最多 limit 条 (seq, row)，不删除。"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, payload FROM events WHERE seq > ? ORDER BY seq LIMIT ?", (after, limit)
+            ).fetchall()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    def ack(self, seqs: Iterable[int]):
+        seqs = [(seq,) for seq in seqs]
+        if seqs:
+            with self._tx():
+                self._conn.executemany("DELETE FROM events WHERE seq = ?", seqs)
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+
+def open_stream(path: str) -> Optional[EnrichStream]:
+    """server 端使用：未开启流式模式时返回 None。"""
+    return EnrichStream(path) if stream_enabled() else None
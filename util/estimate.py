@@ -0,0 +1,106 @@
+"""
+Offline token / wall-time estimator for Gemini enrichment runs (no network calls)
+"""
+
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .tokens import estimate_tokens
+
+# 速率限制与延迟模型的默认值，可按 key 的实际配额覆盖
+DEFAULT_RPM = 60
+DEFAULT_TPM = 1_000_000
+DEFAULT_BASE_LATENCY_S = 3.0
+DEFAULT_OUTPUT_TOKENS_PER_S = 100.0
+# 标题、tags、JSON 键名等固定输出
+ENRICH_OUTPUT_OVERHEAD = 150
+TRANSLATE_OUTPUT_OVERHEAD = 40
+
+
+def enrich_requests(rows: List[Dict], build_prompt: Callable[[str, str], str]) -> List[Tuple[int, int]]:
+    """每行一次 get_optimized_job_info 调用：(prompt_tokens, output_tokens)。"""
+    requests = []
+    for row in rows:
+        description = row.get('description', '')
+        prompt_tokens = estimate_tokens(build_prompt(row.get('title', ''), description))
+        # description_chinese + description_english，各自与原文长度相当
+        output_tokens = 2 * estimate_tokens(description) + ENRICH_OUTPUT_OVERHEAD
+        requests.append((prompt_tokens, output_tokens))
+    return requests
+
+
+def translate_requests(rows: List[Dict], build_prompt: Callable[[List[Dict]], str],
+                       batch_size: int) -> List[Tuple[int, int]]:
+    """按 batch_size 分批调用 translate_chinese_to_english：(prompt_tokens, output_tokens)。"""
+    requests = []
+    for i in range(0, len(rows), max(batch_size, 1)):
+        batch = rows[i:i + max(batch_size, 1)]
+        prompt_tokens = estimate_tokens(build_prompt(batch))
+        output_tokens = sum(
+            estimate_tokens(r.get('title_chinese', '')) + estimate_tokens(r.get('description_chinese', ''))
+            + estimate_tokens(r.get('summary_chinese', '')) + TRANSLATE_OUTPUT_OVERHEAD
+            for r in batch
+        )
+        requests.append((prompt_tokens, output_tokens))
+    return requests
+
+
+def estimate_run(requests: List[Tuple[int, int]], concurrency: int = 1, rpm: int = DEFAULT_RPM,
+                 tpm: int = DEFAULT_TPM, delay_between_jobs: float = 0,
+                 daily_request_limit: Optional[int] = None,
+                 base_latency_s: float = DEFAULT_BASE_LATENCY_S,
+                 output_tokens_per_s: float = DEFAULT_OUTPUT_TOKENS_PER_S) -> Dict:
+    """
+    预计耗时取三者最大值：worker 串行耗时 / concurrency、RPM 下限、TPM 下限。
+    daily_request_limit 之外的请求不计入本次运行，只在 over_quota 中报告；额度为 0 时 days_needed 为 None。
+    """
+    over_quota = 0
+    if daily_request_limit is not None and len(requests) > daily_request_limit:
+        over_quota = len(requests) - daily_request_limit
+        requests = requests[:daily_request_limit]
+
+    n = len(requests)
+    prompt_tokens = sum(p for p, _ in requests)
+    output_tokens = sum(o for _, o in requests)
+    busy_s = sum(base_latency_s + o / output_tokens_per_s for _, o in requests)
+    busy_s += delay_between_jobs * max(n - 1, 0)
+
+    floors = {
+        "latency": busy_s / max(concurrency, 1),
+        "rpm": n / rpm * 60 if rpm else 0,
+        "tpm": (prompt_tokens + output_tokens) / tpm * 60 if tpm else 0,
+    }
+    bottleneck = max(floors, key=floors.get)
+
+    if not daily_request_limit:
+        # 没有剩余额度（今天已用完或没有配置 key）时无法按额度推算天数，days_needed 为 None 表示无上界
+        days_needed = None if daily_request_limit == 0 and over_quota else 1
+    else:
+        days_needed = math.ceil((n + over_quota) / daily_request_limit)
+
+    return {
+        "requests": n,
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "wall_time_s": floors[bottleneck],
+        "bottleneck": bottleneck,
+        "hits_quota": over_quota > 0,
+        "over_quota": over_quota,
+        "days_needed": days_needed,
+    }
+
+
+def print_estimate(label: str, est: Dict):
+    hours, rem = divmod(int(est["wall_time_s"]), 3600)
+    minutes, seconds = divmod(rem, 60)
+    print(f"📐 {label}")
+    print(f"   Requests: {est['requests']}")
+    print(f"   Tokens: {est['prompt_tokens']} prompt + {est['output_tokens']} output")
+    print(f"   Projected wall time: {hours}h {minutes}m {seconds}s (bound by {est['bottleneck']})")
+    if est["hits_quota"] and est["days_needed"] is None:
+        print(f"   ⚠️ No quota available (daily limit used up or no API key configured): "
+              f"{est['over_quota']} requests cannot run, days needed unbounded")
+    elif est["hits_quota"]:
+        print(f"   ⚠️ Will hit quota: {est['over_quota']} requests left over, ~{est['days_needed']} days needed")
+    else:
+        print(f"   ✅ Fits in quota")
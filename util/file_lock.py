@@ -0,0 +1,48 @@
+"""
+Per-file write lock shared by threads in one process and by separate processes
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _thread_lock(path: str) -> threading.Lock:
+    with _locks_guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def locked(path: str):
+    """
+    串行化对同一个文件的读改写：进程内用 threading.Lock，进程间用 path + ".lock" 上的 advisory lock。
+    bridge server 多线程处理请求时，同一时刻只有一个请求在追加 csv。
+    """
+    path = os.path.abspath(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with _thread_lock(path):
+        with open(path + ".lock", "a+b") as f:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if os.name == "nt":
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+                else:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
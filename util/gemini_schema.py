@@ -0,0 +1,105 @@
+"""
+Response schemas for schema-constrained Gemini JSON output
+"""
+
+from typing import Any, Dict, List, Optional, Sequence
+
+TAGS_MIN = 5
+TAGS_MAX = 7
+
+JOB_TEXT_FIELDS = ("title_chinese", "title_english", "description_chinese", "description_english")
+JOB_TAG_FIELDS = ("tags_chinese", "tags_english")
+JOB_FIELDS = JOB_TEXT_FIELDS + JOB_TAG_FIELDS
+# 字段组：prompt 按组维护版本，重新生成时也按组进行
+FIELD_GROUPS = {
+    "title": ("title_chinese", "title_english"),
+    "tags": ("tags_chinese", "tags_english"),
+    "description": ("description_chinese", "description_english"),
+}
+
+
+def _tags_schema() -> Dict[str, Any]:
+    return {"type": "ARRAY", "items": {"type": "STRING"}, "min_items": TAGS_MIN, "max_items": TAGS_MAX}
+
+
+def job_info_schema(remote_check: bool = True, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """
+    get_optimized_job_info 的输出 schema。
+    remote_check=True 时模型必须给出 is_remote；非远程岗位只返回 {"is_remote": false}，
+    所以其余字段不能设为 required。
+    fields 用于只补全部分字段的请求，此时只包含这些字段且全部 required。
+    """
+    properties = {field: {"type": "STRING"} for field in JOB_TEXT_FIELDS}
+    for field in JOB_TAG_FIELDS:
+        properties[field] = _tags_schema()
+    if fields is not None:
+        return {
+            "type": "OBJECT",
+            "properties": {field: properties[field] for field in fields},
+            "required": list(fields),
+        }
+    schema = {"type": "OBJECT", "properties": properties}
+    if remote_check:
+        properties["is_remote"] = {"type": "BOOLEAN"}
+        schema["required"] = ["is_remote"]
+    else:
+        schema["required"] = list(JOB_FIELDS)
+    return schema
+
+
+TRANSLATION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "translations": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "id": {"type": "STRING"},
+                    "title_english": {"type": "STRING"},
+                    "description_english": {"type": "STRING"},
+                    "summary_english": {"type": "STRING"},
+                },
+                "required": ["id", "title_english", "description_english", "summary_english"],
+            },
+        },
+    },
+    "required": ["translations"],
+}
+
+
+def missing_job_fields(data: Any, fields: Sequence[str] = JOB_FIELDS) -> List[str]:
+    """缺失或类型不对的字段，用于只补全这些字段。"""
+    if not isinstance(data, dict):
+        return list(fields)
+    missing = []
+    for field in fields:
+        value = data.get(field)
+        if field in JOB_TAG_FIELDS:
+            ok = isinstance(value, list)
+        else:
+            ok = isinstance(value, str) and bool(value.strip())
+        if not ok:
+            missing.append(field)
+    return missing
+
+
+def validate_job_info(data: Any, remote_check: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    校验并归一化 get_optimized_job_info 的输出。
+    非远程返回 {}（与原来的空对象约定一致），缺字段或类型不对返回 None。
+    """
+    if not isinstance(data, dict):
+        return None
+    if len(data) == 0 or (remote_check and data.get("is_remote") is False):
+        return {}
+    if missing_job_fields(data):
+        return None
+    data.pop("is_remote", None)
+    return data
+
+
+def validate_translations(data: Any) -> Optional[Dict[str, Any]]:
+    if not isinstance(data, dict) or not isinstance(data.get("translations"), list):
+        return None
+    return data
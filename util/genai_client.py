@@ -0,0 +1,60 @@
+"""
+Deferred .env loading and per-key google-genai clients
+"""
+
+import os
+import threading
+from typing import Dict, Optional
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+
+_lock = threading.Lock()
+_env_loaded = False
+_genai = None
+_clients: Dict[str, object] = {}
+
+
+def load_env():
+    """第一次需要配置时才加载项目根目录的 .env，重复调用无开销。"""
+    global _env_loaded
+    with _lock:
+        if _env_loaded:
+            return
+        from dotenv import load_dotenv
+        load_dotenv(ENV_FILE)
+        _env_loaded = True
+
+
+def get_genai():
+    """
+    google-genai SDK（from google import genai）导入很慢（httpx、pydantic），只在第一次真正调用模型时导入。
+    不调用模型的菜单项、bridge server 和 dry run 都不会加载它。
+    """
+    global _genai
+    if _genai is None:
+        load_env()
+        with _lock:
+            if _genai is None:
+                from google import genai
+                _genai = genai
+    return _genai
+
+
+def get_client(api_key: str):
+    """
+    每个 key 一个 genai.Client，创建后复用。key 通过公开的 Client(api_key=...) 绑定在 client 上，
+    不经过进程级的全局配置：对冲线程和并发 worker 的请求、429 和用量都记在各自的 key 上。
+    """
+    genai = get_genai()
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = genai.Client(api_key=api_key)
+        return client
+
+
+def generate_content(model_name: str, api_key: str, contents, config, timeout: Optional[float] = None):
+    """用该 key 的 client 发一次 generate_content；timeout 单位为秒（SDK 的 http_options 以毫秒计）。"""
+    if timeout:
+        config = config.model_copy(update={"http_options": get_genai().types.HttpOptions(timeout=int(timeout * 1000))})
+    return get_client(api_key).models.generate_content(model=model_name, contents=contents, config=config)
@@ -6,6 +6,8 @@ import csv
 import os
 import hashlib
 
+from .file_lock import locked
+
 
 def generate_job_id(source_url: str) -> str:
     if not source_url:
@@ -20,7 +22,12 @@ fieldnames = [
 ]
 
 
-def save_to_csv(filename, jobs, _type="国内"):
+def save_to_csv(filename, jobs, _type="国内", check_existing=True):
+    """
+    追加写入并按 _id 去重。行里带 _id 时使用它（bridge 按 util.canonical 的别名表解析出的 canonical _id），
+    否则按 source_url 计算。check_existing=False 时不读取整个文件收集已有 _id，
+    只在本批内去重：调用方（bridge 的 SiteStore）已经用内存索引去过重。
+    """
     def headers_are_correct(file_path, expected_headers):
         with open(file_path, "r", encoding="utf-8-sig") as f:
             reader = csv.reader(f)
@@ -34,30 +41,32 @@ def save_to_csv(filename, jobs, _type="国内"):
                     keys.add(_row.get("_id"))
         return keys
 
-    if os.path.exists(filename) and not headers_are_correct(filename, fieldnames):
-        os.remove(filename)
-
-    existing_keys = load_existing_keys(filename)
-    write_header = not os.path.exists(filename)
-
-    written = 0
-    skipped_dupe = 0
-
-    with open(filename, "a", newline="", encoding="utf-8-sig") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        if write_header:
-            writer.writeheader()
-        for item in jobs:
-            job_id = generate_job_id(item.get("source_url"))
-            if job_id in existing_keys:
-                skipped_dupe += 1
-                continue
-            row = {k: v for k, v in item.items() if k != "link"}
-            row["_id"] = job_id
-            row["type"] = item.get("type", _type)
-            writer.writerow(row)
-            existing_keys.add(job_id)
-            written += 1
+    # 多线程的 bridge server 和其他进程可能同时写同一个文件
+    with locked(filename):
+        if os.path.exists(filename) and not headers_are_correct(filename, fieldnames):
+            os.remove(filename)
+
+        existing_keys = load_existing_keys(filename) if check_existing else set()
+        write_header = not os.path.exists(filename)
+
+        written = 0
+        skipped_dupe = 0
+
+        with open(filename, "a", newline="", encoding="utf-8-sig") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            if write_header:
+                writer.writeheader()
+            for item in jobs:
+                job_id = item.get("_id") or generate_job_id(item.get("source_url"))
+                if job_id in existing_keys:
+                    skipped_dupe += 1
+                    continue
+                row = {k: v for k, v in item.items() if k != "link"}
+                row["_id"] = job_id
+                row["type"] = item.get("type", _type)
+                writer.writerow(row)
+                existing_keys.add(job_id)
+                written += 1
 
     print(f"✅ save_to_csv -> written: {written}, skipped duplicates: {skipped_dupe}, file: {filename}")
 
@@ -0,0 +1,129 @@
+"""
+Hedged requests: send a duplicate once a call is slower than the observed p95 latency
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_WINDOW = 200
+
+
+def _spawn(fn: Callable[[], T]) -> Future:
+    """
+    在 daemon 线程中执行，输掉的请求无法中断，只能丢弃结果，不能让它阻塞退出。
+    future.elapsed 是这个请求自己的耗时（不含对冲前的等待）。
+    """
+    future = Future()
+    future.elapsed = None
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        start = time.monotonic()
+        try:
+            result = fn()
+            future.elapsed = time.monotonic() - start
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class Hedger:
+    """
+    每个模型维护最近 window 次成功调用的耗时。样本数达到 min_samples 后，
+    主请求超过 p95 仍未返回时再发一个对冲请求，先返回有效结果的一方胜出。
+    输掉的请求不会被取消（已发出的 HTTP 请求无法中断），只是被放弃：它照常跑完、消耗配额并记入 ledger。
+    所以每次对冲都是一次额外的完整请求，对冲数限制在实际发出的请求数的 hedge_percent% 以内；
+    hedge_percent=0 时完全不启用，直接在当前线程调用。
+    延迟样本记录每个请求自己的耗时（包括被放弃的请求），不含对冲前的等待，避免 p95 被抬高。
+    """
+
+    def __init__(self, hedge_percent: float = 0, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 window: int = DEFAULT_WINDOW):
+        self.hedge_percent = hedge_percent
+        self.min_samples = min_samples
+        self.window = window
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.abandoned = 0
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def _record(self, model: str, elapsed: float):
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.window)).append(elapsed)
+
+    def p95(self, model: str) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(int(len(samples) * 0.95), len(samples) - 1)]
+
+    def _budget_allows(self) -> bool:
+        """再发一个对冲后，额外请求仍不超过全部已发请求（调用数 + 对冲数）的 hedge_percent%。"""
+        with self._lock:
+            return self.hedges + 1 <= (self.calls + self.hedges + 1) * self.hedge_percent / 100
+
+    def _spawn_recorded(self, model: str, fn: Callable[[], T]) -> Future:
+        future = _spawn(fn)
+        # 成功的请求无论输赢都记录自己的耗时，被放弃的慢请求也计入 p95
+        future.add_done_callback(lambda f: f.elapsed is not None and self._record(model, f.elapsed))
+        return future
+
+    def call(self, model: str, primary: Callable[[], T], hedge: Optional[Callable[[], T]] = None,
+             is_valid: Callable[[T], bool] = bool, hedge_model: Optional[str] = None) -> T:
+        """hedge_model 是对冲请求实际使用的模型，它的耗时记在这个模型下（默认与 model 相同）。"""
+        with self._lock:
+            self.calls += 1
+        threshold = self.p95(model) if self.hedge_percent > 0 and hedge is not None else None
+
+        if threshold is None:
+            start = time.monotonic()
+            result = primary()
+            self._record(model, time.monotonic() - start)
+            return result
+
+        first = self._spawn_recorded(model, primary)
+        done, _ = wait([first], timeout=threshold)
+        if done or not self._budget_allows():
+            return first.result()
+
+        with self._lock:
+            self.hedges += 1
+        second = self._spawn_recorded(hedge_model or model, hedge)
+        pending = {first, second}
+        last_error = None
+        result = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if is_valid(result):
+                    with self._lock:
+                        self.abandoned += len(pending)
+                        if future is second:
+                            self.hedge_wins += 1
+                    return result
+        if last_error is not None and not result:
+            raise last_error
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "hedges": self.hedges, "hedge_wins": self.hedge_wins,
+                    "abandoned": self.abandoned}
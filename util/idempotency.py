@@ -0,0 +1,121 @@
+"""
+Bounded LRU replay cache so retried bridge uploads are answered from memory
+"""
+
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from .bridge_metrics import IDEMPOTENT_REPLAYS
+
+KEY_HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replay"
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_S = 15 * 60
+# 同一个 key 的请求还在处理时，重试最多等这么久再读缓存
+DEFAULT_INFLIGHT_WAIT_S = 30
+
+
+class Outcome(NamedTuple):
+    body: bytes
+    status: int
+    mimetype: str
+
+
+class ReplayCache:
+    """
+    key -> 最近一次成功（2xx）的响应，最多 max_entries 条、保留 ttl_s 秒，按 LRU 淘汰。
+    插件超时重发时，第一次请求可能还在处理：重试会等它完成后直接返回同一个结果，不会再写一遍。
+    503（写入队列满）等失败不缓存，重试会正常处理。
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_s: float = DEFAULT_TTL_S,
+                 inflight_wait_s: float = DEFAULT_INFLIGHT_WAIT_S, name: str = ""):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.inflight_wait_s = inflight_wait_s
+        self.name = name  # 站点名，用作指标的 site 标签
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Outcome]]" = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+
+    def _lookup(self, key: str) -> Optional[Outcome]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, outcome = entry
+        if time.monotonic() - stored_at > self.ttl_s:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return outcome
+
+    def begin(self, key: str) -> Tuple[Optional[Outcome], bool]:
+        """返回 (缓存的结果, 是否由本请求负责处理并调用 finish)。"""
+        with self._lock:
+            outcome = self._lookup(key)
+            if outcome is not None:
+                return outcome, False
+            event = self._inflight.get(key)
+            if event is None:
+                self._inflight[key] = threading.Event()
+                return None, True
+        event.wait(self.inflight_wait_s)
+        with self._lock:
+            return self._lookup(key), False
+
+    def finish(self, key: str, outcome: Optional[Outcome], owner: bool):
+        with self._lock:
+            if outcome is not None:
+                self._entries[key] = (time.monotonic(), outcome)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            event = self._inflight.pop(key, None) if owner else None
+        if event is not None:
+            event.set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def request_key() -> str:
+    """
+    路径 + 插件传的 Idempotency-Key，没有时用路径 + 请求体的 sha256（重发的请求体完全相同）。
+    带上路径：同一个 key 发到 /upload_list 和 /upload_detail 不会回放对方的响应。
+    """
+    from flask import request
+    header = request.headers.get(KEY_HEADER)
+    return f"{request.path}:{header}" if header else f"{request.path}:{hashlib.sha256(request.get_data()).hexdigest()}"
+
+
+def idempotent(cache: ReplayCache):
+    """Flask 视图装饰器：同一个 key 的重复请求直接回放缓存的响应，不再查 meta、不再写 csv。"""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import make_response
+
+            key = request_key()
+            outcome, owner = cache.begin(key)
+            if outcome is not None:
+                IDEMPOTENT_REPLAYS.inc(site=cache.name)
+                response = make_response(outcome.body, outcome.status)
+                response.mimetype = outcome.mimetype
+                response.headers[REPLAY_HEADER] = "true"
+                return response
+
+            outcome = None
+            try:
+                response = make_response(view(*args, **kwargs))
+                if 200 <= response.status_code < 300 and not response.is_streamed:
+                    outcome = Outcome(response.get_data(), response.status_code, response.mimetype)
+                return response
+            finally:
+                cache.finish(key, outcome, owner)
+        return wrapper
+    return decorator
@@ -0,0 +1,218 @@
+"""
+Near-duplicate job detection: shingled MinHash signatures with LSH banding
+"""
+
+import csv
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+DEFAULT_THRESHOLD = 0.8
+# 120 的约数多，banding 能贴近各种阈值
+DEFAULT_NUM_PERM = 120
+# 字符级 shingle：中文没有空格分词
+DEFAULT_SHINGLE_SIZE = 5
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_WHITESPACE = re.compile(r"\s+")
+
+REPORT_FIELDS = ["cluster", "similarity", "kept_id", "kept_title", "kept_team",
+                 "removed_id", "removed_title", "removed_team"]
+
+
+def shingles(text: str, size: int = DEFAULT_SHINGLE_SIZE) -> set:
+    """归一化空白和大小写后的字符 k-gram，取 crc32 作为 32 位哈希。"""
+    text = _WHITESPACE.sub(" ", (text or "").lower()).strip()
+    if not text:
+        return set()
+    if len(text) <= size:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + size].encode("utf-8")) for i in range(len(text) - size + 1)}
+
+
+def minhash(hashes: set, num_perm: int = DEFAULT_NUM_PERM) -> Tuple[int, ...]:
+    """
+    One-permutation MinHash：每个 shingle 只哈希一次，按哈希值分到 num_perm 个桶里各取最小值，
+    空桶从右侧最近的非空桶借值（rotation densification）。复杂度 O(shingle 数)，不用对每个排列各算一遍。
+    """
+    bins: List[Optional[int]] = [None] * num_perm
+    for h in hashes:
+        mixed = (h * _GOLDEN) & _MASK64
+        slot, value = mixed % num_perm, mixed // num_perm
+        if bins[slot] is None or value < bins[slot]:
+            bins[slot] = value
+    if all(b is None for b in bins):
+        return tuple(bins)
+    signature = []
+    for i in range(num_perm):
+        distance = 0
+        while bins[(i + distance) % num_perm] is None:
+            distance += 1
+        # 借来的值加上距离偏移，避免和原桶的值碰巧相等
+        signature.append(bins[(i + distance) % num_perm] + distance * _GOLDEN)
+    return tuple(signature)
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """两个签名的估计 Jaccard 相似度。"""
+    return sum(x == y for x, y in zip(a, b)) / len(a) if a else 0.0
+
+
+def choose_bands(threshold: float, num_perm: int = DEFAULT_NUM_PERM) -> Tuple[int, int]:
+    """
+    返回 (bands, rows)，bands * rows == num_perm。
+    S 曲线的拐点约为 (1/bands)^(1/rows)，取不高于阈值里最接近的一组，宁可多出候选也少漏判。
+    """
+    options = []
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        options.append(((1 / bands) ** (1 / rows), bands, rows))
+    below = [o for o in options if o[0] <= threshold]
+    _, bands, rows = max(below) if below else min(options)
+    return bands, rows
+
+
+class NearDupIndex:
+    """
+    按顺序加入文本：和已保留的文本估计 Jaccard ≥ threshold 时判为重复并归入它的簇，否则自己成为保留项。
+    只有保留项进入 LSH 桶，候选只在同桶里比较签名，整体是近线性的，可以直接跑完整历史。
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, num_perm: int = DEFAULT_NUM_PERM,
+                 shingle_size: int = DEFAULT_SHINGLE_SIZE):
+        if not 0 < threshold <= 1:
+            raise ValueError("threshold must be in (0, 1]")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = choose_bands(threshold, num_perm)
+        self._buckets: List[Dict[Tuple[int, ...], List[Hashable]]] = [defaultdict(list) for _ in range(self.bands)]
+        self._signatures: Dict[Hashable, Tuple[int, ...]] = {}
+        # 保留项 key -> [(重复项 key, 相似度)]
+        self.clusters: Dict[Hashable, List[Tuple[Hashable, float]]] = {}
+
+    def _band_keys(self, signature: Tuple[int, ...]):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def add(self, key: Hashable, text: str) -> Optional[Tuple[Hashable, float]]:
+        """返回 (保留项 key, 相似度)；不是重复（或文本为空，不参与比较）时返回 None。"""
+        hashes = shingles(text, self.shingle_size)
+        if not hashes:
+            return None
+        signature = minhash(hashes, self.num_perm)
+
+        best, best_score, checked = None, 0.0, set()
+        for band, band_key in self._band_keys(signature):
+            for candidate in self._buckets[band].get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                score = similarity(signature, self._signatures[candidate])
+                if score >= self.threshold and score > best_score:
+                    best, best_score = candidate, score
+        if best is not None:
+            self.clusters[best].append((key, best_score))
+            return best, best_score
+
+        self._signatures[key] = signature
+        self.clusters[key] = []
+        for band, band_key in self._band_keys(signature):
+            self._buckets[band][band_key].append(key)
+        return None
+
+    def merged_clusters(self) -> Dict[Hashable, List[Tuple[Hashable, float]]]:
+        return {kept: dups for kept, dups in self.clusters.items() if dups}
+
+
+def write_report(path: str, clusters: Dict[Hashable, List[Tuple[Hashable, float]]], rows: Dict[Hashable, Dict]):
+    """把合并掉的簇写成 csv：每个被删除的岗位一行，附上保留的那条。"""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        for cluster, (kept, dups) in enumerate(sorted(clusters.items(), key=lambda c: -len(c[1])), 1):
+            kept_row = rows[kept]
+            for removed, score in dups:
+                removed_row = rows[removed]
+                writer.writerow({
+                    "cluster": cluster,
+                    "similarity": f"{score:.3f}",
+                    "kept_id": kept_row.get("_id", ""),
+                    "kept_title": kept_row.get("title", ""),
+                    "kept_team": kept_row.get("team", ""),
+                    "removed_id": removed_row.get("_id", ""),
+                    "removed_title": removed_row.get("title", ""),
+                    "removed_team": removed_row.get("team", ""),
+                })
+
+
+class Tombstones:
+    """
+    remove_duplicate_jobs 删掉的近似重复岗位 (_id -> 保留的 _id)。删除只作用于被清理的 csv，
+    这些行仍在 jobs_meta_updated 中；_merge_jobs 按这里跳过它们，不会再当作新行加回来。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS removed (
+                job_id TEXT PRIMARY KEY,
+                kept_id TEXT NOT NULL DEFAULT '',
+                similarity REAL NOT NULL DEFAULT 0,
+                removed_at REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def add_many(self, rows: Iterable[Tuple[str, str, float]]):
+        """rows: (被删除的 _id, 保留的 _id, 相似度)。"""
+        now = time.time()
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO removed (job_id, kept_id, similarity, removed_at) VALUES (?, ?, ?, ?)",
+                [(job_id, kept_id, similarity, now) for job_id, kept_id, similarity in rows if job_id],
+            )
+
+    def ids(self) -> Set[str]:
+        with self._lock:
+            return {job_id for (job_id,) in self._conn.execute("SELECT job_id FROM removed")}
+
+
+def removed_ids(path: str) -> Set[str]:
+    """已删除的近似重复 _id；从没运行过近似去重（文件不存在）时返回空集合，不创建文件。"""
+    if not os.path.exists(path):
+        return set()
+    store = Tombstones(path)
+    try:
+        return store.ids()
+    finally:
+        store.close()
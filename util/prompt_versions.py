@@ -0,0 +1,75 @@
+"""
+Per-row record of the prompt-section versions that produced each field group
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from .gemini_schema import FIELD_GROUPS
+
+# 引入版本记录之前处理过的行，视为由各组的第 1 版 prompt 生成
+BASELINE_VERSION = 1
+
+
+class PromptVersionStore:
+    """
+    每个站点一个 sqlite 文件，按 (_id, 字段组) 记录生成该组字段时的 prompt 版本。
+    不放进 CSV：util.handle_csv.save_to_csv 会删除表头不一致的文件。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS field_versions (
+                job_id TEXT NOT NULL,
+                field_group TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                updated_at REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, field_group)
+            )
+            """
+        )
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def record(self, job_id: str, versions: Dict[str, int]):
+        now = time.time()
+        with self._tx() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO field_versions (job_id, field_group, version, updated_at) VALUES (?, ?, ?, ?)",
+                [(job_id, group, version, now) for group, version in versions.items()],
+            )
+
+    def versions(self, job_id: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT field_group, version FROM field_versions WHERE job_id = ?", (job_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def stale_groups(self, job_id: str, current: Dict[str, int]) -> List[str]:
+        """版本低于当前 prompt 版本的字段组，按 FIELD_GROUPS 的顺序返回。"""
+        recorded = self.versions(job_id)
+        return [g for g in FIELD_GROUPS if recorded.get(g, BASELINE_VERSION) < current.get(g, BASELINE_VERSION)]
@@ -0,0 +1,134 @@
+"""
+Durable per-day Gemini usage ledger: requests and tokens per model, per key, per calendar day
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+from zoneinfo import ZoneInfo
+
+from .credentials import key_id
+from .genai_client import load_env
+
+# Gemini 的每日配额按太平洋时间零点重置
+DEFAULT_TIMEZONE = "America/Los_Angeles"
+DEFAULT_LEDGER_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "quota_ledger.db")
+
+
+class QuotaLedger:
+    """
+    所有站点共用一个 sqlite 文件，每次请求记一笔 (day, model, key)。
+    day 按 tz 的日历日计算，换日后自然从 0 开始，不需要清理。
+    """
+
+    def __init__(self, path: str = DEFAULT_LEDGER_FILE, tz: str = DEFAULT_TIMEZONE):
+        self.path = path
+        self.tz = ZoneInfo(tz)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS usage (
+                day TEXT NOT NULL,
+                model TEXT NOT NULL,
+                key_id TEXT NOT NULL,
+                requests INTEGER NOT NULL DEFAULT 0,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, model, key_id)
+            )
+            """
+        )
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def today(self) -> str:
+        return datetime.now(self.tz).strftime("%Y-%m-%d")
+
+    def record(self, model: str, api_key: str, prompt_tokens: int = 0, output_tokens: int = 0,
+               requests: int = 1):
+        with self._tx() as conn:
+            conn.execute(
+                """
+                INSERT INTO usage (day, model, key_id, requests, prompt_tokens, output_tokens, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (day, model, key_id) DO UPDATE SET
+                    requests = requests + excluded.requests,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    output_tokens = output_tokens + excluded.output_tokens,
+                    updated_at = excluded.updated_at
+                """,
+                (self.today(), model, key_id(api_key), requests, prompt_tokens, output_tokens, time.time()),
+            )
+
+    def record_response(self, model: str, api_key: str, response, requests: int = 1):
+        """
+        按 generate_content 返回的 usage_metadata 记 token；没有 usage_metadata 时只记请求数。
+        请求已在发出前用 record() 记过时传 requests=0（失败、429、超时的请求同样占用每日配额）。
+        """
+        usage = getattr(response, "usage_metadata", None)
+        self.record(model, api_key, requests=requests,
+                    prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+                    output_tokens=getattr(usage, "candidates_token_count", 0) or 0)
+
+    def usage_today(self, model: Optional[str] = None, api_key: Optional[str] = None) -> Dict[str, int]:
+        """今天的累计用量，可按模型和/或 key 过滤。"""
+        sql = "SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(output_tokens), 0) FROM usage WHERE day = ?"
+        args = [self.today()]
+        if model is not None:
+            sql += " AND model = ?"
+            args.append(model)
+        if api_key is not None:
+            sql += " AND key_id = ?"
+            args.append(key_id(api_key))
+        with self._lock:
+            requests, prompt_tokens, output_tokens = self._conn.execute(sql, args).fetchone()
+        return {"requests": requests, "prompt_tokens": prompt_tokens, "output_tokens": output_tokens}
+
+    def remaining_requests(self, daily_limit: int, api_keys: Iterable[str]) -> int:
+        """daily_limit 是每个 key 每天的请求数上限，返回所有 key 今天还能发出的请求数之和。"""
+        keys = list(api_keys)
+        if not keys:
+            return 0
+        with self._lock:
+            used = dict(self._conn.execute(
+                "SELECT key_id, SUM(requests) FROM usage WHERE day = ? GROUP BY key_id", (self.today(),)
+            ).fetchall())
+        return sum(max(daily_limit - used.get(key_id(k), 0), 0) for k in keys)
+
+
+_ledger: Optional[QuotaLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_quota_ledger() -> QuotaLedger:
+    """
+    进程内共享的 ledger，第一次调用时才打开。路径和时区可在 .env 中通过 QUOTA_LEDGER_FILE / QUOTA_TIMEZONE 配置。
+    """
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            load_env()
+            _ledger = QuotaLedger(os.getenv("QUOTA_LEDGER_FILE") or DEFAULT_LEDGER_FILE,
+                                  os.getenv("QUOTA_TIMEZONE") or DEFAULT_TIMEZONE)
+        return _ledger
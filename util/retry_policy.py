@@ -0,0 +1,91 @@
+"""
+Adaptive timeout and backoff policy for Gemini calls
+"""
+
+import math
+import random
+import re
+from typing import Optional
+
+from .estimate import DEFAULT_BASE_LATENCY_S, DEFAULT_OUTPUT_TOKENS_PER_S
+
+DEFAULT_INPUT_TOKENS_PER_S = 2000.0
+DEFAULT_TIMEOUT_SAFETY = 2.0
+DEFAULT_MIN_TIMEOUT = 20
+DEFAULT_MAX_TIMEOUT = 120
+DEFAULT_MAX_DELAY = 60.0
+
+# 429 错误里带有 RetryInfo，例如 "retry_delay {\n  seconds: 17\n}"、google-genai 的 "'retryDelay': '17s'"
+# 或 "Please retry in 17.2s"
+_RETRY_AFTER_RES = (
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retryDelay['\"]?\s*:\s*['\"]([\d.]+)s", re.IGNORECASE),
+    re.compile(r"retry in\s*([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry-after:?\s*([\d.]+)", re.IGNORECASE),
+)
+
+
+def retry_after_hint(error: BaseException) -> Optional[float]:
+    """从服务端错误信息中解析建议的等待秒数，没有则返回 None。"""
+    seconds = getattr(error, "retry_after", None)
+    if isinstance(seconds, (int, float)) and seconds > 0:
+        return float(seconds)
+    text = str(error)
+    for pattern in _RETRY_AFTER_RES:
+        m = pattern.search(text)
+        if m:
+            try:
+                return float(m.group(1))
+            except ValueError:
+                continue
+    return None
+
+
+class Backoff:
+    """
+    单次调用内的退避状态，decorrelated jitter：sleep = min(cap, uniform(base, prev * 3))。
+    多个 worker 同时失败时不会在同一时刻一起重试。
+    """
+
+    def __init__(self, max_delay: float = DEFAULT_MAX_DELAY):
+        self.max_delay = max_delay
+        self._prev = 0.0
+
+    def next(self, base: float, cap: Optional[float] = None, hint: Optional[float] = None) -> float:
+        cap = min(cap or self.max_delay, self.max_delay)
+        if hint is not None:
+            # 服务端给出的等待时间优先，加少量抖动避免同时醒来
+            delay = hint + random.uniform(0, min(base, hint * 0.1 + 1))
+        else:
+            delay = min(cap, random.uniform(base, max(self._prev * 3, base)))
+        self._prev = delay
+        return delay
+
+
+class RetryPolicy:
+    """
+    _call_gemini 和 _call_gemini_translate 共用的超时与退避策略。
+    超时按输入和预期输出的 token 数估算（与 util.estimate 的延迟模型一致），再乘以安全系数，
+    限制在 [min_timeout, max_timeout] 内。
+    """
+
+    def __init__(self, min_timeout: int = DEFAULT_MIN_TIMEOUT, max_timeout: int = DEFAULT_MAX_TIMEOUT,
+                 safety: float = DEFAULT_TIMEOUT_SAFETY, base_latency_s: float = DEFAULT_BASE_LATENCY_S,
+                 input_tokens_per_s: float = DEFAULT_INPUT_TOKENS_PER_S,
+                 output_tokens_per_s: float = DEFAULT_OUTPUT_TOKENS_PER_S,
+                 max_delay: float = DEFAULT_MAX_DELAY):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.safety = safety
+        self.base_latency_s = base_latency_s
+        self.input_tokens_per_s = input_tokens_per_s
+        self.output_tokens_per_s = output_tokens_per_s
+        self.max_delay = max_delay
+
+    def timeout_for(self, prompt_tokens: int, output_tokens: int) -> int:
+        expected = (self.base_latency_s + prompt_tokens / self.input_tokens_per_s
+                    + output_tokens / self.output_tokens_per_s)
+        return int(min(self.max_timeout, max(self.min_timeout, math.ceil(expected * self.safety))))
+
+    def backoff(self) -> Backoff:
+        return Backoff(self.max_delay)
@@ -0,0 +1,120 @@
+"""
+Cross-site priority scheduler for Gemini enrichment
+"""
+
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .tokens import estimate_tokens
+from .work_queue import WorkQueue, PROCESSED, SKIPPED, FAILED, EXPIRED, ABORTED
+
+SITE_WEIGHTS = {"boss": 1.0, "zhilian": 1.0, "wellfound": 1.0}
+FRESHNESS_HALF_LIFE_DAYS = 3.0
+REFERENCE_TOKENS = 4000
+# createdAt 缺失或无法解析时的新鲜度（原先这类岗位排在最后）
+UNKNOWN_FRESHNESS = 0.01
+
+
+def job_age_days(row: Dict, now: Optional[datetime] = None) -> Optional[int]:
+    created_at = (row.get('createdAt') or '').strip()
+    if not created_at:
+        return None
+    try:
+        return ((now or datetime.now()) - datetime.strptime(created_at, "%Y-%m-%d")).days
+    except ValueError:
+        return None
+
+
+def job_priority(row: Dict, site_weight: float = 1.0, now: Optional[datetime] = None,
+                 half_life_days: float = FRESHNESS_HALF_LIFE_DAYS,
+                 reference_tokens: int = REFERENCE_TOKENS) -> float:
+    """
+    priority = 站点权重 × 新鲜度 / 成本。
+    新鲜度按 createdAt 以 half_life_days 为半衰期指数衰减；成本按 title + description 估算的 token 数。
+    """
+    age = job_age_days(row, now)
+    freshness = UNKNOWN_FRESHNESS if age is None else 0.5 ** (max(age, 0) / half_life_days)
+    tokens = estimate_tokens(row.get('title', '')) + estimate_tokens(row.get('description', ''))
+    return site_weight * freshness / (1 + tokens / reference_tokens)
+
+
+class GlobalScheduler:
+    """
+    在 boss / zhilian / wellfound 之间共享一个请求预算，按 job_priority 交错处理各站点队列。
+    process_job 使用各站点 csv_processor.process_job 的签名：(queue, job_id, attempt, row) -> outcome。
+    """
+
+    def __init__(self, budget: int, site_weights: Optional[Dict[str, float]] = None,
+                 half_life_days: float = FRESHNESS_HALF_LIFE_DAYS, reference_tokens: int = REFERENCE_TOKENS):
+        self.budget = budget
+        self.site_weights = dict(SITE_WEIGHTS)
+        self.site_weights.update(site_weights or {})
+        self.half_life_days = half_life_days
+        self.reference_tokens = reference_tokens
+        self.sites = {}
+
+    def add_site(self, site: str, queue: WorkQueue, rows: Dict[str, Dict],
+                 process_job: Callable[[WorkQueue, str, int, Optional[Dict]], str],
+                 max_age_days: Optional[int] = None, worker: str = "process_csv"):
+        self.sites[site] = {
+            "queue": queue,
+            "rows": rows,
+            "process_job": process_job,
+            "max_age_days": max_age_days,
+            "worker": worker,
+        }
+
+    def plan(self) -> List[Tuple[float, str, str]]:
+        """所有站点当前可处理的 (priority, site, job_id)，按 priority 降序。"""
+        now = datetime.now()
+        candidates = []
+        for site, ctx in self.sites.items():
+            weight = self.site_weights.get(site, 1.0)
+            for job_id, _ in ctx["queue"].available():
+                row = ctx["rows"].get(job_id)
+                if row is None:
+                    # 交给 process_job 直接 ack 掉
+                    candidates.append((float("inf"), site, job_id))
+                    continue
+                age = job_age_days(row, now)
+                if ctx["max_age_days"] is not None and age is not None and age > ctx["max_age_days"]:
+                    continue
+                priority = job_priority(row, weight, now, self.half_life_days, self.reference_tokens)
+                candidates.append((priority, site, job_id))
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        return candidates
+
+    def run(self, delay: float = 0) -> Dict[str, Dict[str, int]]:
+        stats = {site: {PROCESSED: 0, SKIPPED: 0, FAILED: 0} for site in self.sites}
+        processed = 0
+
+        plan = self.plan()
+        print(f"📋 Scheduler: {len(plan)} candidate jobs across {len(self.sites)} sites, budget {self.budget}")
+
+        for priority, site, job_id in plan:
+            if processed >= self.budget:
+                print(f"\n✅ Shared budget ({self.budget}) reached. Stopping.")
+                break
+            ctx = self.sites[site]
+            leased = ctx["queue"].lease(ctx["worker"], job_id=job_id)
+            if leased is None:
+                continue
+            _, attempt = leased
+
+            print(f"[{processed + 1}/{self.budget}] [{site}] priority={priority:.4f}")
+            outcome = ctx["process_job"](ctx["queue"], job_id, attempt, ctx["rows"].get(job_id))
+            if outcome == ABORTED:
+                # 例如 API 地区限制，对所有站点都生效
+                break
+            if outcome == EXPIRED:
+                # process_job 已把过期的任务结束掉（ack），不会再被租出
+                stats[site][SKIPPED] += 1
+                continue
+            stats[site][outcome] += 1
+            if outcome == PROCESSED:
+                processed += 1
+                if delay and processed < self.budget:
+                    time.sleep(delay)
+
+        return stats
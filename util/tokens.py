@@ -0,0 +1,17 @@
+"""
+Local token-count approximation for Gemini prompts
+"""
+
+import math
+import re
+
+# 中日韩字符、全角标点大约 1 token / 字；其余文本大约 4 字符 / token
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / CHARS_PER_TOKEN)
@@ -0,0 +1,81 @@
+"""
+Tolerant JSON parsing for model output: code fences, prefixes, trailing garbage and truncation
+"""
+
+import json
+import re
+from json.decoder import scanstring
+from typing import Any, Dict, Optional, Tuple
+
+_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.DOTALL | re.IGNORECASE)
+_WS = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+
+def _candidates(text: str):
+    """原文以及所有 ``` 代码块中的内容。"""
+    yield text
+    for m in _FENCE_RE.finditer(text):
+        yield m.group(1)
+
+
+def loads_tolerant(text: str) -> Optional[Any]:
+    """
+    从模型输出中找出第一个完整的 JSON 对象。
+    允许外面包着代码块、前面有说明文字、后面有多余内容。找不到时返回 None。
+    """
+    if not text:
+        return None
+    for candidate in _candidates(text):
+        start = candidate.find('{')
+        while start != -1:
+            try:
+                obj, _ = _decoder.raw_decode(candidate, start)
+                return obj
+            except json.JSONDecodeError:
+                start = candidate.find('{', start + 1)
+    return None
+
+
+def _skip_ws(s: str, i: int) -> int:
+    while i < len(s) and s[i] in _WS:
+        i += 1
+    return i
+
+
+def loads_partial(text: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    逐个解析顶层对象的 key/value，遇到被截断的值就停下。
+    返回 (已完整解析的字段, 对象是否完整)。例如 description 被截断时仍能拿到 title 和 tags。
+    """
+    if not text:
+        return {}, False
+    for candidate in _candidates(text):
+        start = candidate.find('{')
+        if start != -1:
+            break
+    else:
+        return {}, False
+
+    s = candidate
+    fields = {}
+    i = _skip_ws(s, start + 1)
+    try:
+        while i < len(s):
+            if s[i] == '}':
+                return fields, True
+            if s[i] != '"':
+                break
+            key, i = scanstring(s, i + 1)
+            i = _skip_ws(s, i)
+            if i >= len(s) or s[i] != ':':
+                break
+            i = _skip_ws(s, i + 1)
+            value, i = _decoder.raw_decode(s, i)
+            fields[key] = value
+            i = _skip_ws(s, i)
+            if i < len(s) and s[i] == ',':
+                i = _skip_ws(s, i + 1)
+    except (json.JSONDecodeError, ValueError):
+        pass
+    return fields, False
@@ -0,0 +1,245 @@
+"""
+Durable local work queue for Gemini enrichment runs
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+
+# process_job 的返回值
+PROCESSED = "processed"
+SKIPPED = "skipped"
+FAILED = "failed"
+EXPIRED = "expired"
+ABORTED = "aborted"
+
+DEFAULT_LEASE_SECONDS = 15 * 60
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 10 * 60
+
+
+class WorkQueue:
+    """
+    每个站点一个 sqlite 文件，记录待处理的 _id。
+    lease() 按 priority（createdAt，越新越先）取出任务；崩溃后租约到期自动回到队列，
+    失败的任务在 retry_delay * attempts 秒后才会再次被取出，
+    连续失败 max_attempts 次的任务进入 dead，不再重试。
+    available_at 对 leased 表示租约到期时间，对 pending 表示最早可重试时间。
+    """
+
+    def __init__(self, path: str, lease_seconds: int = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, retry_delay: int = DEFAULT_RETRY_DELAY):
+        self.path = path
+        self.retry_delay = retry_delay
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                priority TEXT NOT NULL DEFAULT '',
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL DEFAULT 0,
+                worker TEXT NOT NULL DEFAULT '',
+                last_error TEXT NOT NULL DEFAULT '',
+                updated_at REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, priority)")
+
+    def close(self):
+        self._conn.close()
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM jobs LIMIT 1").fetchone() is None
+
+    def enqueue(self, job_id: str, priority: str = "") -> bool:
+        return self.enqueue_many([(job_id, priority)]) > 0
+
+    def enqueue_many(self, items: Iterable[Tuple[str, str]]) -> int:
+        """已存在的 _id（包括 done / dead）不会被重新加入。返回新增数量。"""
+        now = time.time()
+        rows = [(jid, priority or "", now) for jid, priority in items if jid]
+        if not rows:
+            return 0
+        before = self._conn.total_changes
+        with self._tx():
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (job_id, priority, updated_at) VALUES (?, ?, ?)", rows
+            )
+        return self._conn.total_changes - before
+
+    def reconcile(self, items: Iterable[Tuple[str, str]], retry_dead: bool = False) -> Dict[str, int]:
+        """
+        items 是 csv 中当前仍需处理的 (job_id, priority)。不在队列中的加入；已是 done 的
+        （例如 title_chinese 被清空以强制重跑）重置为 pending；dead 的只在 retry_dead=True 时重置。
+        返回 {"enqueued": 新加入数, "reset": 重置数, "dead": 仍留在 dead 的数量}。
+        """
+        now = time.time()
+        rows = {jid: priority or "" for jid, priority in items if jid}
+        if not rows:
+            return {"enqueued": 0, "reset": 0, "dead": 0}
+        states = (DONE, DEAD) if retry_dead else (DONE,)
+        with self._tx():
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (job_id, priority, updated_at) VALUES (?, ?, ?)",
+                [(jid, priority, now) for jid, priority in rows.items()],
+            )
+            enqueued = self._conn.total_changes - before
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "UPDATE jobs SET state = ?, attempts = 0, available_at = 0, worker = '', last_error = '',"
+                f" priority = ?, updated_at = ? WHERE job_id = ? AND state IN ({', '.join('?' * len(states))})",
+                [(PENDING, priority, now, jid, *states) for jid, priority in rows.items()],
+            )
+            reset = self._conn.total_changes - before
+            dead = 0 if retry_dead else sum(
+                jid in rows for (jid,) in self._conn.execute("SELECT job_id FROM jobs WHERE state = ?", (DEAD,))
+            )
+        return {"enqueued": enqueued, "reset": reset, "dead": dead}
+
+    def requeue(self, job_id: str, priority: Optional[str] = None):
+        """把任意状态的任务重置为 pending 并清零尝试次数（用于手动重跑）。"""
+        now = time.time()
+        with self._tx():
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, priority, updated_at) VALUES (?, ?, ?)",
+                (job_id, priority or "", now),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, available_at = 0, worker = '', last_error = '',"
+                " priority = COALESCE(?, priority), updated_at = ? WHERE job_id = ?",
+                (PENDING, priority, now, job_id),
+            )
+
+    def available(self, limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """当前可租出的 (job_id, priority)，按 priority 降序。"""
+        sql = "SELECT job_id, priority FROM jobs WHERE state IN (?, ?) AND available_at <= ? ORDER BY priority DESC"
+        params = [PENDING, LEASED, time.time()]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def lease(self, worker: str = "main", job_id: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        """
+        取出优先级最高的可用任务（或指定的 job_id），返回 (job_id, attempt)。
+        租约过期的任务视为可用。
+        """
+        now = time.time()
+        sql = "SELECT job_id, attempts FROM jobs WHERE state IN (?, ?) AND available_at <= ?"
+        params = [PENDING, LEASED, now]
+        if job_id is not None:
+            sql += " AND job_id = ?"
+            params.append(job_id)
+        with self._tx():
+            row = self._conn.execute(sql + " ORDER BY priority DESC LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            job_id, attempts = row
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = ?, available_at = ?, worker = ?, updated_at = ? WHERE job_id = ?",
+                (LEASED, attempts + 1, now + self.lease_seconds, worker, now, job_id),
+            )
+        return job_id, attempts + 1
+
+    def ack(self, job_id: str):
+        self._set_state(job_id, DONE)
+
+    def ack_many(self, job_ids: Iterable[str]) -> int:
+        """在一个事务里把多条任务标为 done（批量回填的结果），返回实际更新的条数。"""
+        now = time.time()
+        with self._tx():
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "UPDATE jobs SET state = ?, available_at = 0, worker = '', updated_at = ? WHERE job_id = ?",
+                [(DONE, now, job_id) for job_id in job_ids],
+            )
+            return self._conn.total_changes - before
+
+    def release(self, job_id: str):
+        """归还租约且不计入尝试次数（例如达到每日上限时）。"""
+        with self._tx():
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), available_at = 0, worker = '',"
+                " updated_at = ? WHERE job_id = ? AND state = ?",
+                (PENDING, time.time(), job_id, LEASED),
+            )
+
+    def fail(self, job_id: str, error: str = "") -> bool:
+        """记录一次失败。达到 max_attempts 时转入 dead 并返回 True。"""
+        with self._tx():
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            attempts = row[0] if row else 0
+            dead = attempts >= self.max_attempts
+            now = time.time()
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, available_at = ?, worker = '', last_error = ?, updated_at = ? WHERE job_id = ?",
+                (DEAD if dead else PENDING, now + self.retry_delay * attempts, (error or "")[:500], now, job_id),
+            )
+        return dead
+
+    def reclaim(self, worker: str) -> int:
+        """进程重启时释放该 worker 遗留的租约，无需等待过期。"""
+        with self._tx():
+            cur = self._conn.execute(
+                "UPDATE jobs SET state = ?, available_at = 0, worker = '', updated_at = ? WHERE state = ? AND worker = ?",
+                (PENDING, time.time(), LEASED, worker),
+            )
+        return cur.rowcount
+
+    def state(self, job_id: str) -> Optional[str]:
+        """任务当前的状态；不在队列中时返回 None。"""
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> Dict[str, int]:
+        result = {PENDING: 0, LEASED: 0, DONE: 0, DEAD: 0}
+        with self._lock:
+            for state, n in self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall():
+                result[state] = n
+        return result
+
+    def dead_letters(self) -> List[Dict[str, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, attempts, last_error FROM jobs WHERE state = ? ORDER BY updated_at", (DEAD,)
+            ).fetchall()
+        return [{"_id": jid, "attempts": attempts, "last_error": err} for jid, attempts, err in rows]
+
+    def _set_state(self, job_id: str, state: str):
+        with self._tx():
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, available_at = 0, worker = '', updated_at = ? WHERE job_id = ?",
+                (state, time.time(), job_id),
+            )
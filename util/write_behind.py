@@ -0,0 +1,163 @@
+"""
+Write-behind queue for bridge CSV appends: handlers enqueue, one background thread flushes in batches
+"""
+
+import atexit
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .bridge_metrics import timed_save
+from .handle_csv import fieldnames, generate_job_id
+
+DEFAULT_MAX_ROWS = 10000
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_RETRIES = 3
+
+
+def project_row(row: Dict) -> Dict:
+    """只保留 csv 表头里的字段：插件发来的多余字段会让 DictWriter 整批写入失败。"""
+    return {k: v for k, v in row.items() if k in fieldnames}
+
+
+class WriteBehindWriter:
+    """
+    有界队列：submit 在队列放不下时返回 False，由调用方提示插件稍后重试（背压）。
+    后台线程按文件分组取出，批内按 _id（与 save_to_csv 相同：行里的 _id，没有时由 source_url 计算）去重，保留最后一条，
+    攒够 batch_size 行或距上次写入超过 flush_interval 秒就调用一次 save_to_csv。
+    close() 会先把队列写完再退出，进程正常退出时由 atexit 调用。
+    """
+
+    def __init__(self, max_rows: int = DEFAULT_MAX_ROWS, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL, max_retries: int = DEFAULT_MAX_RETRIES):
+        self.max_rows = max_rows
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.rows_written = 0
+        self.rows_coalesced = 0
+        self.rows_rejected = 0
+        self.rows_dropped = 0
+        self._queue: Deque[Tuple[str, Dict, bool]] = deque()
+        self._cond = threading.Condition()
+        self._writing = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, rows: List[Dict], check_existing: bool = True) -> bool:
+        """check_existing=False：调用方已去重，写入时不扫描整个文件（见 save_to_csv）。"""
+        with self._cond:
+            if self._closed or len(self._queue) + len(rows) > self.max_rows:
+                self.rows_rejected += len(rows)
+                return False
+            self._queue.extend((path, row, check_existing) for row in rows)
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+            return True
+
+    def depth(self) -> int:
+        with self._cond:
+            return len(self._queue) + self._writing
+
+    def retry_after(self) -> float:
+        """队列满时建议插件等待的秒数：大约写完一半队列所需的时间。"""
+        return max(self.flush_interval, self.flush_interval * self.depth() / (2 * self.batch_size))
+
+    def _take(self) -> List[Tuple[str, Dict, bool]]:
+        with self._cond:
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.batch_size))]
+            self._writing = len(batch)
+            return batch
+
+    def _write(self, batch: List[Tuple[str, Dict, bool]]):
+        by_path: Dict[Tuple[str, bool], "OrderedDict[str, Dict]"] = OrderedDict()
+        for path, row, check_existing in batch:
+            rows = by_path.setdefault((path, check_existing), OrderedDict())
+            key = row.get("_id") or generate_job_id(row.get("source_url"))
+            if key in rows:
+                self.rows_coalesced += 1
+                del rows[key]
+            rows[key] = project_row(row)
+        for (path, check_existing), rows in by_path.items():
+            for attempt in range(1, self.max_retries + 1):
+                try:
+                    # 失败的那次可能已经写了一部分，重试时按文件里已有的 _id 去重
+                    timed_save(path, list(rows.values()), check_existing or attempt > 1)
+                    self.rows_written += len(rows)
+                    break
+                except Exception as e:
+                    print(f"⚠️ write-behind 写入 {path} 失败（第 {attempt} 次）: {e}")
+                    time.sleep(self.flush_interval)
+            else:
+                self._write_each(path, list(rows.values()))
+
+    def _write_each(self, path: str, rows: List[Dict]):
+        """整批多次失败后逐行写入，只丢弃写不进去的那几行。"""
+        for row in rows:
+            try:
+                timed_save(path, [row], True)
+                self.rows_written += 1
+            except Exception as e:
+                print(f"⚠️ write-behind 丢弃 {row.get('_id') or row.get('source_url')}: {e}")
+                self.rows_dropped += 1
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch:
+                self._write(batch)
+            with self._cond:
+                self._writing = 0
+                self._cond.notify_all()
+                if self._closed and not self._queue:
+                    return
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待队列写完，返回是否在 timeout 内写完。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._queue or self._writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else self.flush_interval)
+        return True
+
+    def close(self, timeout: Optional[float] = None):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            pending = len(self._queue)
+            self._cond.notify_all()
+        if pending:
+            print(f"⏳ write-behind: 正在写入剩余 {pending} 行...")
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return {"depth": self.depth(), "written": self.rows_written, "coalesced": self.rows_coalesced,
+                "rejected": self.rows_rejected, "dropped": self.rows_dropped}
+
+
+_writer: Optional[WriteBehindWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_write_behind() -> WriteBehindWriter:
+    """进程内共享的 writer，统一 bridge 中各站点共用一个写线程；进程退出前写完队列。"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteBehindWriter()
+            atexit.register(_writer.close)
+        return _writer
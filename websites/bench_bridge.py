@@ -0,0 +1,151 @@
+import argparse
+import gzip
+import itertools
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+WEBSITES_DIR = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(WEBSITES_DIR, '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from enrich_all import load_site_module
+from util.bridge_serving import DEFAULT_THREADS
+from util.bridge_store import SiteStore
+from util.write_behind import get_write_behind
+
+SITES = ["boss", "zhilian", "wellfound"]
+ENDPOINTS = ["upload_list", "upload_detail"]
+# upload_list 请求体格式
+LIST_FORMATS = ["json", "gzip", "ndjson", "ndjson-gzip"]
+
+
+def load_server(site: str, data_dir: str, sync: bool = False):
+    """
+    按临时目录里的 csv 创建站点的 bridge app，不碰真实数据（导入 server.py 不会载入真实 csv 和别名表）。
+    sync=True 时不用 write-behind，直接写盘。
+    """
+    server = load_site_module(site, "server")
+    store = SiteStore(os.path.join(data_dir, "jobs_meta.csv"), os.path.join(data_dir, "jobs_meta_updated.csv"),
+                      server.clean_url, writer=None if sync else get_write_behind(), name=site,
+                      aliases_file=os.path.join(data_dir, "aliases.db"))
+    return server.create_app(store)
+
+
+def start_server(app, threads: int):
+    """在后台线程启动与 util.bridge_serving.serve 相同的 server，返回端口。"""
+    try:
+        from waitress import create_server
+        httpd = create_server(app, host="127.0.0.1", port=0, threads=threads)
+        threading.Thread(target=httpd.run, daemon=True).start()
+        return httpd.effective_port, "waitress"
+    except ImportError:
+        from werkzeug.serving import make_server
+        httpd = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        return httpd.server_port, "werkzeug (threaded)"
+
+
+def make_payload(endpoint: str, n: int, batch: int) -> dict:
+    if endpoint == "upload_list":
+        return {"jobs": [{"source_url": f"https://example.com/job/list-{n}-{i}", "title": f"Job {n}-{i}",
+                          "salary": "15-25K", "city": "Remote"} for i in range(batch)]}
+    return {"source_url": f"https://example.com/job/detail-{n}", "title": f"Job {n}",
+            "description": "Bench description " * 50, "worker_id": "bench"}
+
+
+def encode(payload: dict, fmt: str = "json"):
+    """按格式编码 upload_list 请求体，返回 (body, headers)。"""
+    headers = {"Content-Type": "application/json"}
+    if fmt.startswith("ndjson") and "jobs" in payload:
+        body = "\n".join(json.dumps(job) for job in payload["jobs"]).encode("utf-8")
+        headers["Content-Type"] = "application/x-ndjson"
+    else:
+        body = json.dumps(payload).encode("utf-8")
+    if fmt.endswith("gzip"):
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def post(url: str, payload: dict, fmt: str = "json") -> bool:
+    body, headers = encode(payload, fmt)
+    req = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return resp.status == 200
+
+
+def run_load(base_url: str, endpoint: str, duration: float, concurrency: int, batch: int,
+             fmt: str = "json") -> dict:
+    counter = itertools.count()
+    deadline = time.monotonic() + duration
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def worker():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            payload = make_payload(endpoint, next(counter), batch)
+            start = time.monotonic()
+            try:
+                ok = post(f"{base_url}/{endpoint}", payload, fmt if endpoint == "upload_list" else "json")
+            except Exception:
+                ok = False
+            elapsed = time.monotonic() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    wall = time.monotonic() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / wall,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0,
+        "p95_ms": latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000 if latencies else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a bridge server's upload endpoints on scratch data")
+    parser.add_argument("site", choices=SITES)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma-separated: upload_list,upload_detail")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent client threads")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="Server worker threads")
+    parser.add_argument("--batch", type=int, default=20, help="Jobs per upload_list request")
+    parser.add_argument("--format", choices=LIST_FORMATS, default="json", help="upload_list body encoding")
+    parser.add_argument("--sync", action="store_true", help="Write CSV inline instead of through the write-behind queue")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        port, server_name = start_server(load_server(args.site, data_dir, args.sync), args.threads)
+        print(f"{args.site} bridge on {server_name}, {args.threads} threads, {args.concurrency} clients, "
+              f"{args.duration:.0f}s per endpoint\n")
+        print(f"{'endpoint':<16} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for endpoint in args.endpoints.split(","):
+            r = run_load(f"http://127.0.0.1:{port}", endpoint.strip(), args.duration, args.concurrency, args.batch,
+                         args.format)
+            print(f"{endpoint:<16} {r['requests']:>9} {r['errors']:>7} {r['rps']:>8.1f} "
+                  f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f}")
+        if not args.sync:
+            get_write_behind().flush()
+            print(f"\nwrite-behind: {get_write_behind().stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+WEBSITES_DIR = os.path.dirname(os.path.abspath(__file__))
+SITES = ["boss", "zhilian", "wellfound"]
+
+# (名称, 模块所在目录, 模块名)：各站点菜单入口、bridge server 和 enrich_all
+ENTRY_POINTS = (
+    [(f"{site}/{site}.py", os.path.join(WEBSITES_DIR, site), site) for site in SITES]
+    + [(f"{site}/server.py", os.path.join(WEBSITES_DIR, site), "server") for site in SITES]
+    + [("enrich_all.py", WEBSITES_DIR, "enrich_all")]
+)
+
+# 启动时不应加载的重模块，只有真正调用模型时才导入
+DEFERRED_MODULES = ("google.genai", "dotenv")
+
+_PROBE = """
+import json, sys, time
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+error = None
+try:
+    import {module}
+except Exception as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "error": error,
+                  "loaded": [m for m in {deferred!r} if m in sys.modules]}}))
+"""
+
+
+def measure(path: str, module: str) -> dict:
+    """在新的解释器中导入入口模块，返回耗时、导入错误和提前加载的重模块。"""
+    probe = _PROBE.format(path=path, module=module, deferred=DEFERRED_MODULES)
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, cwd=path)
+    lines = out.stdout.strip().splitlines()
+    if out.returncode != 0 or not lines:
+        return {"ms": None, "error": (out.stderr.strip().splitlines() or ["exit %d" % out.returncode])[-1], "loaded": []}
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of each entry point")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Exit non-zero if any entry point's median import time exceeds this")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'entry point':<24} {'median ms':>10} {'min ms':>8}  notes")
+    for name, path, module in ENTRY_POINTS:
+        runs = [measure(path, module) for _ in range(args.repeat)]
+        times = [r["ms"] for r in runs if r["ms"] is not None and not r["error"]]
+        notes = []
+        errors = {r["error"] for r in runs if r["error"]}
+        if errors:
+            # 导入失败（含解释器非零退出）时测到的耗时没有意义，整体判为失败
+            notes.append("import error: " + "; ".join(sorted(errors)))
+            failed = True
+        loaded = sorted({m for r in runs for m in r["loaded"]})
+        if loaded:
+            notes.append("loaded at startup: " + ", ".join(loaded))
+            failed = True
+        if not times:
+            print(f"{name:<24} {'-':>10} {'-':>8}  {' | '.join(notes)}")
+            continue
+        median = statistics.median(times)
+        if args.max_ms is not None and median > args.max_ms:
+            notes.append(f"over budget ({args.max_ms:.0f} ms)")
+            failed = True
+        print(f"{name:<24} {median:>10.1f} {min(times):>8.1f}  {' | '.join(notes)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,7 +9,7 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from csv_processor import process_csv, remove_duplicate_jobs, generate_additional_fields
+from csv_processor import process_csv, remove_duplicate_jobs, generate_additional_fields, batch_backfill, reenrich_stale, stream_enrich
 
 
 def main_menu():
@@ -21,12 +21,16 @@ def main_menu():
     print("  2. Process with Gemini (generate Chinese fields)")
     print("  3. Remove duplicate items")
     print("  4. Generate salary_english, type, and source_name_english")
+    print("  5. Dry run: estimate Gemini tokens and time for option 2")
+    print("  6. Batch backfill: re-enrich all rows as one offline Gemini batch job")
+    print("  7. Re-enrich only field groups whose prompt version changed")
+    print("  8. Stream: enrich details as they arrive (start the server with BRIDGE_STREAM_ENRICH=1)")
     print("  q. Exit")
     print("=" * 80)
 
     while True:
         try:
-            choice = input("\nEnter your choice (1-4, q): ").strip().lower()
+            choice = input("\nEnter your choice (1-8, q): ").strip().lower()
 
             if choice == "q":
                 print("Exiting...")
@@ -36,8 +40,9 @@ def main_menu():
                 print("🚀 Bridge Server Starting... (Listening on http://127.0.0.1:5000)")
                 print("Please ensure your Chrome Extension is loaded and active.")
                 print("=" * 80 + "\n")
-                from server import app
-                app.run(port=5000)
+                from server import create_app
+                from util.bridge_serving import serve
+                serve(create_app(), port=5000, host='127.0.0.1')
                 break
             elif choice == "2":
                 print("\n" + "=" * 80)
@@ -49,7 +54,8 @@ def main_menu():
                 print("\n" + "=" * 80)
                 print("Starting: Remove duplicate items")
                 print("=" * 80 + "\n")
-                remove_duplicate_jobs()
+                threshold = input("Near-duplicate Jaccard threshold (e.g. 0.8, Enter for exact matches only): ").strip()
+                remove_duplicate_jobs(near_threshold=float(threshold) if threshold else None)
                 break
             elif choice == "4":
                 print("\n" + "=" * 80)
@@ -57,8 +63,20 @@ def main_menu():
                 print("=" * 80 + "\n")
                 generate_additional_fields()
                 break
+            elif choice == "5":
+                process_csv(dry_run=True)
+                break
+            elif choice == "6":
+                batch_backfill(include_enriched=True)
+                break
+            elif choice == "7":
+                reenrich_stale()
+                break
+            elif choice == "8":
+                stream_enrich()
+                break
             else:
-                print("❌ Invalid choice. Please enter 1, 2, 3, 4, or q.")
+                print("❌ Invalid choice. Please enter 1, 2, 3, 4, 5, 6, 7, 8, or q.")
         except KeyboardInterrupt:
             print("\n\nExiting...")
             break
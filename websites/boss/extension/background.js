@@ -1,11 +1,20 @@
 // BOSS Scraper Bridge - Background Script
 // 用于代理 Content Script 的请求，避开 CORS 和私有网络限制
 
+// 列表页的大请求体用 gzip 压缩后发送（后端 upload_list 支持 Content-Encoding: gzip）
+async function gzipOptions(options) {
+    if (typeof CompressionStream === 'undefined' || typeof options.body !== 'string') return options;
+    const stream = new Blob([options.body]).stream().pipeThrough(new CompressionStream('gzip'));
+    const body = await new Response(stream).arrayBuffer();
+    return { ...options, body, headers: { ...options.headers, 'Content-Encoding': 'gzip' } };
+}
+
 chrome.runtime.onMessage.addListener((request, sender, sendResponse) => {
     if (request.type === 'FETCH') {
-        const { url, options } = request.data;
+        const { url, options, compress } = request.data;
         
-        fetch(url, options)
+        (compress ? gzipOptions(options) : Promise.resolve(options))
+            .then(opts => fetch(url, opts))
             .then(async response => {
                 const text = await response.text();
                 let data;
@@ -4,31 +4,48 @@ import re
 import time
 import warnings
 import signal
+import sys
 import traceback
-from typing import List, Dict, Any, Optional
-import google.generativeai as genai
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 
 warnings.filterwarnings('ignore')
 
-# Load environment variables from .env file
-load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env'))
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from util.gemini_schema import FIELD_GROUPS, job_info_schema, TRANSLATION_SCHEMA, JOB_FIELDS, missing_job_fields, validate_job_info, validate_translations
+from util.tolerant_json import loads_tolerant, loads_partial
+from util.quota_ledger import get_quota_ledger
+from util.hedging import Hedger
+from util.retry_policy import RetryPolicy, retry_after_hint
+from util.tokens import estimate_tokens
+from util.estimate import ENRICH_OUTPUT_OVERHEAD, TRANSLATE_OUTPUT_OVERHEAD
+from util.credentials import get_credential_pool, mask_key
+from util.genai_client import generate_content, get_genai
+
+if TYPE_CHECKING:
+    from google.genai import types as genai_types
 
 GEMINI_TIMEOUT = 120
+# GEMINI_TIMEOUT 是上限，每次调用的实际超时按 prompt 和预期输出的长度计算
+RETRY_POLICY = RetryPolicy(max_timeout=GEMINI_TIMEOUT)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 _BOSS_DIR = os.path.dirname(os.path.abspath(__file__))
 INPUT_FILE = os.path.join(_BOSS_DIR, "csv_file", "jobs_meta_updated.csv")
 OUTPUT_FILE = os.path.join(_BOSS_DIR, "csv_file", "jobs_gemini_edited.csv")
 FINAL_OUTPUT_FILE = os.path.join(_BOSS_DIR, "csv_file", "jobs_final.csv")
 
-genai.configure(api_key=GEMINI_API_KEY)
-
 MODEL_LIST = [
     'gemini-3-flash-preview',
     'gemini-2.5-pro',
 ]
 
+# 对冲请求数占实际发出请求数的百分比上限（输掉的请求照常跑完并消耗配额），0 表示关闭；对冲请求发往同一模型（"same"）或 MODEL_LIST 中的下一个模型（"fallback"）
+HEDGE_PERCENT = 0
+HEDGE_MODEL = "fallback"
+_hedger = Hedger(HEDGE_PERCENT)
+
 _current_model_index = None
 
 FORBIDDEN_TAG_SUBSTRINGS = (
@@ -47,18 +64,8 @@ def _strip_code_fences(text: str) -> str:
 
 
 def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
-    if not text:
-        return None
-    
-    try:
-        match = re.search(r'\{.*\}', text, re.DOTALL)
-        if match:
-            json_str = match.group()
-            return json.loads(json_str)
-        else:
-            return None
-    except json.JSONDecodeError:
-        return None
+    extracted = loads_tolerant(text)
+    return extracted if isinstance(extracted, dict) else None
 
 
 def _has_forbidden_remote_tag(tags: Any) -> bool:
@@ -78,6 +85,39 @@ def _tags_len_ok(tags: Any) -> bool:
     return isinstance(tags, list) and 5 <= len(tags) <= 7
 
 
+def _json_generation_config(schema: Dict[str, Any]) -> "genai_types.GenerateContentConfig":
+    return get_genai().types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
+
+
+def _hedge_model_for(model_name: str) -> str:
+    if HEDGE_MODEL == "fallback" and model_name in MODEL_LIST:
+        idx = MODEL_LIST.index(model_name)
+        if idx + 1 < len(MODEL_LIST):
+            return MODEL_LIST[idx + 1]
+    return model_name
+
+
+def _generate_text(p: str, model_name: str, api_key: str, generation_config: "genai_types.GenerateContentConfig",
+                   timeout: int = GEMINI_TIMEOUT) -> str:
+    """一次 generate_content 并返回 response.text；超过该模型 p95 仍未返回时按 HEDGE_PERCENT 发出对冲请求。"""
+    def _request(name: str):
+        def run() -> str:
+            ledger = get_quota_ledger()
+            # 发出前先记一次请求：失败、429、超时的请求同样计入供应商的每日配额
+            ledger.record(name, api_key)
+            response = generate_content(name, api_key, p, generation_config, timeout)
+            ledger.record_response(name, api_key, response, requests=0)
+            if not response:
+                raise ValueError("Gemini returned None response object")
+            try:
+                return getattr(response, "text", "") or ""
+            except Exception as e:
+                raise ValueError(f"Error accessing response.text: {str(e)}")
+        return run
+    hedge_model = _hedge_model_for(model_name)
+    return _hedger.call(model_name, _request(model_name), _request(hedge_model), hedge_model=hedge_model)
+
+
 def _get_current_model() -> Optional[str]:
     global _current_model_index
     
@@ -111,35 +151,11 @@ def _switch_to_next_model() -> Optional[str]:
     return model_name
 
 
-def get_optimized_job_info(original_title: str, description: str) -> Dict:
-    prompt = f"""
-<task>
-Given <original_title> and <description>, generate the Chinese versions first, then translate them to English.
+# 各字段组的 prompt 规则及其版本。修改某组规则时把对应版本 +1，
+# csv_processor.reenrich_stale() 会只为旧版本生成的行重新生成该组字段
+PROMPT_VERSIONS = {"title": 1, "tags": 1, "description": 1}
 
-IMPORTANT CHECK FIRST:
-- Check if the title OR description mentions remote work keywords: 远程 / remote / WFH / work from home / 居家办公 / 在家办公 / 全员远程 / 远程办公 / 远程岗位 / 支持远程 / 可远程 / remote work / remote position / work remotely
-- If NEITHER the title NOR the description mentions remote work, this job is NOT a remote position. Return an empty JSON object: {{}}
-- If at least one of them mentions remote work, proceed with the normal workflow below.
-
-Workflow (only if remote work is mentioned):
-1. Generate title_chinese (core version) → then translate to title_english
-2. Generate tags_chinese (core version) → then translate to tags_english (one-to-one correspondence)
-3. Generate description_chinese (core version) → then translate to description_english (preserve format structure)
-
-CRITICAL REQUIREMENT: You MUST return ONLY valid JSON format. No markdown, no code blocks, no explanations, no additional text before or after the JSON.
-</task>
-
-<input>
-<original_title>{original_title}</original_title>
-<description>
-{description}
-</description>
-</input>
-
-<rules>
-
-<title>
-Step 1: Generate title_chinese (CORE VERSION)
+_TITLE_RULES = """Step 1: Generate title_chinese (CORE VERSION)
 - Extract the core role name from original_title; be short, professional, accurate.
 - Remove noise words:
   - remote/location words: 远程 / remote / WFH / work from home / 居家办公 / 在家办公 / 全员远程 / 远程办公
@@ -155,11 +171,9 @@ Step 1: Generate title_chinese (CORE VERSION)
 Step 2: Generate title_english (TRANSLATION OF title_chinese)
 - Translate title_chinese to clear, professional English
 - Keep technical terms as-is (e.g., Java, React, C++, Python)
-- Maintain the same meaning and tone as title_chinese
-</title>
+- Maintain the same meaning and tone as title_chinese"""
 
-<tags>
-Step 1: Generate tags_chinese (CORE VERSION)
+_TAGS_RULES = """Step 1: Generate tags_chinese (CORE VERSION)
 - Extract 5-7 tags from the description following the order and rules below
 - If an optional category (like industry) is unclear, DO NOT output it; instead, fill with other high-signal info so the total still stays 5-7
 
@@ -200,11 +214,9 @@ Step 2: Generate tags_english (TRANSLATION OF tags_chinese)
   - "小红书运营" → "Xiaohongshu Operations"
   - "小程序前端开发" → "Mini Program Frontend Development"
   - "电商行业" → "E-commerce Industry"
-  - "React+TypeScript" → "React+TypeScript" (keep as-is)
-</tags>
+  - "React+TypeScript" → "React+TypeScript" (keep as-is)"""
 
-<description>
-Step 1: Generate description_chinese (CORE VERSION)
+_DESCRIPTION_RULES = """Step 1: Generate description_chinese (CORE VERSION)
 - Process the original description to create a clean Chinese version:
   1. If original is mostly Chinese with some English terms (Java/React/Amazon), keep those terms; only translate the English sentences to Chinese.
 2. If bilingual (roughly 50/50), translate/merge into cohesive Chinese, preserving original punctuation/format/tone as much as possible.
@@ -224,16 +236,58 @@ Step 2: Generate description_english (TRANSLATION OF description_chinese)
 - Keep technical terms as-is (e.g., Java, React, Python, AWS)
 - Maintain the same tone and meaning as description_chinese
 - Do not omit any details
-- The structure of description_english should mirror description_chinese exactly
+- The structure of description_english should mirror description_chinese exactly"""
+
+_GROUP_RULES = {"title": _TITLE_RULES, "tags": _TAGS_RULES, "description": _DESCRIPTION_RULES}
+
+
+def build_job_prompt(original_title: str, description: str) -> str:
+    return f"""
+<task>
+Given <original_title> and <description>, generate the Chinese versions first, then translate them to English.
+
+IMPORTANT CHECK FIRST:
+- Check if the title OR description mentions remote work keywords: 远程 / remote / WFH / work from home / 居家办公 / 在家办公 / 全员远程 / 远程办公 / 远程岗位 / 支持远程 / 可远程 / remote work / remote position / work remotely
+- If NEITHER the title NOR the description mentions remote work, this job is NOT a remote position. Return only: {{"is_remote": false}}
+- If at least one of them mentions remote work, proceed with the normal workflow below.
+
+Workflow (only if remote work is mentioned):
+1. Generate title_chinese (core version) → then translate to title_english
+2. Generate tags_chinese (core version) → then translate to tags_english (one-to-one correspondence)
+3. Generate description_chinese (core version) → then translate to description_english (preserve format structure)
+
+CRITICAL REQUIREMENT: You MUST return ONLY valid JSON format. No markdown, no code blocks, no explanations, no additional text before or after the JSON.
+</task>
+
+<input>
+<original_title>{original_title}</original_title>
+<description>
+{description}
+</description>
+</input>
+
+<rules>
+
+<title>
+{_TITLE_RULES}
+</title>
+
+<tags>
+{_TAGS_RULES}
+</tags>
+
+<description>
+{_DESCRIPTION_RULES}
 </description>
 
 <output_format>
 CRITICAL: You MUST return ONLY valid JSON. No markdown, no code blocks, no explanations, no additional text.
 
-If the job is NOT remote (no remote work keywords found), return an empty JSON object: {{}}
+If the job is NOT remote (no remote work keywords found), return only: {{"is_remote": false}}
 
 If the job IS remote, the output MUST be a valid JSON object with EXACT keys:
 {{
+  "is_remote": true,
   "title_chinese": "...",
   "title_english": "...",
   "tags_chinese": ["... (5-7 items) ..."],
@@ -250,39 +304,90 @@ IMPORTANT:
 - All strings must be properly escaped if they contain quotes
 
 Example of correct output:
-{{"title_chinese": "软件工程师", "title_english": "Software Engineer", "tags_chinese": ["后端开发", "Java", "Spring"], "tags_english": ["Backend Development", "Java", "Spring"], "description_chinese": "...", "description_english": "..."}}
+{{"is_remote": true, "title_chinese": "软件工程师", "title_english": "Software Engineer", "tags_chinese": ["后端开发", "Java", "Spring"], "tags_english": ["Backend Development", "Java", "Spring"], "description_chinese": "...", "description_english": "..."}}
 </output_format>
 
 </rules>
 """
-    def _call_gemini(p: str, model_name: str) -> Optional[Dict[str, Any]]:
+
+
+def build_completion_prompt(original_title: str, description: str, partial: Dict[str, Any], missing: List[str]) -> str:
+    return build_job_prompt(original_title, description) + f"""
+<completion>
+A previous answer was cut off. These fields are already complete and MUST NOT be generated again:
+{json.dumps(partial, ensure_ascii=False, indent=2)}
+
+Generate ONLY the missing fields, following the same rules and staying consistent with the fields above: {", ".join(missing)}
+Return ONLY a JSON object with exactly these keys.
+</completion>
+"""
+
+
+def build_group_prompt(original_title: str, description: str, groups: List[str], context: Dict[str, Any]) -> str:
+    """只重新生成 groups 中字段组的精简 prompt，只带这些组的规则；其余字段作为上下文保持不变。"""
+    fields = [f for g in groups for f in FIELD_GROUPS[g]]
+    rules = "\n\n".join(f"<{g}>\n{_GROUP_RULES[g]}\n</{g}>" for g in groups)
+    return f"""
+<task>
+Given <original_title> and <description>, regenerate ONLY these fields: {", ".join(fields)}.
+Generate the Chinese version first, then translate it to English.
+These fields are already final and MUST stay unchanged; keep the new fields consistent with them:
+{json.dumps(context, ensure_ascii=False, indent=2)}
+
+CRITICAL REQUIREMENT: You MUST return ONLY valid JSON format. No markdown, no code blocks, no explanations, no additional text before or after the JSON.
+</task>
+
+<input>
+<original_title>{original_title}</original_title>
+<description>
+{description}
+</description>
+</input>
+
+<rules>
+
+{rules}
+
+<output_format>
+Return ONLY a JSON object with exactly these keys: {", ".join(fields)}
+</output_format>
+
+</rules>
+"""
+
+
+def get_optimized_job_info(original_title: str, description: str, groups: Optional[List[str]] = None,
+                           context: Optional[Dict[str, Any]] = None) -> Dict:
+    """
+    groups 为空时生成全部字段；否则只用精简 prompt 重新生成这些字段组，context 为保持不变的其余字段。
+    """
+    fields = [f for g in groups for f in FIELD_GROUPS[g]] if groups else None
+    if groups:
+        prompt = build_group_prompt(original_title, description, groups, context or {})
+    else:
+        prompt = build_job_prompt(original_title, description)
+    # description_chinese + description_english，各自与原文长度相当
+    expected_output_tokens = 2 * estimate_tokens(description) + ENRICH_OUTPUT_OVERHEAD
+    def _call_gemini(p: str, model_name: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
         last_error = None
         error_type = None
         last_content = None
+        api_key = None
+        quota_hits = 0
+        timeout = RETRY_POLICY.timeout_for(estimate_tokens(p), expected_output_tokens)
+        backoff = RETRY_POLICY.backoff()
         
         def _timeout_handler(signum, frame):
-            raise TimeoutError(f"Gemini API call timed out after {GEMINI_TIMEOUT} seconds")
+            raise TimeoutError(f"Gemini API call timed out after {timeout} seconds")
         
         for attempt in range(6):
             try:
                 signal.signal(signal.SIGALRM, _timeout_handler)
-                signal.alarm(GEMINI_TIMEOUT)
+                signal.alarm(timeout)
                 
-                current_model = genai.GenerativeModel(model_name)
-                response = current_model.generate_content(p)
-                
-                if not response:
-                    signal.alarm(0)
-                    raise ValueError("Gemini returned None response object")
-                
-                try:
-                    content = _strip_code_fences(getattr(response, "text", "") or "")
-                except AttributeError:
-                    signal.alarm(0)
-                    raise ValueError(f"Gemini response object missing 'text' attribute. Response type: {type(response)}")
-                except Exception as e:
-                    signal.alarm(0)
-                    raise ValueError(f"Error accessing response.text: {str(e)}")
+                api_key = get_credential_pool().acquire(model_name)
+                schema = job_info_schema(fields=fields)
+                content = _strip_code_fences(_generate_text(p, model_name, api_key, _json_generation_config(schema), timeout))
                 
                 last_content = content
                 signal.alarm(0)
@@ -292,36 +397,48 @@ Example of correct output:
                 
                 try:
                     parsed_result = json.loads(content)
-                    if isinstance(parsed_result, dict) and len(parsed_result) == 0:
-                        print(f"    ℹ️  Non-remote job detected (empty JSON object returned)")
+                except json.JSONDecodeError:
+                    parsed_result = extract_json_from_text(content)
+                    if parsed_result is None:
+                        # 输出被截断：保留已完整的字段，由调用方只补全缺失部分
+                        parsed_result, _ = loads_partial(content)
+                        if not any(f in parsed_result for f in JOB_FIELDS):
+                            raise
+                        if fields is not None and missing_job_fields(parsed_result, fields):
+                            # 只补全部分字段时不接受不完整的结果，否则调用方会把没生成的字段组当成已更新
+                            raise json.JSONDecodeError("Truncated response is missing requested fields", content, 0)
+                        print(f"    🧩 Recovered {len(parsed_result)} complete field(s) from truncated output (model: {model_name})")
                         return parsed_result
+                    print(f"    ✅ Fixed JSON by extracting from text (model: {model_name})")
+                if fields is not None:
+                    if missing_job_fields(parsed_result, fields):
+                        raise json.JSONDecodeError("Response is missing requested fields", content, 0)
                     return parsed_result
-                except json.JSONDecodeError:
-                    extracted = extract_json_from_text(content)
-                    if extracted:
-                        if isinstance(extracted, dict) and len(extracted) == 0:
-                            print(f"    ℹ️  Non-remote job detected (empty JSON object extracted)")
-                            return extracted
-                        print(f"    ✅ Fixed JSON by extracting from text (model: {model_name})")
-                        return extracted
-                    raise
+                validated = validate_job_info(parsed_result)
+                if validated is None:
+                    # 不完整的结果只交给调用方补全缺失字段，补全后整体校验通过才算成功
+                    if isinstance(parsed_result, dict) and any(f in parsed_result for f in JOB_FIELDS):
+                        return parsed_result
+                    raise json.JSONDecodeError("Response does not match the job info schema", content, 0)
+                if len(validated) == 0:
+                    print(f"    ℹ️  Non-remote job detected (is_remote=false)")
+                return validated
             except TimeoutError as e:
                 signal.alarm(0)
                 last_error = e
                 error_type = "API_TIMEOUT"
                 if attempt < 3:
                     print(f"    ⚠️  Attempt {attempt + 1}/6: API timeout (model: {model_name}), retrying...")
-                    time.sleep(2)
+                    time.sleep(backoff.next(2))
                     continue
             except json.JSONDecodeError as e:
                 signal.alarm(0)
                 last_error = e
                 error_type = "JSON_PARSE"
-                if attempt < 3:
-                    print(f"    ⚠️  Attempt {attempt + 1}/6: JSON parse error (model: {model_name}), retrying...")
-                    print(f"       Response preview: {last_content[:200] if last_content else 'empty'}")
-                    time.sleep(2)
-                    continue
+                # 输出已由 response_schema 约束，格式错误（通常是被截断）重试同一个 prompt 没有意义
+                print(f"    ⚠️  Invalid JSON output (model: {model_name}), not retrying")
+                print(f"       Response preview: {last_content[:200] if last_content else 'empty'}")
+                break
             except Exception as e:
                 signal.alarm(0)
                 last_error = e
@@ -331,15 +448,22 @@ Example of correct output:
                     error_type = "API_TIMEOUT"
                     if attempt < 3:
                         print(f"    ⚠️  Attempt {attempt + 1}/6: API timeout (model: {model_name}), retrying...")
-                        time.sleep(2)
+                        time.sleep(backoff.next(2))
                         continue
                 elif "429" in str(e) or "quota" in msg or "rate" in msg:
                     error_type = "API_QUOTA"
-                    if attempt == 0:
-                        print(f"    ⚠️  Quota exhausted for model: {model_name} (first attempt)")
+                    quota_hits += 1
+                    hint = retry_after_hint(e)
+                    get_credential_pool().report_rate_limited(api_key, model_name, hint)
+                    if get_credential_pool().available(model_name):
+                        print(f"    ⚠️  Attempt {attempt + 1}/6: Rate limited on key {mask_key(api_key)}, switching key (model: {model_name})")
+                        continue
+                    # 所有 key 都在冷却且从未成功过，视为该模型配额耗尽
+                    if quota_hits == attempt + 1:
+                        print(f"    ⚠️  Quota exhausted for model: {model_name} (all keys rate limited)")
                         raise Exception("QUOTA_EXHAUSTED")
-                    sleep_s = min(60, 5 * (attempt + 1))
-                    print(f"    ⚠️  Attempt {attempt + 1}/6: API rate limit (model: {model_name}), waiting {sleep_s}s...")
+                    sleep_s = backoff.next(5, hint=hint)
+                    print(f"    ⚠️  Attempt {attempt + 1}/6: API rate limit (model: {model_name}), waiting {sleep_s:.1f}s...")
                     time.sleep(sleep_s)
                     continue
                 elif "403" in str(e) or "permission" in msg or "forbidden" in msg:
@@ -357,21 +481,21 @@ Example of correct output:
                 elif "network" in msg or "connection" in msg:
                     error_type = "API_NETWORK"
                     if attempt < 4:
-                        sleep_s = min(30, 3 * (attempt + 1))
-                        print(f"    ⚠️  Attempt {attempt + 1}/6: Network error (model: {model_name}), retrying in {sleep_s}s...")
+                        sleep_s = backoff.next(3, cap=30)
+                        print(f"    ⚠️  Attempt {attempt + 1}/6: Network error (model: {model_name}), retrying in {sleep_s:.1f}s...")
                         time.sleep(sleep_s)
                         continue
                 else:
                     error_type = "API_OTHER"
                     if attempt < 2:
                         print(f"    ⚠️  Attempt {attempt + 1}/6: API error ({type(e).__name__}: {e}) (model: {model_name}), retrying...")
-                        time.sleep(1)
+                        time.sleep(backoff.next(1))
                         continue
         
         if last_error:
             error_msg = str(last_error)
             if error_type == "JSON_PARSE":
-                print(f"    ❌ CODE ISSUE: JSON parsing failed after 6 attempts (model: {model_name})")
+                print(f"    ❌ MODEL OUTPUT ISSUE: Invalid JSON output, not retried (model: {model_name})")
                 print(f"       Error: {error_msg}")
                 print(f"       Last response preview: {last_content[:300] if last_content else 'N/A'}")
             elif error_type == "API_QUOTA":
@@ -381,7 +505,7 @@ Example of correct output:
                 print(f"    ❌ GEMINI API ISSUE: Network/connection problem after 6 attempts (model: {model_name})")
                 print(f"       Error: {error_msg}")
             elif error_type == "API_TIMEOUT":
-                print(f"    ❌ GEMINI API ISSUE: Request timed out after {GEMINI_TIMEOUT}s after 6 attempts (model: {model_name})")
+                print(f"    ❌ GEMINI API ISSUE: Request timed out after {timeout}s after 6 attempts (model: {model_name})")
                 print(f"       Error: {error_msg}")
             elif error_type == "API_MODEL_NOT_FOUND":
                 print(f"    ❌ GEMINI API ISSUE: Model not found (model: {model_name})")
@@ -409,7 +533,7 @@ Example of correct output:
     
     while switch_count < max_model_switches and current_model:
         try:
-            result = _call_gemini(prompt, current_model)
+            result = _call_gemini(prompt, current_model, fields)
             if result is not None:
                 if isinstance(result, dict) and len(result) == 0:
                     print(f"    ℹ️  Non-remote job (empty result), returning empty dict")
@@ -435,6 +559,21 @@ Example of correct output:
     
     if isinstance(result, dict) and len(result) == 0:
         return result
+
+    if fields is not None:
+        return result
+
+    missing = missing_job_fields(result)
+    if missing:
+        print(f"    🧩 Requesting only missing fields: {', '.join(missing)} (model: {current_model})")
+        partial = {k: v for k, v in result.items() if k in JOB_FIELDS and k not in missing}
+        completion = _call_gemini(build_completion_prompt(original_title, description, partial, missing), current_model, missing)
+        result = {**partial, **(completion or {})}
+    # 截断恢复或补全得到的结果同样要通过校验，否则返回 None 让 process_job 记为失败
+    result = validate_job_info(result, remote_check=False)
+    if result is None:
+        print(f"    ❌ Result still incomplete after completion, giving up (model: {current_model})")
+        return None
     
     tags_chinese = result.get("tags_chinese")
     tags_english = result.get("tags_english")
@@ -450,40 +589,105 @@ CRITICAL: Return ONLY valid JSON. No markdown, no code blocks, no explanations.
 """
         print(f"    🔧 Constraint violation detected, retrying with correction (model: {current_model})...")
         result2 = _call_gemini(correction + "\n" + prompt, current_model)
-        return result2 or result
+        # 纠正请求被截断或不合 schema 时不采用，退回已通过校验的第一次结果
+        if result2 and not missing_job_fields(result2):
+            return validate_job_info(result2, remote_check=False)
+        return result
 
     return result
 
 
+def build_translate_prompt(jobs_batch: List[Dict[str, Any]]) -> str:
+    jobs_data = []
+    for idx, job in enumerate(jobs_batch):
+        job_id = job.get('_id', '')
+        title_chinese = job.get('title_chinese', '').strip()
+        description_chinese = job.get('description_chinese', '').strip()
+        summary_chinese = job.get('summary_chinese', '').strip()
+        
+        jobs_data.append({
+            'id': job_id,
+            'title_chinese': title_chinese,
+            'description_chinese': description_chinese,
+            'summary_chinese': summary_chinese
+        })
+
+    return f"""
+<task>
+Translate the Chinese fields to English for {len(jobs_data)} jobs.
+For each job, translate:
+1) title_chinese -> title_english
+2) description_chinese -> description_english  
+3) summary_chinese -> summary_english (this is a comma-separated list of tags, translate each tag and keep comma-separated format)
+
+CRITICAL REQUIREMENT: You MUST return ONLY valid JSON format. No markdown, no code blocks, no explanations, no additional text before or after the JSON.
+</task>
+
+<jobs>
+{json.dumps(jobs_data, ensure_ascii=False, indent=2)}
+</jobs>
+
+<rules>
+- title_english: Translate the job title to clear, professional English. Keep technical terms as-is (e.g., Java, React, Python).
+- description_english: Translate the full job description to English. Preserve formatting, structure, and technical terms.
+- summary_english: Translate each tag in the comma-separated summary_chinese to English, keeping the comma-separated format. Keep technical terms as-is.
+
+If a field is empty or missing, return an empty string for that field.
+Preserve the meaning and tone of the original text.
+</rules>
+
+<output_format>
+CRITICAL: You MUST return ONLY valid JSON. No markdown, no code blocks, no explanations.
+
+The output MUST be a valid JSON object with this structure:
+{{
+  "translations": [
+    {{
+      "id": "job_id_1",
+      "title_english": "...",
+      "description_english": "...",
+      "summary_english": "..."
+    }},
+    {{
+      "id": "job_id_2",
+      "title_english": "...",
+      "description_english": "...",
+      "summary_english": "..."
+    }}
+  ]
+}}
+
+IMPORTANT:
+- Return ONLY the JSON object itself
+- Do NOT wrap it in ```json``` or ``` blocks
+- Do NOT add any comments or explanations
+- The response must start with {{ and end with }}
+- All strings must be properly escaped if they contain quotes
+- Include translations for ALL {len(jobs_data)} jobs in the same order as input
+</output_format>
+"""
+
+
 def translate_chinese_to_english(jobs_batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     def _call_gemini_translate(p: str, model_name: str) -> Optional[Dict[str, Any]]:
         last_error = None
         error_type = None
         last_content = None
+        api_key = None
+        quota_hits = 0
+        timeout = RETRY_POLICY.timeout_for(estimate_tokens(p), expected_output_tokens)
+        backoff = RETRY_POLICY.backoff()
         
         def _timeout_handler(signum, frame):
-            raise TimeoutError(f"Gemini API call timed out after {GEMINI_TIMEOUT} seconds")
+            raise TimeoutError(f"Gemini API call timed out after {timeout} seconds")
         
         for attempt in range(6):
             try:
                 signal.signal(signal.SIGALRM, _timeout_handler)
-                signal.alarm(GEMINI_TIMEOUT)
-                
-                current_model = genai.GenerativeModel(model_name)
-                response = current_model.generate_content(p)
+                signal.alarm(timeout)
                 
-                if not response:
-                    signal.alarm(0)
-                    raise ValueError("Gemini returned None response object")
-                
-                try:
-                    content = _strip_code_fences(getattr(response, "text", "") or "")
-                except AttributeError:
-                    signal.alarm(0)
-                    raise ValueError(f"Gemini response object missing 'text' attribute. Response type: {type(response)}")
-                except Exception as e:
-                    signal.alarm(0)
-                    raise ValueError(f"Error accessing response.text: {str(e)}")
+                api_key = get_credential_pool().acquire(model_name)
+                content = _strip_code_fences(_generate_text(p, model_name, api_key, _json_generation_config(TRANSLATION_SCHEMA), timeout))
                 
                 last_content = content
                 signal.alarm(0)
@@ -492,30 +696,32 @@ def translate_chinese_to_english(jobs_batch: List[Dict[str, Any]]) -> List[Dict[
                     raise ValueError(f"Gemini returned invalid response: type={type(content)}, value={repr(content)[:100]}")
                 
                 try:
-                    return json.loads(content)
+                    parsed_result = json.loads(content)
                 except json.JSONDecodeError:
-                    extracted = extract_json_from_text(content)
-                    if extracted:
-                        print(f"    ✅ Fixed JSON by extracting from text (model: {model_name})")
-                        return extracted
-                    raise
+                    parsed_result = extract_json_from_text(content)
+                    if parsed_result is None:
+                        raise
+                    print(f"    ✅ Fixed JSON by extracting from text (model: {model_name})")
+                validated = validate_translations(parsed_result)
+                if validated is None:
+                    raise json.JSONDecodeError("Response does not match the translation schema", content, 0)
+                return validated
             except TimeoutError as e:
                 signal.alarm(0)
                 last_error = e
                 error_type = "API_TIMEOUT"
                 if attempt < 3:
                     print(f"    ⚠️  Attempt {attempt + 1}/6: API timeout (model: {model_name}), retrying...")
-                    time.sleep(2)
+                    time.sleep(backoff.next(2))
                     continue
             except json.JSONDecodeError as e:
                 signal.alarm(0)
                 last_error = e
                 error_type = "JSON_PARSE"
-                if attempt < 3:
-                    print(f"    ⚠️  Attempt {attempt + 1}/6: JSON parse error (model: {model_name}), retrying...")
-                    print(f"       Response preview: {last_content[:200] if last_content else 'empty'}")
-                    time.sleep(2)
-                    continue
+                # 输出已由 response_schema 约束，格式错误（通常是被截断）重试同一个 prompt 没有意义
+                print(f"    ⚠️  Invalid JSON output (model: {model_name}), not retrying")
+                print(f"       Response preview: {last_content[:200] if last_content else 'empty'}")
+                break
             except Exception as e:
                 signal.alarm(0)
                 last_error = e
@@ -525,15 +731,22 @@ def translate_chinese_to_english(jobs_batch: List[Dict[str, Any]]) -> List[Dict[
                     error_type = "API_TIMEOUT"
                     if attempt < 3:
                         print(f"    ⚠️  Attempt {attempt + 1}/6: API timeout (model: {model_name}), retrying...")
-                        time.sleep(2)
+                        time.sleep(backoff.next(2))
                         continue
                 elif "429" in str(e) or "quota" in msg or "rate" in msg:
                     error_type = "API_QUOTA"
-                    if attempt == 0:
-                        print(f"    ⚠️  Quota exhausted for model: {model_name} (first attempt)")
+                    quota_hits += 1
+                    hint = retry_after_hint(e)
+                    get_credential_pool().report_rate_limited(api_key, model_name, hint)
+                    if get_credential_pool().available(model_name):
+                        print(f"    ⚠️  Attempt {attempt + 1}/6: Rate limited on key {mask_key(api_key)}, switching key (model: {model_name})")
+                        continue
+                    # 所有 key 都在冷却且从未成功过，视为该模型配额耗尽
+                    if quota_hits == attempt + 1:
+                        print(f"    ⚠️  Quota exhausted for model: {model_name} (all keys rate limited)")
                         raise Exception("QUOTA_EXHAUSTED")
-                    sleep_s = min(60, 5 * (attempt + 1))
-                    print(f"    ⚠️  Attempt {attempt + 1}/6: API rate limit (model: {model_name}), waiting {sleep_s}s...")
+                    sleep_s = backoff.next(5, hint=hint)
+                    print(f"    ⚠️  Attempt {attempt + 1}/6: API rate limit (model: {model_name}), waiting {sleep_s:.1f}s...")
                     time.sleep(sleep_s)
                     continue
                 elif "403" in str(e) or "permission" in msg or "forbidden" in msg:
@@ -551,25 +764,25 @@ def translate_chinese_to_english(jobs_batch: List[Dict[str, Any]]) -> List[Dict[
                 elif "network" in msg or "connection" in msg:
                     error_type = "API_NETWORK"
                     if attempt < 4:
-                        sleep_s = min(30, 3 * (attempt + 1))
-                        print(f"    ⚠️  Attempt {attempt + 1}/6: Network error (model: {model_name}), retrying in {sleep_s}s...")
+                        sleep_s = backoff.next(3, cap=30)
+                        print(f"    ⚠️  Attempt {attempt + 1}/6: Network error (model: {model_name}), retrying in {sleep_s:.1f}s...")
                         time.sleep(sleep_s)
                         continue
                 else:
                     error_type = "API_OTHER"
                     if attempt < 2:
                         print(f"    ⚠️  Attempt {attempt + 1}/6: API error ({type(e).__name__}: {e}) (model: {model_name}), retrying...")
-                        time.sleep(1)
+                        time.sleep(backoff.next(1))
                         continue
         
         if last_error:
             error_msg = str(last_error)
             if error_type == "JSON_PARSE":
-                print(f"    ❌ JSON parsing failed after 6 attempts (model: {model_name})")
+                print(f"    ❌ Invalid JSON output, not retried (model: {model_name})")
                 print(f"       Error: {error_msg}")
                 print(f"       Last response preview: {last_content[:300] if last_content else 'N/A'}")
             elif error_type == "API_TIMEOUT":
-                print(f"    ❌ Translation API error: Request timed out after {GEMINI_TIMEOUT}s after 6 attempts (model: {model_name})")
+                print(f"    ❌ Translation API error: Request timed out after {timeout}s after 6 attempts (model: {model_name})")
                 print(f"       Error: {error_msg}")
             else:
                 print(f"    ❌ Translation API error: {error_type or 'Unknown error'} after 6 attempts (model: {model_name})")
@@ -579,74 +792,12 @@ def translate_chinese_to_english(jobs_batch: List[Dict[str, Any]]) -> List[Dict[
         
         return None
 
-    jobs_data = []
-    for idx, job in enumerate(jobs_batch):
-        job_id = job.get('_id', '')
-        title_chinese = job.get('title_chinese', '').strip()
-        description_chinese = job.get('description_chinese', '').strip()
-        summary_chinese = job.get('summary_chinese', '').strip()
-        
-        jobs_data.append({
-            'id': job_id,
-            'title_chinese': title_chinese,
-            'description_chinese': description_chinese,
-            'summary_chinese': summary_chinese
-        })
-    
-    prompt = f"""
-<task>
-Translate the Chinese fields to English for {len(jobs_data)} jobs.
-For each job, translate:
-1) title_chinese -> title_english
-2) description_chinese -> description_english  
-3) summary_chinese -> summary_english (this is a comma-separated list of tags, translate each tag and keep comma-separated format)
-
-CRITICAL REQUIREMENT: You MUST return ONLY valid JSON format. No markdown, no code blocks, no explanations, no additional text before or after the JSON.
-</task>
-
-<jobs>
-{json.dumps(jobs_data, ensure_ascii=False, indent=2)}
-</jobs>
-
-<rules>
-- title_english: Translate the job title to clear, professional English. Keep technical terms as-is (e.g., Java, React, Python).
-- description_english: Translate the full job description to English. Preserve formatting, structure, and technical terms.
-- summary_english: Translate each tag in the comma-separated summary_chinese to English, keeping the comma-separated format. Keep technical terms as-is.
-
-If a field is empty or missing, return an empty string for that field.
-Preserve the meaning and tone of the original text.
-</rules>
-
-<output_format>
-CRITICAL: You MUST return ONLY valid JSON. No markdown, no code blocks, no explanations.
-
-The output MUST be a valid JSON object with this structure:
-{{
-  "translations": [
-    {{
-      "id": "job_id_1",
-      "title_english": "...",
-      "description_english": "...",
-      "summary_english": "..."
-    }},
-    {{
-      "id": "job_id_2",
-      "title_english": "...",
-      "description_english": "...",
-      "summary_english": "..."
-    }}
-  ]
-}}
-
-IMPORTANT:
-- Return ONLY the JSON object itself
-- Do NOT wrap it in ```json``` or ``` blocks
-- Do NOT add any comments or explanations
-- The response must start with {{ and end with }}
-- All strings must be properly escaped if they contain quotes
-- Include translations for ALL {len(jobs_data)} jobs in the same order as input
-</output_format>
-"""
+    prompt = build_translate_prompt(jobs_batch)
+    expected_output_tokens = sum(
+        estimate_tokens(job.get('title_chinese', '')) + estimate_tokens(job.get('description_chinese', ''))
+        + estimate_tokens(job.get('summary_chinese', '')) + TRANSLATE_OUTPUT_OVERHEAD
+        for job in jobs_batch
+    )
     
     current_model = _get_current_model()
     if not current_model:
@@ -0,0 +1,98 @@
+import argparse
+import os
+import sys
+import warnings
+
+warnings.filterwarnings('ignore')
+
+# 确保能导入项目根目录的 util
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from flask import Flask, Response, jsonify
+from flask_cors import CORS
+
+from enrich_all import SITES, load_site_module
+from util.bridge_metrics import REGISTRY, health
+from util.bridge_serving import serve
+
+# 各站点插件写死的端口，统一 bridge 同时监听这些端口
+SITE_PORTS = {"boss": 5000, "zhilian": 5001, "wellfound": 5002}
+
+
+class PortPrefixMiddleware:
+    """旧插件按端口区分站点：不带站点前缀的请求，按到达的端口转给对应站点的路由（passthrough 中的路径除外）。"""
+
+    def __init__(self, wsgi_app, prefix_by_port, passthrough=()):
+        self.wsgi_app = wsgi_app
+        self.prefix_by_port = prefix_by_port
+        self.passthrough = tuple(passthrough)
+
+    def __call__(self, environ, start_response):
+        prefix = self.prefix_by_port.get(str(environ.get("SERVER_PORT")))
+        path = environ.get("PATH_INFO", "")
+        if prefix and path not in self.passthrough and path != prefix and not path.startswith(prefix + "/"):
+            environ["PATH_INFO"] = prefix + path
+        return self.wsgi_app(environ, start_response)
+
+
+def create_app(sites=None, legacy_ports: bool = True):
+    """
+    一个进程承载所有站点：每个站点的 server.py 提供 Blueprint（URL 规范化、字段默认值、薪资归一化各自保留），
+    挂在 /<site>/ 下，各自的 meta 索引和待抓取队列都在这个进程里。
+    """
+    sites = sites or SITES
+    app = Flask(__name__)
+    CORS(app)  # 允许浏览器插件跨域调用
+    stores = {}
+    for site in sites:
+        server = load_site_module(site, "server")
+        app.register_blueprint(server.bp, url_prefix=f"/{site}")
+        stores[site] = server.init_store()
+
+    @app.route('/sites', methods=['GET'])
+    def site_stats():
+        """所有站点的待抓取队列概况"""
+        return jsonify({site: store.dispatch.stats() for site, store in stores.items()})
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """所有站点的指标（Prometheus 文本格式，按 site 标签区分）"""
+        return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route('/health', methods=['GET'])
+    def health_check():
+        body, healthy = health(stores)
+        response = jsonify(body)
+        response.status_code = 200 if healthy else 503
+        return response
+
+    if legacy_ports:
+        app.wsgi_app = PortPrefixMiddleware(app.wsgi_app, {str(SITE_PORTS[s]): f"/{s}" for s in sites},
+                                            passthrough=("/sites", "/metrics", "/health"))
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve all sites' bridge routes from one process")
+    parser.add_argument("--sites", default=",".join(SITES), help="Comma-separated sites to host")
+    parser.add_argument("--port", type=int, default=None,
+                        help="Listen only on this port (routes under /<site>/); default listens on every site's legacy port")
+    parser.add_argument("--threads", type=int, default=None, help="Worker threads (default BRIDGE_THREADS or 8)")
+    args = parser.parse_args()
+
+    sites = [s.strip() for s in args.sites.split(",") if s.strip()]
+    app = create_app(sites, legacy_ports=not args.port)
+    ports = [args.port] if args.port else [SITE_PORTS[s] for s in sites]
+
+    print("\n" + "=" * 60)
+    print(f"🚀 Unified Bridge Server: {', '.join(sites)}")
+    for site in sites:
+        print(f"   {site:<10} http://127.0.0.1:{args.port or SITE_PORTS[site]}" + (f"/{site}" if args.port else ""))
+    print("=" * 60 + "\n")
+    serve(app, ports, threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import importlib
+import os
+import sys
+import warnings
+
+warnings.filterwarnings('ignore')
+
+# 确保能导入项目根目录的 util
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from util.credentials import get_credential_pool
+from util.quota_ledger import get_quota_ledger
+from util.scheduler import GlobalScheduler, SITE_WEIGHTS
+from util.work_queue import PROCESSED, SKIPPED, FAILED
+
+WEBSITES_DIR = os.path.dirname(os.path.abspath(__file__))
+SITES = ["boss", "zhilian", "wellfound"]
+# 各站点目录下同名的模块，加载时需要互相隔离
+_SITE_MODULES = ("csv_processor", "gemini_processor", "utils", "server")
+
+
+def load_site_module(site: str, name: str = "csv_processor"):
+    """在隔离的 sys.modules 中加载某个站点目录下的模块（各站点的模块同名）。"""
+    site_dir = os.path.join(WEBSITES_DIR, site)
+    saved = {m: sys.modules.pop(m) for m in _SITE_MODULES if m in sys.modules}
+    sys.path.insert(0, site_dir)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(site_dir)
+        for m in _SITE_MODULES:
+            sys.modules.pop(m, None)
+        sys.modules.update(saved)
+
+
+def run_all(budget: int, sites=None, site_weights=None, retry_dead: bool = False):
+    sites = sites or SITES
+    if not get_credential_pool().keys:
+        print("❌ No Gemini API key configured (set GEMINI_API_KEYS or GEMINI_API_KEY in .env). Exiting.")
+        return
+    scheduler = GlobalScheduler(budget, site_weights=site_weights)
+    processors = {}
+    for site in sites:
+        processor = load_site_module(site)
+        existing_jobs, queue = processor.prepare_run(retry_dead)
+        scheduler.add_site(site, queue, existing_jobs, processor.process_job,
+                           max_age_days=processor.MAX_AGE_DAYS, worker=processor.QUEUE_WORKER)
+        processors[site] = processor
+
+    # 共享预算不能超过今天 ledger 中剩余的请求数
+    daily_limit = min(p.DAILY_LIMIT for p in processors.values())
+    remaining = get_quota_ledger().remaining_requests(daily_limit, get_credential_pool().keys)
+    if remaining < scheduler.budget:
+        print(f"📊 Remaining capacity today: {remaining} requests, lowering budget from {scheduler.budget}")
+        scheduler.budget = remaining
+
+    print(f"\n{'='*80}")
+    print(f"Phase 2: Processing with Gemini across {', '.join(sites)}")
+    print(f"{'='*80}\n")
+
+    delay = max(p.DELAY_BETWEEN_JOBS for p in processors.values())
+    try:
+        stats = scheduler.run(delay=delay)
+    finally:
+        for ctx in scheduler.sites.values():
+            ctx["queue"].close()
+
+    print(f"\n{'='*80}")
+    for site, s in stats.items():
+        print(f"   {site}: {s[PROCESSED]} processed, {s[SKIPPED]} skipped, {s[FAILED]} failed")
+    for key, models in get_credential_pool().usage().items():
+        for model, usage in models.items():
+            print(f"   key {key} / {model}: {usage['requests']} requests, {usage['rate_limited']} rate limited")
+    print(f"{'='*80}\n")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich jobs from all sites with one shared Gemini budget")
+    parser.add_argument("--budget", type=int, default=1000, help="shared number of jobs to process")
+    parser.add_argument("--sites", nargs="+", choices=SITES, default=SITES)
+    parser.add_argument("--weight", action="append", default=[], metavar="SITE=W",
+                        help=f"site weight override, defaults: {SITE_WEIGHTS}")
+    parser.add_argument("--retry-dead", action="store_true", help="reset dead-lettered jobs that still need processing")
+    args = parser.parse_args()
+
+    weights = {}
+    for item in args.weight:
+        site, _, value = item.partition("=")
+        weights[site] = float(value)
+    run_all(args.budget, args.sites, weights, args.retry_dead)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,31 +4,48 @@ import re
 import time
 import warnings
 import signal
+import sys
 import traceback
-from typing import List, Dict, Any, Optional
-import google.generativeai as genai
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
 
 warnings.filterwarnings('ignore')
 
-# Load environment variables from .env file
-load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env'))
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from util.gemini_schema import FIELD_GROUPS, job_info_schema, JOB_FIELDS, missing_job_fields, validate_job_info
+from util.tolerant_json import loads_tolerant, loads_partial
+from util.quota_ledger import get_quota_ledger
+from util.hedging import Hedger
+from util.retry_policy import RetryPolicy, retry_after_hint
+from util.tokens import estimate_tokens
+from util.estimate import ENRICH_OUTPUT_OVERHEAD
+from util.credentials import get_credential_pool, mask_key
+from util.genai_client import generate_content, get_genai
+
+if TYPE_CHECKING:
+    from google.genai import types as genai_types
 
 GEMINI_TIMEOUT = 120
+# GEMINI_TIMEOUT 是上限，每次调用的实际超时按 prompt 和预期输出的长度计算
+RETRY_POLICY = RetryPolicy(max_timeout=GEMINI_TIMEOUT)
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 _WELLFOUND_DIR = os.path.dirname(os.path.abspath(__file__))
 INPUT_FILE = os.path.join(_WELLFOUND_DIR, "csv_file", "jobs_meta_updated.csv")
 OUTPUT_FILE = os.path.join(_WELLFOUND_DIR, "csv_file", "jobs_gemini_edited.csv")
 FINAL_OUTPUT_FILE = os.path.join(_WELLFOUND_DIR, "csv_file", "jobs_final.csv")
 
-genai.configure(api_key=GEMINI_API_KEY)
-
 MODEL_LIST = [
     'gemini-3-flash-preview',
     'gemini-2.5-pro',
 ]
 
+# 对冲请求数占实际发出请求数的百分比上限（输掉的请求照常跑完并消耗配额），0 表示关闭；对冲请求发往同一模型（"same"）或 MODEL_LIST 中的下一个模型（"fallback"）
+HEDGE_PERCENT = 0
+HEDGE_MODEL = "fallback"
+_hedger = Hedger(HEDGE_PERCENT)
+
 _current_model_index = None
 
 FORBIDDEN_TAG_SUBSTRINGS = (
@@ -46,45 +63,49 @@ def _strip_code_fences(text: str) -> str:
     return t
 
 
-def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
-    if not text:
-        return None
-    
-    try:
-        match = re.search(r'\{.*\}', text, re.DOTALL)
-        if match:
-            json_str = match.group()
-            return json.loads(json_str)
-        else:
-            return None
-    except json.JSONDecodeError:
-        return None
-
-
-def get_optimized_job_info(original_title: str, description: str) -> Dict:
-    prompt = f"""
-<task>
-Given <original_title> and <description>, generate the Chinese versions first, then translate them to English.
+def _json_generation_config(schema: Dict[str, Any]) -> "genai_types.GenerateContentConfig":
+    return get_genai().types.GenerateContentConfig(response_mime_type="application/json", response_schema=schema)
 
-Workflow:
-1. Generate title_chinese (core version) → then translate to title_english
-2. Generate tags_chinese (core version) → then translate to tags_english (one-to-one correspondence)
-3. Generate description_chinese (core version) → then translate to description_english (preserve format structure)
 
-CRITICAL REQUIREMENT: You MUST return ONLY valid JSON format. No markdown, no code blocks, no explanations, no additional text before or after the JSON.
-</task>
+def _hedge_model_for(model_name: str) -> str:
+    if HEDGE_MODEL == "fallback" and model_name in MODEL_LIST:
+        idx = MODEL_LIST.index(model_name)
+        if idx + 1 < len(MODEL_LIST):
+            return MODEL_LIST[idx + 1]
+    return model_name
 
-<input>
-<original_title>{original_title}</original_title>
-<description>
-{description}
-</description>
-</input>
 
-<rules>
+def _generate_text(p: str, model_name: str, api_key: str, generation_config: "genai_types.GenerateContentConfig",
+                   timeout: int = GEMINI_TIMEOUT) -> str:
+    """一次 generate_content 并返回 response.text；超过该模型 p95 仍未返回时按 HEDGE_PERCENT 发出对冲请求。"""
+    def _request(name: str):
+        def run() -> str:
+            ledger = get_quota_ledger()
+            # 发出前先记一次请求：失败、429、超时的请求同样计入供应商的每日配额
+            ledger.record(name, api_key)
+            response = generate_content(name, api_key, p, generation_config, timeout)
+            ledger.record_response(name, api_key, response, requests=0)
+            if not response:
+                raise ValueError("Gemini returned None response object")
+            try:
+                return getattr(response, "text", "") or ""
+            except Exception as e:
+                raise ValueError(f"Error accessing response.text: {str(e)}")
+        return run
+    hedge_model = _hedge_model_for(model_name)
+    return _hedger.call(model_name, _request(model_name), _request(hedge_model), hedge_model=hedge_model)
 
-<title>
-Step 1: Generate title_chinese (CORE VERSION)
+
+def extract_json_from_text(text: str) -> Optional[Dict[str, Any]]:
+    extracted = loads_tolerant(text)
+    return extracted if isinstance(extracted, dict) else None
+
+
+# 各字段组的 prompt 规则及其版本。修改某组规则时把对应版本 +1，
+# csv_processor.reenrich_stale() 会只为旧版本生成的行重新生成该组字段
+PROMPT_VERSIONS = {"title": 1, "tags": 1, "description": 1}
+
+_TITLE_RULES = """Step 1: Generate title_chinese (CORE VERSION)
 - Extract the core role name from original_title; be short, professional, accurate.
 - Remove noise words:
   - remote/location words: 远程 / remote / WFH / work from home / 居家办公 / 在家办公 / 全员远程 / 远程办公
@@ -100,11 +121,9 @@ Step 1: Generate title_chinese (CORE VERSION)
 Step 2: Generate title_english (TRANSLATION OF title_chinese)
 - Translate title_chinese to clear, professional English
 - Keep technical terms as-is (e.g., Java, React, C++, Python)
-- Maintain the same meaning and tone as title_chinese
-</title>
+- Maintain the same meaning and tone as title_chinese"""
 
-<tags>
-Step 1: Generate tags_chinese (CORE VERSION)
+_TAGS_RULES = """Step 1: Generate tags_chinese (CORE VERSION)
 - Extract 5-7 tags from the description following the order and rules below
 - If an optional category (like industry) is unclear, DO NOT output it; instead, fill with other high-signal info so the total still stays 5-7
 
@@ -145,11 +164,9 @@ Step 2: Generate tags_english (TRANSLATION OF tags_chinese)
   - "小红书运营" → "Xiaohongshu Operations"
   - "小程序前端开发" → "Mini Program Frontend Development"
   - "电商行业" → "E-commerce Industry"
-  - "React+TypeScript" → "React+TypeScript" (keep as-is)
-</tags>
+  - "React+TypeScript" → "React+TypeScript" (keep as-is)"""
 
-<description>
-Step 1: Generate description_chinese (CORE VERSION)
+_DESCRIPTION_RULES = """Step 1: Generate description_chinese (CORE VERSION)
 - Process the original description to create a clean Chinese version:
   1. If original is mostly Chinese with some English terms (Java/React/Amazon), keep those terms; only translate the English sentences to Chinese.
 2. If bilingual (roughly 50/50), translate/merge into cohesive Chinese, preserving original punctuation/format/tone as much as possible.
@@ -169,7 +186,43 @@ Step 2: Generate description_english (TRANSLATION OF description_chinese)
 - Keep technical terms as-is (e.g., Java, React, Python, AWS)
 - Maintain the same tone and meaning as description_chinese
 - Do not omit any details
-- The structure of description_english should mirror description_chinese exactly
+- The structure of description_english should mirror description_chinese exactly"""
+
+_GROUP_RULES = {"title": _TITLE_RULES, "tags": _TAGS_RULES, "description": _DESCRIPTION_RULES}
+
+
+def build_job_prompt(original_title: str, description: str) -> str:
+    return f"""
+<task>
+Given <original_title> and <description>, generate the Chinese versions first, then translate them to English.
+
+Workflow:
+1. Generate title_chinese (core version) → then translate to title_english
+2. Generate tags_chinese (core version) → then translate to tags_english (one-to-one correspondence)
+3. Generate description_chinese (core version) → then translate to description_english (preserve format structure)
+
+CRITICAL REQUIREMENT: You MUST return ONLY valid JSON format. No markdown, no code blocks, no explanations, no additional text before or after the JSON.
+</task>
+
+<input>
+<original_title>{original_title}</original_title>
+<description>
+{description}
+</description>
+</input>
+
+<rules>
+
+<title>
+{_TITLE_RULES}
+</title>
+
+<tags>
+{_TAGS_RULES}
+</tags>
+
+<description>
+{_DESCRIPTION_RULES}
 </description>
 
 <output_format>
@@ -198,35 +251,127 @@ Example of correct output:
 
 </rules>
 """
+
+
+def build_completion_prompt(original_title: str, description: str, partial: Dict[str, Any], missing: List[str]) -> str:
+    return build_job_prompt(original_title, description) + f"""
+<completion>
+A previous answer was cut off. These fields are already complete and MUST NOT be generated again:
+{json.dumps(partial, ensure_ascii=False, indent=2)}
+
+Generate ONLY the missing fields, following the same rules and staying consistent with the fields above: {", ".join(missing)}
+Return ONLY a JSON object with exactly these keys.
+</completion>
+"""
+
+
+def build_group_prompt(original_title: str, description: str, groups: List[str], context: Dict[str, Any]) -> str:
+    """只重新生成 groups 中字段组的精简 prompt，只带这些组的规则；其余字段作为上下文保持不变。"""
+    fields = [f for g in groups for f in FIELD_GROUPS[g]]
+    rules = "\n\n".join(f"<{g}>\n{_GROUP_RULES[g]}\n</{g}>" for g in groups)
+    return f"""
+<task>
+Given <original_title> and <description>, regenerate ONLY these fields: {", ".join(fields)}.
+Generate the Chinese version first, then translate it to English.
+These fields are already final and MUST stay unchanged; keep the new fields consistent with them:
+{json.dumps(context, ensure_ascii=False, indent=2)}
+
+CRITICAL REQUIREMENT: You MUST return ONLY valid JSON format. No markdown, no code blocks, no explanations, no additional text before or after the JSON.
+</task>
+
+<input>
+<original_title>{original_title}</original_title>
+<description>
+{description}
+</description>
+</input>
+
+<rules>
+
+{rules}
+
+<output_format>
+Return ONLY a JSON object with exactly these keys: {", ".join(fields)}
+</output_format>
+
+</rules>
+"""
+
+
+def get_optimized_job_info(original_title: str, description: str, groups: Optional[List[str]] = None,
+                           context: Optional[Dict[str, Any]] = None) -> Dict:
+    """
+    groups 为空时生成全部字段；否则只用精简 prompt 重新生成这些字段组，context 为保持不变的其余字段。
+    """
+    fields = [f for g in groups for f in FIELD_GROUPS[g]] if groups else None
+    if groups:
+        prompt = build_group_prompt(original_title, description, groups, context or {})
+        schema = job_info_schema(fields=fields)
+    else:
+        prompt = build_job_prompt(original_title, description)
+        # Wellfound jobs are all remote, so the schema has no is_remote switch
+        schema = job_info_schema(remote_check=False)
+    timeout = RETRY_POLICY.timeout_for(estimate_tokens(prompt), 2 * estimate_tokens(description) + ENRICH_OUTPUT_OVERHEAD)
+    backoff = RETRY_POLICY.backoff()
     
     last_error = None
     
-    # Simple model loop
+    # Simple model loop; a 429 retries the same model with the next key that is not cooling down
     for model_name in MODEL_LIST:
-        try:
-            current_model = genai.GenerativeModel(model_name)
-            response = current_model.generate_content(prompt)
-            content = _strip_code_fences(getattr(response, "text", "") or "")
-            
-            if not content:
-                continue
-            
+        api_key = None
+        for _ in range(max(len(get_credential_pool().keys), 1)):
             try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                extracted = extract_json_from_text(content)
-                if extracted:
-                    return extracted
-        except Exception as e:
-            last_error = e
-            # Check for location error
-            error_msg = str(e)
-            if "User location is not supported" in error_msg or "400" in error_msg and "location" in error_msg.lower():
-                print(f"    ❌ Critical Error: User location is not supported. Please check your VPN/Proxy.")
-                raise e # Re-raise to be caught by caller
-            
-            time.sleep(1) # simple retry backoff
-            continue
+                api_key = get_credential_pool().acquire(model_name)
+                content = _strip_code_fences(_generate_text(prompt, model_name, api_key, _json_generation_config(schema), timeout))
+                
+                if not content:
+                    break
+                
+                try:
+                    parsed = json.loads(content)
+                except json.JSONDecodeError:
+                    parsed = extract_json_from_text(content) or loads_partial(content)[0]
+                if fields is not None:
+                    if not missing_job_fields(parsed, fields):
+                        return {k: parsed[k] for k in fields}
+                    print(f"    ⚠️ Invalid JSON output (model: {model_name}), trying next model")
+                    break
+                validated = validate_job_info(parsed, remote_check=False)
+                if validated:
+                    return validated
+
+                # Truncated output: keep the complete fields and ask only for the missing ones
+                partial = {k: v for k, v in (parsed or {}).items() if k in JOB_FIELDS}
+                missing = missing_job_fields(partial)
+                if partial and missing:
+                    print(f"    🧩 Requesting only missing fields: {', '.join(missing)} (model: {model_name})")
+                    # 与首次请求走同一条路径：同样的超时、对冲和 ledger 记账
+                    completion_text = _generate_text(
+                        build_completion_prompt(original_title, description, partial, missing),
+                        model_name, api_key, _json_generation_config(job_info_schema(fields=missing)), timeout,
+                    )
+                    completion = extract_json_from_text(_strip_code_fences(completion_text)) or {}
+                    validated = validate_job_info({**partial, **completion}, remote_check=False)
+                    if validated:
+                        return validated
+                # Output is schema-constrained, so a bad payload is a model issue, not a reason to retry this model
+                print(f"    ⚠️ Invalid JSON output (model: {model_name}), trying next model")
+                break
+            except Exception as e:
+                last_error = e
+                # Check for location error
+                error_msg = str(e)
+                if "User location is not supported" in error_msg or "400" in error_msg and "location" in error_msg.lower():
+                    print(f"    ❌ Critical Error: User location is not supported. Please check your VPN/Proxy.")
+                    raise e # Re-raise to be caught by caller
+                if "429" in error_msg or "quota" in error_msg.lower():
+                    get_credential_pool().report_rate_limited(api_key, model_name, retry_after_hint(e))
+                    if get_credential_pool().available(model_name):
+                        print(f"    ⚠️ Rate limited on key {mask_key(api_key)}, switching key (model: {model_name})")
+                        continue
+
+                time.sleep(backoff.next(1)) # jittered retry backoff
+                break
             
     print(f"    ❌ Gemini failed after trying all models. Last Error: {last_error}")
     return {}
@@ -1,8 +1,8 @@
 import os
 import sys
-import csv
 import re
-from flask import Flask, request, jsonify
+from typing import Optional
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
 
 # 确保能导入项目根目录的 util
@@ -10,55 +10,54 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from util.handle_csv import save_to_csv, fieldnames, generate_job_id
+from util.handle_csv import fieldnames, generate_job_id
+from util.bridge_store import SiteStore
+from util.canonical import canonical_url
+from util.bridge_ingest import ingest_list
+from util.bridge_metrics import instrument, register_store
+from util.bridge_serving import busy_response, long_poll, serve
+from util.enrich_stream import open_stream
+from util.idempotency import ReplayCache, idempotent
+from util.write_behind import get_write_behind
 
-app = Flask(__name__)
-CORS(app)  # 允许浏览器插件跨域调用
+bp = Blueprint('wellfound', __name__)
 
 # Directory setup
 _BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 JOBS_META_FILE = os.path.join(_BASE_DIR, "csv_file", "jobs_meta.csv")
 JOBS_UPDATED_FILE = os.path.join(_BASE_DIR, "csv_file", "jobs_meta_updated.csv")
+# 流式 enrichment：BRIDGE_STREAM_ENRICH=1 时每条详情发布到这里，由 csv_processor.stream_enrich 消费
+ENRICH_STREAM_FILE = os.path.join(_BASE_DIR, "csv_file", "enrich_stream.db")
+# URL 变体 / _id -> canonical _id 的别名表
+ALIASES_FILE = os.path.join(_BASE_DIR, "csv_file", "aliases.db")
 
 # Ensure directories exist
 os.makedirs(os.path.dirname(JOBS_META_FILE), exist_ok=True)
 
-@app.route('/upload_list', methods=['POST'])
+def clean_url(u):
+    return canonical_url(u, 'wellfound')
+
+# meta 索引和待抓取队列，创建 app 时从 csv 载入一次（导入模块不读数据）；详情页按 worker_id 租给各浏览器实例
+_store: Optional[SiteStore] = None
+# /metrics（Prometheus 文本格式）、/health 和各路由耗时统计
+instrument(bp, 'wellfound', lambda: _store)
+# 插件超时重发的详情上传直接回放上次的结果
+_replay = ReplayCache(name='wellfound')
+
+@bp.route('/upload_list', methods=['POST'])
 def upload_list():
-    data = request.json
-    jobs = data.get('jobs', [])
-    if jobs:
-        save_to_csv(JOBS_META_FILE, jobs)
-        return jsonify({"success": True, "count": len(jobs)})
-    return jsonify({"success": False, "message": "No jobs provided"})
-
-@app.route('/upload_detail', methods=['POST'])
-def upload_detail():
-    item = request.json
-    if not item or 'source_url' not in item:
-        return jsonify({"success": False, "message": "Invalid detail data"})
-    
-    # 1. 极其严格地清洗当前 URL，用于匹配
-    def clean_url(u):
-        return u.split('?')[0].split('#')[0].strip().rstrip('/')
+    """JSON {"jobs": [...]} 或 NDJSON，可 gzip / zstd 压缩；按批解析，按内存索引去重"""
+    return ingest_list(request, _store)
 
+def _build_detail(item):
+    """把插件上传的一条详情与 meta 信息合并成完整字段"""
+    # 1. 极其严格地清洗当前 URL，用于匹配
     current_url = clean_url(item.get('source_url', ''))
-    job_id = generate_job_id(current_url)
+    # 别名表一次查到 canonical _id：同一岗位的各种 URL 变体共用列表页登记的 ID，没见过的按清洗后的 URL 生成
+    job_id = _store.identify(item.get('source_url', ''), default=generate_job_id(current_url))
     
     # 2. 从 jobs_meta.csv 中寻找原始信息 (Optional, mainly for backup)
-    meta_info = {}
-    if os.path.exists(JOBS_META_FILE):
-        try:
-            with open(JOBS_META_FILE, "r", encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # 同时对比 ID 和清洗后的 URL
-                    row_url = clean_url(row.get("source_url", ""))
-                    if row.get("_id") == job_id or row_url == current_url:
-                        meta_info = row
-                        break
-        except Exception as e:
-            print(f"读取 meta 文件出错: {e}")
+    meta_info = _store.meta_for(job_id)
 
     # 3. 构造完整字段，明确优先级
     full_item = {field: "" for field in fieldnames}
@@ -95,37 +94,107 @@ def upload_detail():
     for k in full_item:
         if isinstance(full_item[k], str):
             full_item[k] = full_item[k].strip()
-        
-    save_to_csv(JOBS_UPDATED_FILE, [full_item])
-    print(f"✅ Synced Detail: {full_item['title']} (ID: {job_id[:8]})")
+    return full_item
+
+@bp.route('/upload_detail', methods=['POST'])
+@idempotent(_replay)
+def upload_detail():
+    item = request.json
+    if not item or 'source_url' not in item:
+        return jsonify({"success": False, "message": "Invalid detail data"})
+
+    full_item = _build_detail(item)
+    if not _store.save_details([full_item], [item.get('source_url', '')], [item.get('worker_id')]):
+        return busy_response(_store.retry_after())
+    print(f"✅ Synced Detail: {full_item['title']} (ID: {full_item['_id'][:8]})")
     return jsonify({"success": True})
 
-@app.route('/get_next_url', methods=['POST'])
-def get_next_url():
-    """告诉插件下一个要抓取的详情页 URL"""
-    processed_ids = set()
-    if os.path.exists(JOBS_UPDATED_FILE):
+@bp.route('/upload_details', methods=['POST'])
+@idempotent(_replay)
+def upload_details():
+    """批量上传详情：所有条目一次写入，逐条返回结果"""
+    data = request.get_json(silent=True) or {}
+    items = data.get('details') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "No details provided"})
+    worker_id = data.get('worker_id') if isinstance(data, dict) else None
+
+    results, built = [], []
+    write_failed = False
+    for item in items:
+        if not isinstance(item, dict) or not item.get('source_url'):
+            results.append({"success": False, "message": "Invalid detail data"})
+            continue
         try:
-            with open(JOBS_UPDATED_FILE, "r", encoding="utf-8-sig") as f:
-                for row in csv.DictReader(f):
-                    if row.get("_id"):
-                        processed_ids.add(row["_id"])
-        except: pass
-    
-    if os.path.exists(JOBS_META_FILE):
+            full_item = _build_detail(item)
+        except Exception as e:
+            results.append({"source_url": item['source_url'], "success": False, "message": str(e)})
+            continue
+        results.append({"source_url": item['source_url'], "success": True, "id": full_item['_id']})
+        built.append((item, full_item, results[-1]))
+
+    if built:
         try:
-            with open(JOBS_META_FILE, "r", encoding="utf-8-sig") as f:
-                for row in csv.DictReader(f):
-                    job_id = row.get("_id")
-                    if job_id and job_id not in processed_ids:
-                        return jsonify({"url": row.get("source_url")})
-        except: pass
-    
-    return jsonify({"url": None})
+            accepted = _store.save_details([full_item for _, full_item, _ in built],
+                                           [item['source_url'] for item, _, _ in built],
+                                           [item.get('worker_id') or worker_id for item, _, _ in built])
+        except Exception as e:
+            for _, _, result in built:
+                result.update(success=False, message=f"Write failed: {e}")
+            built = []
+            write_failed = True
+        else:
+            if not accepted:
+                return busy_response(_store.retry_after())
+
+    failed = sum(not r["success"] for r in results)
+    print(f"✅ Synced Details: {len(built)} saved, {failed} failed")
+    # 写入异常返回 500：idempotent 不缓存，插件用同一个 Idempotency-Key 重试时会重新写入
+    return jsonify({"success": failed == 0, "saved": len(built), "failed": failed, "results": results}), \
+        (500 if write_failed else 200)
+
+@bp.route('/get_next_url', methods=['POST'])
+def get_next_url():
+    """告诉插件下一个要抓取的详情页 URL"""
+    worker_id = (request.get_json(silent=True) or {}).get('worker_id')
+    return jsonify({"url": _store.dispatch.lease(worker_id)})
+
+@bp.route('/next_task', methods=['POST'])
+def next_task():
+    """长轮询版 get_next_url：没有任务时挂起最多 wait 秒，upload_list 发现新 URL 时立即返回；drained 表示队列已清空"""
+    data = request.get_json(silent=True) or {}
+    with long_poll(data.get('wait')) as wait:
+        url = _store.dispatch.lease(data.get('worker_id'), timeout=wait)
+    return jsonify({"url": url, "drained": url is None and _store.dispatch.drained()})
+
+@bp.route('/dispatch_stats', methods=['GET'])
+def dispatch_stats():
+    """队列长度和各浏览器 worker 的租约、完成数、吞吐"""
+    return jsonify(_store.dispatch.stats())
+
+def default_store() -> SiteStore:
+    """真实 csv 上的 store；csv 追加由后台线程批量写入，请求不等磁盘"""
+    return SiteStore(JOBS_META_FILE, JOBS_UPDATED_FILE, clean_url, writer=get_write_behind(), name='wellfound',
+                     stream=open_stream(ENRICH_STREAM_FILE), aliases_file=ALIASES_FILE)
+
+def init_store(store: Optional[SiteStore] = None) -> SiteStore:
+    """载入路由使用的 store（默认 default_store()），并注册它的指标"""
+    global _store
+    _store = (store or default_store()).load()
+    register_store('wellfound', _store)
+    return _store
+
+def create_app(store: Optional[SiteStore] = None):
+    """store 为 None 时使用真实 csv；压测等场景传入指向临时目录的 SiteStore"""
+    init_store(store)
+    app = Flask(__name__)
+    CORS(app)  # 允许浏览器插件跨域调用
+    app.register_blueprint(bp)
+    return app
 
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("🚀 Wellfound Bridge Server Started")
     print("Address: http://127.0.0.1:5002 (or http://localhost:5002)")
     print("="*60 + "\n")
-    app.run(host='0.0.0.0', port=5002, debug=False)
+    serve(create_app(), port=5002)
@@ -1,4 +1,5 @@
 import csv
+import hashlib
 import os
 import sys
 import time
@@ -14,39 +15,61 @@ if project_root not in sys.path:
 
 from util.handle_csv import fieldnames, generate_job_id
 from util.type import classify_job_type
-from gemini_processor import get_optimized_job_info
+from util.estimate import DEFAULT_RPM, DEFAULT_TPM, enrich_requests, translate_requests, estimate_run, print_estimate
+from util.credentials import get_credential_pool
+from util.quota_ledger import get_quota_ledger
+from util.batch_prediction import DEFAULT_POLL_INTERVAL, GeminiBatchBackend, batch_request, finish_batch, run_batch
+from util.gemini_schema import FIELD_GROUPS, JOB_TAG_FIELDS, job_info_schema, missing_job_fields, validate_job_info
+from util.prompt_versions import PromptVersionStore
+from util.tolerant_json import loads_tolerant
+from util.enrich_stream import EnrichStream
+from util.near_dup import NearDupIndex, Tombstones, removed_ids, write_report
+from util.work_queue import WorkQueue, DONE, DEAD, PROCESSED, SKIPPED, FAILED, EXPIRED, ABORTED
+from gemini_processor import MODEL_LIST, PROMPT_VERSIONS, get_optimized_job_info, build_job_prompt, build_translate_prompt
 from utils import is_valid_experience, is_valid_job_description, convert_salary_to_english
 
 _ZHILIAN_DIR = os.path.dirname(os.path.abspath(__file__))
 INPUT_FILE = os.path.join(_ZHILIAN_DIR, "csv_file", "jobs_meta_updated.csv")
 OUTPUT_FILE = os.path.join(_ZHILIAN_DIR, "csv_file", "jobs_gemini_edited.csv")
 FINAL_OUTPUT_FILE = os.path.join(_ZHILIAN_DIR, "csv_file", "jobs_final.csv")
+QUEUE_FILE = os.path.join(_ZHILIAN_DIR, "csv_file", "work_queue.db")
+BATCH_DIR = os.path.join(_ZHILIAN_DIR, "csv_file", "batch")
+VERSIONS_FILE = os.path.join(_ZHILIAN_DIR, "csv_file", "prompt_versions.db")
+NEAR_DUP_REPORT_FILE = os.path.join(_ZHILIAN_DIR, "csv_file", "near_duplicates.csv")
+# 近似去重删掉的 _id，_merge_jobs 不再从 jobs_meta_updated 加回
+TOMBSTONE_FILE = os.path.join(_ZHILIAN_DIR, "csv_file", "near_duplicates.db")
+STREAM_FILE = os.path.join(_ZHILIAN_DIR, "csv_file", "enrich_stream.db")
+QUEUE_WORKER = "process_csv"
+# 每个 key 每天的 Gemini 请求上限，实际用量记在 util.quota_ledger
 DAILY_LIMIT = 1000
 DELAY_BETWEEN_JOBS = 2
+# 流式模式下没有新事件时的轮询间隔（秒）
+STREAM_POLL_INTERVAL = 5
+MAX_AGE_DAYS = None
 
 
-def _load_processed_status() -> Tuple[set, int, Optional[str]]:
-    processed_ids = set()
-    today_count = 0
-    start_from_id = None
-    
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                job_id = row.get('_id', '')
-                title_chinese = row.get('title_chinese', '').strip()
-                is_remote = row.get('is_remote', '').strip()
-                
-                if job_id:
-                    if title_chinese or is_remote == '0':
-                        processed_ids.add(job_id)
-                        if title_chinese:
-                            today_count += 1
-                    elif start_from_id is None:
-                        start_from_id = job_id
-    
-    return processed_ids, today_count, start_from_id
+_versions: Optional[PromptVersionStore] = None
+
+
+def _needs_processing(row: Dict) -> bool:
+    if row.get('is_remote') == '0':
+        return False
+    if row.get('title_chinese') and row.get('description_chinese'):
+        return False
+    return True
+
+
+def _has_keys() -> bool:
+    """没有配置 key 时 ledger 的剩余额度也是 0，单独提示，不要误报成当日额度已用完。"""
+    if get_credential_pool().keys:
+        return True
+    print("❌ No Gemini API key configured (set GEMINI_API_KEYS or GEMINI_API_KEY in .env). Exiting.")
+    return False
+
+
+def _remaining_capacity() -> int:
+    """今天所有 key 还能发出的 Gemini 请求数（按配额时区的日历日）。"""
+    return get_quota_ledger().remaining_requests(DAILY_LIMIT, get_credential_pool().keys)
 
 
 def _load_output_file() -> Tuple[Dict[str, Dict], List[Dict]]:
@@ -86,7 +109,12 @@ def _update_output_file(job_id: str, updated_row: Dict, fieldnames_list: List[st
         writer.writerows(all_rows)
 
 
-def remove_duplicate_jobs(option: int = 2):
+def remove_duplicate_jobs(option: int = 2, near_threshold: Optional[float] = None):
+    """
+    option 1 清理 jobs_meta_updated，否则清理 jobs_gemini_edited。
+    near_threshold（0-1 的 Jaccard 阈值）给定时，再用 MinHash-LSH 去掉只改了几行的重发岗位，
+    合并掉的簇写到 NEAR_DUP_REPORT_FILE，删掉的 _id 记入 TOMBSTONE_FILE。
+    """
     if option == 1:
         csv_file = INPUT_FILE
     else:
@@ -112,12 +140,15 @@ def remove_duplicate_jobs(option: int = 2):
     print(f"   Total jobs before cleaning: {len(jobs)}")
 
     seen_title_team = set()
+    # 只存描述的摘要，不在内存里保留完整字符串
     seen_descriptions = set()
+    near_index = NearDupIndex(near_threshold) if near_threshold else None
     cleaned_jobs = []
     duplicates_removed = 0
+    near_removed = []
     invalid_removed = 0
     
-    for job in jobs:
+    for i, job in enumerate(jobs):
         title = job.get('title', '').strip()
         team = job.get('team', '').strip()
         description = job.get('description', '').strip()
@@ -131,20 +162,38 @@ def remove_duplicate_jobs(option: int = 2):
         if title and team and title_team_key in seen_title_team:
             is_duplicate = True
         
-        if description and description in seen_descriptions:
+        description_key = hashlib.sha1(description.encode('utf-8')).digest() if description else None
+        if description_key and description_key in seen_descriptions:
             is_duplicate = True
-        
+
+        if not is_duplicate and near_index is not None:
+            match = near_index.add(i, f"{title}\n{description}")
+            if match is not None:
+                is_duplicate = True
+                near_removed.append((job.get('_id', ''), jobs[match[0]].get('_id', ''), match[1]))
+
         if not is_duplicate:
             if title and team:
                 seen_title_team.add(title_team_key)
-            if description:
-                seen_descriptions.add(description)
+            if description_key:
+                seen_descriptions.add(description_key)
             cleaned_jobs.append(job)
         else:
             duplicates_removed += 1
     
     print(f"   Jobs after cleaning: {len(cleaned_jobs)}")
     print(f"   Duplicates removed: {duplicates_removed}")
+    if near_index is not None:
+        clusters = near_index.merged_clusters()
+        print(f"   Near-duplicates removed (Jaccard >= {near_threshold}): {len(near_removed)} in {len(clusters)} clusters")
+        if clusters:
+            write_report(NEAR_DUP_REPORT_FILE, clusters, dict(enumerate(jobs)))
+            print(f"   Near-duplicate report: {NEAR_DUP_REPORT_FILE}")
+            tombstones = Tombstones(TOMBSTONE_FILE)
+            try:
+                tombstones.add_many(near_removed)
+            finally:
+                tombstones.close()
     print(f"   Invalid jobs removed: {invalid_removed}")
     with open(csv_file, 'w', newline='', encoding='utf-8-sig') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
@@ -154,11 +203,18 @@ def remove_duplicate_jobs(option: int = 2):
     print(f"\n✅ Cleaning completed. Saved {len(cleaned_jobs)} jobs to {csv_file}")
 
 
-def process_csv():
-    print(f"\n{'='*80}")
-    print(f"智联招聘 Phase 1: Merging and Sorting")
-    print(f"{'='*80}\n")
+def _accept_new_row(row: Dict) -> bool:
+    """新详情行并入 jobs_gemini_edited 前的检查，通过时归一化并补全字段。"""
+    if not row.get('description'):
+        return False
+    # 在合并新数据时也进行归一化
+    row['experience'] = is_valid_experience(row.get('experience', ''))
+    for field in fieldnames:
+        if field not in row: row[field] = ''
+    return True
+
 
+def _merge_jobs(write: bool = True) -> Tuple[Dict[str, Dict], List[Dict], List[str]]:
     existing_jobs = {}
     if os.path.exists(OUTPUT_FILE):
         try:
@@ -175,6 +231,8 @@ def process_csv():
             print(f"⚠️ Error loading existing output file: {e}")
 
     new_added_count = 0
+    removed = removed_ids(TOMBSTONE_FILE)
+    new_ids = []
     if os.path.exists(INPUT_FILE):
         try:
             with open(INPUT_FILE, 'r', encoding='utf-8-sig') as f:
@@ -188,16 +246,9 @@ def process_csv():
                             row['_id'] = jid
                         else: continue
                     
-                    if jid not in existing_jobs:
-                        if not row.get('description'): continue
-                        
-                        # 在合并新数据时也进行归一化
-                        row['experience'] = is_valid_experience(row.get('experience', ''))
-                        
-                        for field in fieldnames:
-                            if field not in row: row[field] = ''
-                        
+                    if jid not in existing_jobs and jid not in removed and _accept_new_row(row):
                         existing_jobs[jid] = row
+                        new_ids.append(jid)
                         new_added_count += 1
             print(f"📥 Added {new_added_count} new jobs from {os.path.basename(INPUT_FILE)}")
         except Exception as e:
@@ -216,68 +267,394 @@ def process_csv():
     
     all_jobs_list.sort(key=get_sort_key, reverse=True)
 
+    if write:
+        with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8-sig') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(all_jobs_list)
+        print(f"✅ Merged and sorted {len(all_jobs_list)} jobs into {os.path.basename(OUTPUT_FILE)}")
+
+    return existing_jobs, all_jobs_list, new_ids
+
+
+def _should_enqueue(row: Dict, now: datetime) -> bool:
+    """与 process_job 的跳过条件一致：会被跳过的行不入队，对账时也不会反复重置它们。"""
+    return _needs_processing(row) and is_valid_job_description(row.get('description', ''))[0]
+
+
+def _open_queue(all_jobs_list: List[Dict], retry_dead: bool = False) -> WorkQueue:
+    # Phase 1 已读过所有行，直接与队列对账：新行入队，csv 中被清空重跑的 done 行重置为 pending
+    queue = WorkQueue(QUEUE_FILE)
+    now = datetime.now()
+    result = queue.reconcile(((j['_id'], j.get('createdAt', '')) for j in all_jobs_list if _should_enqueue(j, now)),
+                             retry_dead=retry_dead)
+    reclaimed = queue.reclaim(QUEUE_WORKER)
+    counts = queue.counts()
+    print(f"📬 Queue: {result['enqueued']} enqueued, {result['reset']} reset for re-processing, {reclaimed} reclaimed, "
+          f"{counts['pending']} pending, {counts['dead']} dead-lettered")
+    if result['dead']:
+        print(f"   ☠️ {result['dead']} dead-lettered rows still need processing; use process_csv(retry_dead=True) or enrich_all.py --retry-dead to retry them")
+    return queue
+
+
+def prepare_run(retry_dead: bool = False) -> Tuple[Dict[str, Dict], WorkQueue]:
+    print(f"\n{'='*80}")
+    print(f"智联招聘 Phase 1: Merging and Sorting")
+    print(f"{'='*80}\n")
+
+    existing_jobs, all_jobs_list, _ = _merge_jobs()
+    return existing_jobs, _open_queue(all_jobs_list, retry_dead)
+
+
+def _version_store() -> PromptVersionStore:
+    global _versions
+    if _versions is None:
+        _versions = PromptVersionStore(VERSIONS_FILE)
+    return _versions
+
+
+def _row_context(row: Dict, groups: List[str]) -> Dict:
+    """不需要重新生成的字段组的当前值，作为精简 prompt 的上下文。"""
+    context = {}
+    for group, group_fields in FIELD_GROUPS.items():
+        if group in groups:
+            continue
+        for field in group_fields:
+            if field in JOB_TAG_FIELDS:
+                value = row.get(field.replace('tags_', 'summary_'), '')
+                context[field] = [t for t in value.split(',') if t]
+            else:
+                context[field] = row.get(field, '')
+    return context
+
+
+def _apply_groups(row: Dict, result: Dict):
+    """只写入重新生成的字段组，其余字段不动。"""
+    for field, value in result.items():
+        if field in JOB_TAG_FIELDS:
+            row[field.replace('tags_', 'summary_')] = ",".join(value)
+        else:
+            row[field] = value
+
+
+def _apply_result(row: Dict, result: Dict):
+    """把 get_optimized_job_info 的结果写入行；空结果表示非远程。"""
+    if not result:
+        row['is_remote'] = '0'
+        return
+    row['title_chinese'] = result.get('title_chinese', '')
+    row['title_english'] = result.get('title_english', '')
+    row['summary_chinese'] = ",".join(result.get('tags_chinese', []))
+    row['summary_english'] = ",".join(result.get('tags_english', []))
+    row['description_chinese'] = result.get('description_chinese', '')
+    row['description_english'] = result.get('description_english', '')
+    row['is_remote'] = '1'
+    _version_store().record(row['_id'], PROMPT_VERSIONS)
+
+
+def process_job(queue: WorkQueue, job_id: str, attempt: int, row: Optional[Dict]) -> str:
+    if row is None or not _needs_processing(row):
+        queue.ack(job_id)
+        return SKIPPED
+
+    description = row.get('description', '')
+    is_valid, _ = is_valid_job_description(description)
+    if not is_valid:
+        queue.ack(job_id)
+        return SKIPPED
+
+    print(f"Processing: {row.get('title', 'N/A')[:50]} (attempt {attempt})")
+    try:
+        result = get_optimized_job_info(row.get('title', ''), row.get('description', ''))
+    except Exception as e:
+        print(f"    ⚠️ Warning: Gemini call failed: {e}")
+        result = None
+
+    if result is None:
+        if queue.fail(job_id, "Gemini returned no result"):
+            print(f"    ☠️ Dead-lettered after {attempt} attempts")
+        return FAILED
+
+    if not result:
+        _apply_result(row, result)
+        _update_output_file(job_id, row, fieldnames)
+        queue.ack(job_id)
+        return PROCESSED
+
+    _apply_result(row, result)
+
+    _update_output_file(job_id, row, fieldnames)
+    queue.ack(job_id)
+    return PROCESSED
+
+
+def estimate_run_cost(concurrency: int = 1, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM,
+                      translate_batch_size: int = 0):
+    """process_csv 的 dry-run：只读取待处理行，本地估算 token、请求数和耗时，不调用 Gemini。"""
+    print(f"\n{'='*80}")
+    print(f"Dry run: estimating Gemini cost")
+    print(f"{'='*80}\n")
+
+    _, all_jobs_list, _ = _merge_jobs(write=False)
+    remaining = _remaining_capacity()
+
+    pending = [
+        row for row in all_jobs_list
+        if _needs_processing(row) and is_valid_job_description(row.get('description', ''))[0]
+    ]
+
+    print(f"   Pending rows: {len(pending)}, remaining daily capacity: {remaining}\n")
+
+    est = estimate_run(enrich_requests(pending, build_job_prompt), concurrency=concurrency, rpm=rpm, tpm=tpm,
+                       delay_between_jobs=DELAY_BETWEEN_JOBS, daily_request_limit=remaining)
+    print_estimate(f"get_optimized_job_info (concurrency {concurrency})", est)
+
+    if translate_batch_size:
+        to_translate = [
+            row for row in all_jobs_list
+            if row.get('description_chinese') and not row.get('description_english')
+        ]
+        est = estimate_run(translate_requests(to_translate, build_translate_prompt, translate_batch_size),
+                           concurrency=concurrency, rpm=rpm, tpm=tpm, daily_request_limit=remaining)
+        print_estimate(f"translate_chinese_to_english ({len(to_translate)} rows, batch size {translate_batch_size})", est)
+
+
+def batch_backfill(backend=None, include_enriched: bool = False, poll_interval: float = DEFAULT_POLL_INTERVAL):
+    """
+    批量模式：把待处理行写成 JSONL，作为异步 batch job 提交，轮询到完成后按 _id 一次性写回 jobs_gemini_edited。
+    include_enriched=True 时已处理过的远程岗位也重新生成（改 prompt 后回填历史数据）。
+    backend 默认为 Gemini Batch API，可传入 LocalBatchBackend 做离线演练。
+    """
+    print(f"\n{'='*80}")
+    print(f"智联招聘 Batch backfill with Gemini")
+    print(f"{'='*80}\n")
+
+    _, all_jobs_list, _ = _merge_jobs()
+    rows = [
+        row for row in all_jobs_list
+        if row.get('is_remote') != '0' and (include_enriched or _needs_processing(row))
+        and is_valid_job_description(row.get('description', ''))[0]
+    ]
+    model = MODEL_LIST[0]
+    if backend is None:
+        backend = GeminiBatchBackend(get_credential_pool().acquire(model))
+    generation_config = {"response_mime_type": "application/json", "response_schema": job_info_schema()}
+
+    def build_requests():
+        for row in rows:
+            prompt = build_job_prompt(row.get('title', ''), row.get('description', ''))
+            yield batch_request(row['_id'], prompt, generation_config)
+
+    status, results = run_batch(backend, BATCH_DIR, model, build_requests, poll_interval)
+    if not results:
+        finish_batch(BATCH_DIR)
+        return
+
+    # 批量任务可能跑了一整夜，重新读取输出文件再回填，避免覆盖期间实时处理的结果
+    job_id_to_row, all_rows = _load_output_file()
+    applied_ids, failed = [], 0
+    for job_id, text in results.items():
+        row = job_id_to_row.get(job_id)
+        result = validate_job_info(loads_tolerant(text) if text else None)
+        if row is None or result is None:
+            failed += 1
+            continue
+        _apply_result(row, result)
+        applied_ids.append(job_id)
+
     with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8-sig') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
-        writer.writerows(all_jobs_list)
-    print(f"✅ Merged and sorted {len(all_jobs_list)} jobs into {os.path.basename(OUTPUT_FILE)}")
+        writer.writerows(all_rows)
 
+    # 回填的行在队列中标为 done，process_csv 不会再租出它们
+    queue = WorkQueue(QUEUE_FILE)
+    try:
+        settled = queue.ack_many(applied_ids)
+    finally:
+        queue.close()
+    # csv 和队列都已更新，才丢弃任务记录
+    finish_batch(BATCH_DIR)
+    print(f"\n✅ Batch ingested: {len(applied_ids)} rows updated, {failed} failed or missing (left for process_csv), {settled} settled in the work queue")
+
+
+def reenrich_stale(limit: Optional[int] = None):
+    """
+    选择性重新生成：只为 prompt 版本落后于 gemini_processor.PROMPT_VERSIONS 的字段组请求模型，
+    使用只含这些组规则的精简 prompt，其余字段保持不变。
+    """
     print(f"\n{'='*80}")
-    print(f"智联招聘 Phase 2: Processing with Gemini")
+    print(f"智联招聘 Re-enrich stale field groups")
     print(f"{'='*80}\n")
 
-    processed_ids, today_count, _ = _load_processed_status()
-    if today_count >= DAILY_LIMIT:
-        print(f"⚠️ Daily limit ({DAILY_LIMIT}) reached. Exiting.")
+    if not _has_keys():
         return
+    _, all_rows = _load_output_file()
+    store = _version_store()
+    todo = []
+    for row in all_rows:
+        if not row.get('_id') or row.get('is_remote') == '0' or not row.get('title_chinese'):
+            continue
+        stale = store.stale_groups(row['_id'], PROMPT_VERSIONS)
+        if stale:
+            todo.append((row, stale))
 
-    processed_today = 0
-    skipped = 0
-    today = datetime.now()
+    by_group = {g: sum(g in stale for _, stale in todo) for g in FIELD_GROUPS}
+    print(f"📋 {len(todo)} rows with stale field groups: " + ", ".join(f"{g}={n}" for g, n in by_group.items()))
 
-    for i, row in enumerate(all_jobs_list, 1):
-        if processed_today >= DAILY_LIMIT:
+    stats = {PROCESSED: 0, FAILED: 0}
+    for row, stale in todo[:limit]:
+        if _remaining_capacity() <= 0:
+            print(f"\n✅ Daily limit reached. Stopping.")
             break
-        
-        job_id = row.get('_id', '')
-        if row.get('is_remote') == '0':
-            skipped += 1
-            continue
-            
-        if row.get('title_chinese') and row.get('description_chinese'):
-            skipped += 1
-            continue
-            
-        description = row.get('description', '')
-        is_valid, _ = is_valid_job_description(description)
-        if not is_valid:
-            skipped += 1
-            continue
-
-        print(f"[{i}/{len(all_jobs_list)}] Processing: {row.get('title', 'N/A')[:50]}")
-        result = get_optimized_job_info(row.get('title', ''), row.get('description', ''))
-        
+        print(f"Re-enriching [{', '.join(stale)}]: {row.get('title', 'N/A')[:50]}")
+        try:
+            result = get_optimized_job_info(row.get('title', ''), row.get('description', ''),
+                                            groups=stale, context=_row_context(row, stale))
+        except Exception as e:
+            print(f"    ⚠️ Warning: Gemini call failed: {e}")
+            result = None
         if not result:
-            row['is_remote'] = '0'
-            _update_output_file(job_id, row, fieldnames)
-            processed_today += 1
+            stats[FAILED] += 1
             continue
 
-        row['title_chinese'] = result.get('title_chinese', '')
-        row['title_english'] = result.get('title_english', '')
-        row['summary_chinese'] = ",".join(result.get('tags_chinese', []))
-        row['summary_english'] = ",".join(result.get('tags_english', []))
-        row['description_chinese'] = result.get('description_chinese', '')
-        row['description_english'] = result.get('description_english', '')
-        row['is_remote'] = '1'
-        
-        _update_output_file(job_id, row, fieldnames)
-        processed_today += 1
+        _apply_groups(row, result)
+        _update_output_file(row['_id'], row, fieldnames)
+        # 只有字段全部返回的组才记为新版本，其余组下次仍会被选中
+        done = [g for g in stale if not missing_job_fields(result, FIELD_GROUPS[g])]
+        if done:
+            store.record(row['_id'], {g: PROMPT_VERSIONS[g] for g in done})
+        if len(done) < len(stale):
+            print(f"    ⚠️ Incomplete result, groups left stale: {', '.join(g for g in stale if g not in done)}")
+        stats[PROCESSED] += 1
+        time.sleep(DELAY_BETWEEN_JOBS)
+
+    print(f"\n✅ Re-enrichment done: {stats[PROCESSED]} updated, {stats[FAILED]} failed")
+
+
+def stream_enrich(poll_interval: float = STREAM_POLL_INTERVAL):
+    """
+    流式模式：server 以 BRIDGE_STREAM_ENRICH=1 启动时，每条接收的详情会发布到 enrich_stream.db。
+    这里持续消费：新行直接加入 work_queue 并处理，追加到 jobs_gemini_edited，不做 Phase 1 的全量合并和排序。
+    速率仍由 DELAY_BETWEEN_JOBS、凭证池的限流和每日 ledger 控制。Ctrl+C 退出。
+    """
+    print(f"\n{'='*80}")
+    print(f"智联招聘 Streaming enrichment (waiting for details from the bridge server)")
+    print(f"{'='*80}\n")
+
+    if not _has_keys():
+        return
+    job_id_to_row, _ = _load_output_file()
+    stream = EnrichStream(STREAM_FILE)
+    queue = WorkQueue(QUEUE_FILE)
+    queue.reclaim(QUEUE_WORKER)
+    stats = {PROCESSED: 0, SKIPPED: 0, FAILED: 0}
+    waiting_for_quota = False
+    # 新行只在内存和事件里：事件等任务 done / dead 后才 ack，中途退出时下次启动会重新读到这些行
+    unsettled: Dict[str, int] = {}
+    last_seq = 0
+
+    def settle(job_id: str):
+        if job_id in unsettled and queue.state(job_id) in (DONE, DEAD):
+            stream.ack([unsettled.pop(job_id)])
+
+    try:
+        while True:
+            events = stream.read(after=last_seq)
+            fresh, acked = [], []
+            for seq, row in events:
+                last_seq = seq
+                jid = row.get('_id')
+                # 已在输出文件中的行保留已有的 Gemini 结果
+                if jid and jid not in job_id_to_row and _accept_new_row(row):
+                    job_id_to_row[jid] = row
+                    fresh.append((jid, row.get('createdAt', '')))
+                    unsettled[jid] = seq
+                else:
+                    acked.append(seq)
+            # 上次被当作空行结束掉的任务（done）重新放回 pending
+            queue.reconcile(fresh)
+            stream.ack(acked)
+            for jid, _ in fresh:
+                settle(jid)
+            if fresh:
+                print(f"📥 {len(fresh)} new jobs from stream")
+
+            if _remaining_capacity() <= 0:
+                if not waiting_for_quota:
+                    print(f"⚠️ Daily limit reached, new jobs stay queued until quota resets")
+                    waiting_for_quota = True
+                time.sleep(poll_interval)
+                continue
+            waiting_for_quota = False
+
+            leased = queue.lease(QUEUE_WORKER)
+            if leased is None:
+                time.sleep(poll_interval)
+                continue
+            job_id, attempt = leased
+            outcome = process_job(queue, job_id, attempt, job_id_to_row.get(job_id))
+            settle(job_id)
+            if outcome == ABORTED:
+                break
+            if outcome == EXPIRED:
+                # process_job 已把过期的任务结束掉，继续取下一条
+                stats[SKIPPED] += 1
+                continue
+            stats[outcome] += 1
+            if outcome == PROCESSED:
+                time.sleep(DELAY_BETWEEN_JOBS)
+    except KeyboardInterrupt:
+        print("\n\nStopping stream...")
+    finally:
+        queue.close()
+        stream.close()
+    print(f"\n✅ Stream stopped: {stats[PROCESSED]} processed, {stats[SKIPPED]} skipped, {stats[FAILED]} failed")
+
+
+def process_csv(dry_run: bool = False, retry_dead: bool = False):
+    if dry_run:
+        estimate_run_cost()
+        return
+
+    if not _has_keys():
+        return
+
+    existing_jobs, queue = prepare_run(retry_dead)
+
+    print(f"\n{'='*80}")
+    print(f"智联招聘 Phase 2: Processing with Gemini")
+    print(f"{'='*80}\n")
+
+    remaining = _remaining_capacity()
+    if remaining <= 0:
+        print(f"⚠️ Daily limit ({DAILY_LIMIT} requests per key) reached. Exiting.")
+        queue.close()
+        return
+
+    print(f"📊 Remaining capacity today: {remaining} requests")
+
+    stats = {PROCESSED: 0, SKIPPED: 0, FAILED: 0}
+
+    while True:
+        # 每个任务开始前都查 ledger：补全、重试和其他站点的请求同样计入
+        if _remaining_capacity() <= 0:
+            print(f"\n✅ Daily limit reached. Stopping.")
+            break
+        leased = queue.lease(QUEUE_WORKER)
+        if leased is None:
+            break
+        job_id, attempt = leased
+        outcome = process_job(queue, job_id, attempt, existing_jobs.get(job_id))
+        if outcome in (EXPIRED, ABORTED):
+            break
+        stats[outcome] += 1
 
-        if processed_today < DAILY_LIMIT:
+        if outcome == PROCESSED:
             time.sleep(DELAY_BETWEEN_JOBS)
 
-    print(f"\n✅ All done: {processed_today} processed today, {skipped} skipped")
+    queue.close()
+    print(f"\n✅ All done: {stats[PROCESSED]} processed today, {stats[SKIPPED]} skipped, {stats[FAILED]} failed")
 
 
 def generate_additional_fields():
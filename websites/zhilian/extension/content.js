@@ -264,19 +264,36 @@ async function runAutoPilot() {
         updateStatus(`⏱️ ${ (wait/1000).toFixed(1) }s 后跳下一个...`);
         await new Promise(r => setTimeout(r, wait));
     }
-    updateStatus("🔍 索要任务...");
-    const task = await sendToServer('/get_next_url', {});
-    if (task.success && task.url) {
-        window.location.href = task.url;
-    } else {
-        updateStatus("🏁 任务已全部完成！");
-        chrome.storage.local.set({ isAutoPilot_zhilian: false });
+    updateStatus("🔍 等待任务...");
+    // 长轮询：后端在有新 URL 时立即返回，最多挂起 25s；drained 表示队列已清空
+    while (true) {
+        const task = await sendToServer('/next_task', { wait: 25 });
+        if (task.success && task.url) {
+            window.location.href = task.url;
+            return;
+        }
+        if (!task.success || task.drained) break;
+        // 其他浏览器仍持有租约（到期后会回到队列），或后端长轮询名额已满，稍后再问
+        await new Promise(r => setTimeout(r, 2000));
     }
+    updateStatus("🏁 任务已全部完成！");
+    chrome.storage.local.set({ isAutoPilot_zhilian: false });
+}
+
+// 每个浏览器实例一个固定的 worker id，后端按它租用详情页 URL，多开浏览器时互不重复
+async function getWorkerId() {
+    const res = await chrome.storage.local.get(['workerId']);
+    if (res.workerId) return res.workerId;
+    const workerId = `worker-${crypto.randomUUID().slice(0, 8)}`;
+    await chrome.storage.local.set({ workerId });
+    return workerId;
 }
 
-async function sendToServer(endpoint, data) {
+async function sendToServer(endpoint, data, attempt = 0) {
     const server_url = `http://127.0.0.1:5001${endpoint}`;
     
+    const workerId = await getWorkerId();
+
     return new Promise((resolve) => {
         chrome.runtime.sendMessage({
             type: 'FETCH',
@@ -285,8 +302,9 @@ async function sendToServer(endpoint, data) {
                 options: {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(data)
-                }
+                    body: JSON.stringify({ ...data, worker_id: workerId })
+                },
+                compress: endpoint === '/upload_list'
             }
         }, (response) => {
             if (chrome.runtime.lastError) {
@@ -296,6 +314,14 @@ async function sendToServer(endpoint, data) {
                 return;
             }
 
+            // 后端写入队列已满（503）：按 retry_after 等待后重发，最多 5 次
+            if (response && response.status === 503 && attempt < 5) {
+                const wait = ((response.data && response.data.retry_after) || 2) * 1000;
+                updateStatus(`⏳ 后端写入繁忙，${(wait / 1000).toFixed(1)}s 后重试...`);
+                setTimeout(() => resolve(sendToServer(endpoint, data, attempt + 1)), wait);
+                return;
+            }
+
             if (response && response.success) {
                 console.log("✅ 通信成功:", response.data);
                 resolve({ ...response.data, success: true });
@@ -1,8 +1,8 @@
 import os
 import sys
-import csv
 import re
-from flask import Flask, request, jsonify
+from typing import Optional
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
 
 # 确保能导入项目根目录的 util
@@ -10,58 +10,50 @@ project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from util.handle_csv import save_to_csv, fieldnames, generate_job_id
+from util.handle_csv import fieldnames, generate_job_id
+from util.bridge_store import SiteStore
+from util.canonical import canonical_url
+from util.bridge_ingest import ingest_list
+from util.bridge_metrics import instrument, register_store
+from util.bridge_serving import busy_response, long_poll, serve
+from util.enrich_stream import open_stream
+from util.idempotency import ReplayCache, idempotent
+from util.write_behind import get_write_behind
+from utils import is_valid_experience, convert_salary_to_english
 
-app = Flask(__name__)
-CORS(app)  # 允许浏览器插件跨域调用
+bp = Blueprint('zhilian', __name__)
 
 ZHILIAN_DIR = os.path.dirname(os.path.abspath(__file__))
 JOBS_META_FILE = os.path.join(ZHILIAN_DIR, "csv_file", "jobs_meta.csv")
 JOBS_UPDATED_FILE = os.path.join(ZHILIAN_DIR, "csv_file", "jobs_meta_updated.csv")
+# 流式 enrichment：BRIDGE_STREAM_ENRICH=1 时每条详情发布到这里，由 csv_processor.stream_enrich 消费
+ENRICH_STREAM_FILE = os.path.join(ZHILIAN_DIR, "csv_file", "enrich_stream.db")
+# URL 变体 / _id -> canonical _id 的别名表
+ALIASES_FILE = os.path.join(ZHILIAN_DIR, "csv_file", "aliases.db")
 
-@app.route('/upload_list', methods=['POST'])
+def clean_url(u):
+    # 去掉协议头 (http/https)、查询参数、锚点、末尾斜杠，并转小写（规则见 util.canonical.SITE_RULES）
+    return canonical_url(u, 'zhilian')
+
+# meta 索引和待抓取队列，创建 app 时从 csv 载入一次（导入模块不读数据）；详情页按 worker_id 租给各浏览器实例
+_store: Optional[SiteStore] = None
+# /metrics（Prometheus 文本格式）、/health 和各路由耗时统计
+instrument(bp, 'zhilian', lambda: _store)
+# 插件超时重发的详情上传直接回放上次的结果
+_replay = ReplayCache(name='zhilian')
+
+@bp.route('/upload_list', methods=['POST'])
 def upload_list():
-    data = request.json
-    jobs = data.get('jobs', [])
-    if jobs:
-        save_to_csv(JOBS_META_FILE, jobs)
-        return jsonify({"success": True, "count": len(jobs)})
-    return jsonify({"success": False, "message": "No jobs provided"})
-
-@app.route('/upload_detail', methods=['POST'])
-def upload_detail():
-    item = request.json
-    if not item or 'source_url' not in item:
-        return jsonify({"success": False, "message": "Invalid detail data"})
-    
-    # 1. 极其严格地清洗当前 URL，用于匹配
-    def clean_url(u):
-        if not u: return ""
-        # 去掉协议头 (http/https)、查询参数、锚点、末尾斜杠，并转小写
-        u = u.replace('https://', '').replace('http://', '')
-        return u.split('?')[0].split('#')[0].strip().rstrip('/').lower()
+    """JSON {"jobs": [...]} 或 NDJSON，可 gzip / zstd 压缩；按批解析，按内存索引去重"""
+    return ingest_list(request, _store)
 
+def _build_detail(item):
+    """把插件上传的一条详情与 meta 信息合并成完整字段"""
+    # 1. 原始 URL，清洗规则由别名表按 util.canonical.SITE_RULES 统一处理
     current_url_raw = item.get('source_url', '')
-    current_url_cleaned = clean_url(current_url_raw)
-    
-    # 2. 从 jobs_meta.csv 中寻找原始信息，优先使用 meta 里的 ID
-    meta_info = {}
-    matched_job_id = None
-    if os.path.exists(JOBS_META_FILE):
-        try:
-            with open(JOBS_META_FILE, "r", encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    row_url_cleaned = clean_url(row.get("source_url", ""))
-                    if row_url_cleaned == current_url_cleaned:
-                        meta_info = row
-                        matched_job_id = row.get("_id")
-                        break
-        except Exception as e:
-            print(f"读取 meta 文件出错: {e}")
-
-    # 如果 meta 里没找到，再根据当前 URL 生成一个 ID
-    job_id = matched_job_id or generate_job_id(current_url_raw)
+    # 2. 别名表一次查到 canonical _id（与 jobs_meta.csv 里同一岗位的 ID 相同），没见过的按原始 URL 生成
+    job_id = _store.identify(current_url_raw, default=generate_job_id(current_url_raw))
+    meta_info = _store.meta_for(job_id)
     
     full_item = {field: "" for field in fieldnames}
     
@@ -85,7 +77,6 @@ def upload_detail():
     
     full_item['title'] = clean_title.strip()
     
-    from utils import is_valid_experience, convert_salary_to_english
     for field in ['team', 'salary', 'city']:
         full_item[field] = meta_info.get(field) or item.get(field) or ""
     
@@ -107,53 +98,119 @@ def upload_detail():
     for k in full_item:
         if isinstance(full_item[k], str):
             full_item[k] = full_item[k].strip()
-        
-    save_to_csv(JOBS_UPDATED_FILE, [full_item])
-    print(f"✅ 已同步详情: {full_item['title']} (ID: {job_id[:8]})")
+    return full_item
+
+@bp.route('/upload_detail', methods=['POST'])
+@idempotent(_replay)
+def upload_detail():
+    item = request.json
+    if not item or 'source_url' not in item:
+        return jsonify({"success": False, "message": "Invalid detail data"})
+
+    full_item = _build_detail(item)
+    if not _store.save_details([full_item], [item.get('source_url', '')], [item.get('worker_id')]):
+        return busy_response(_store.retry_after())
+    print(f"✅ 已同步详情: {full_item['title']} (ID: {full_item['_id'][:8]})")
     return jsonify({"success": True})
 
-@app.route('/get_next_url', methods=['POST'])
-def get_next_url():
-    """改进的任务获取逻辑：无视协议头、支持双重校验"""
-    def clean_url(u):
-        if not u: return ""
-        u = u.replace('https://', '').replace('http://', '')
-        return u.split('?')[0].split('#')[0].strip().rstrip('/').lower()
-
-    processed_keys = set()
-    if os.path.exists(JOBS_UPDATED_FILE):
+@bp.route('/upload_details', methods=['POST'])
+@idempotent(_replay)
+def upload_details():
+    """批量上传详情：所有条目一次写入，逐条返回结果"""
+    data = request.get_json(silent=True) or {}
+    items = data.get('details') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "No details provided"})
+    worker_id = data.get('worker_id') if isinstance(data, dict) else None
+
+    results, built = [], []
+    write_failed = False
+    for item in items:
+        if not isinstance(item, dict) or not item.get('source_url'):
+            results.append({"success": False, "message": "Invalid detail data"})
+            continue
         try:
-            with open(JOBS_UPDATED_FILE, "r", encoding="utf-8-sig") as f:
-                for row in csv.DictReader(f):
-                    jid = row.get("_id")
-                    url = clean_url(row.get("source_url"))
-                    if jid: processed_keys.add(jid)
-                    if url: processed_keys.add(url)
+            full_item = _build_detail(item)
         except Exception as e:
-            print(f"读取已处理文件出错: {e}")
-    
-    if os.path.exists(JOBS_META_FILE):
+            results.append({"source_url": item['source_url'], "success": False, "message": str(e)})
+            continue
+        results.append({"source_url": item['source_url'], "success": True, "id": full_item['_id']})
+        built.append((item, full_item, results[-1]))
+
+    if built:
         try:
-            with open(JOBS_META_FILE, "r", encoding="utf-8-sig") as f:
-                for row in csv.DictReader(f):
-                    job_id = row.get("_id")
-                    raw_url = row.get("source_url")
-                    url = clean_url(raw_url)
-                    
-                    if job_id in processed_keys or url in processed_keys:
-                        continue
-                    
-                    print(f"🎯 智联：派发下一个任务 -> {raw_url}")
-                    return jsonify({"success": True, "url": raw_url})
+            accepted = _store.save_details([full_item for _, full_item, _ in built],
+                                           [item['source_url'] for item, _, _ in built],
+                                           [item.get('worker_id') or worker_id for item, _, _ in built])
         except Exception as e:
-            print(f"读取 meta 文件出错: {e}")
-    
+            for _, _, result in built:
+                result.update(success=False, message=f"写入失败: {e}")
+            built = []
+            write_failed = True
+        else:
+            if not accepted:
+                return busy_response(_store.retry_after())
+
+    failed = sum(not r["success"] for r in results)
+    print(f"✅ 已批量同步详情: {len(built)} 条，失败 {failed} 条")
+    # 写入异常返回 500：idempotent 不缓存，插件用同一个 Idempotency-Key 重试时会重新写入
+    return jsonify({"success": failed == 0, "saved": len(built), "failed": failed, "results": results}), \
+        (500 if write_failed else 200)
+
+@bp.route('/get_next_url', methods=['POST'])
+def get_next_url():
+    """改进的任务获取逻辑：无视协议头、支持双重校验（_id 或规范化 URL）"""
+    worker_id = (request.get_json(silent=True) or {}).get('worker_id')
+    url = _store.dispatch.lease(worker_id)
+    if url:
+        print(f"🎯 智联：派发下一个任务 -> {url} ({worker_id or 'default'})")
+        return jsonify({"success": True, "url": url})
     print("🏁 智联招聘：所有详情页已同步完成")
     return jsonify({"success": True, "url": None})
 
+@bp.route('/next_task', methods=['POST'])
+def next_task():
+    """长轮询版 get_next_url：没有任务时挂起最多 wait 秒，upload_list 发现新 URL 时立即返回；drained 表示队列已清空"""
+    data = request.get_json(silent=True) or {}
+    worker_id = data.get('worker_id')
+    with long_poll(data.get('wait')) as wait:
+        url = _store.dispatch.lease(worker_id, timeout=wait)
+    if url:
+        print(f"🎯 智联：派发下一个任务 -> {url} ({worker_id or 'default'})")
+        return jsonify({"success": True, "url": url, "drained": False})
+    drained = _store.dispatch.drained()
+    if drained:
+        print("🏁 智联招聘：所有详情页已同步完成")
+    return jsonify({"success": True, "url": None, "drained": drained})
+
+@bp.route('/dispatch_stats', methods=['GET'])
+def dispatch_stats():
+    """队列长度和各浏览器 worker 的租约、完成数、吞吐"""
+    return jsonify(_store.dispatch.stats())
+
+def default_store() -> SiteStore:
+    """真实 csv 上的 store；csv 追加由后台线程批量写入，请求不等磁盘"""
+    return SiteStore(JOBS_META_FILE, JOBS_UPDATED_FILE, clean_url, writer=get_write_behind(), name='zhilian',
+                     stream=open_stream(ENRICH_STREAM_FILE), aliases_file=ALIASES_FILE)
+
+def init_store(store: Optional[SiteStore] = None) -> SiteStore:
+    """载入路由使用的 store（默认 default_store()），并注册它的指标"""
+    global _store
+    _store = (store or default_store()).load()
+    register_store('zhilian', _store)
+    return _store
+
+def create_app(store: Optional[SiteStore] = None):
+    """store 为 None 时使用真实 csv；压测等场景传入指向临时目录的 SiteStore"""
+    init_store(store)
+    app = Flask(__name__)
+    CORS(app)  # 允许浏览器插件跨域调用
+    app.register_blueprint(bp)
+    return app
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("🚀 智联招聘 Bridge Server 已启动")
     print("地址: http://127.0.0.1:5001")
     print("="*60 + "\n")
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    serve(create_app(), port=5001)